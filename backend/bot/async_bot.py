@@ -0,0 +1,129 @@
+import asyncio
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import List
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import close_old_connections
+from django.db.models import QuerySet
+from telebot import asyncio_helper, types
+from telebot.async_telebot import AsyncTeleBot as BaseAsyncTeleBot
+
+from bot import transport
+from bot.bot import BOT_TOKEN, TeleBot
+from bot.media import plan_uploads, poll_upload, release_uploads
+from bot.router import CallbackRouter
+
+logger = logging.getLogger(__name__)
+
+# Асинхронные отправки делят лимиты и паузу 429 с остальными процессами бота
+transport.install_async()
+
+
+# Ограниченный пул потоков под ORM: корутины не блокируют event loop,
+# а база не получает больше BOT_ASYNC_DB_WORKERS соединений одновременно.
+_db_executor = ThreadPoolExecutor(
+    max_workers=settings.BOT_ASYNC_DB_WORKERS,
+    thread_name_prefix='bot-db',
+)
+
+
+def db(func):
+    '''Оборачивает синхронную функцию с ORM для вызова из корутины'''
+
+    def run(*args, **kwargs):
+        close_old_connections()
+        try:
+            return func(*args, **kwargs)
+        finally:
+            close_old_connections()
+
+    return sync_to_async(run, thread_sensitive=False, executor=_db_executor)
+
+
+async def acquire_file_ids_async(images, stale=frozenset()):
+    '''
+    ``acquire_file_ids`` для event loop: ждём чужую загрузку через
+    asyncio.sleep, а поток пула занимаем только на короткие опросы.
+    '''
+    file_ids, waiting = plan_uploads(images, stale)
+    claimed = []
+
+    for index, key in waiting:
+        if key in claimed:
+            continue
+
+        deadline = time.monotonic() + settings.BOT_UPLOAD_WAIT
+        while True:
+            done, file_id = await db(poll_upload)(images[index], key, stale)
+            if done or time.monotonic() > deadline:
+                break
+            await asyncio.sleep(settings.BOT_UPLOAD_WAIT_INTERVAL)
+
+        if done and file_id is None:
+            claimed.append(key)
+        file_ids[index] = file_id
+    return file_ids, claimed
+
+
+class AsyncTeleBot(BaseAsyncTeleBot):
+
+    async def send_cached_media_group(
+            self,
+            queryset_of_images: QuerySet,
+            chat_id: int,
+    ) -> List[types.Message]:
+        '''Отправка media_group с использованием telegram_file_id картинки'''
+
+        images = await db(list)(queryset_of_images)
+        stale = frozenset()
+
+        while True:
+            file_ids, claimed = await acquire_file_ids_async(images, stale)
+            media, files = TeleBot._prepare_media_group(images, file_ids)
+
+            try:
+                sent_msgs = await self.send_media_group(chat_id, media, timeout=60)
+                await db(TeleBot._group_images_and_files_ids)(images, sent_msgs, file_ids)
+                return sent_msgs
+            except asyncio_helper.ApiTelegramException:
+                used = frozenset(filter(None, file_ids))
+                if stale or not used:
+                    raise
+                stale = used
+            finally:
+                for f in files: f.close()
+                await db(release_uploads)(claimed)
+
+
+async_bot = AsyncTeleBot(BOT_TOKEN)
+
+async_router = CallbackRouter()
+async_router.register(async_bot)
+
+
+async def _polling() -> None:
+    try:
+        await async_bot.infinity_polling(20)
+    finally:
+        if asyncio_helper.session_manager.session:
+            await async_bot.close_session()
+
+
+def run_async_bot() -> None:
+    """Запуск бота на asyncio: одна aiohttp-сессия на все чаты."""
+    try:
+        from bot import async_handlers
+
+        # Общий aiohttp-коннектор: лимит одновременных запросов к Bot API
+        asyncio_helper.REQUEST_LIMIT = settings.BOT_ASYNC_CONNECTIONS
+
+        logger.info('Async bot is succesfully launched!')
+        asyncio.run(_polling())
+    except Exception as e:
+        logger.warning(f'Stopped with error: {e}')
+    finally:
+        _db_executor.shutdown(wait=False)
+        logger.info('Async bot complete')
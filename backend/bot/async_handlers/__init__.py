@@ -0,0 +1,3 @@
+# Порядок импорта — порядок проверки хендлеров сообщений: команды и платежи
+# проверяются без запросов к базе, состояние регистрации — последним
+from . import callbacks, start, invoices, goods, registration
@@ -0,0 +1,34 @@
+from telebot import types
+
+from bot.async_bot import async_bot, async_router, db
+from bot.handlers.callbacks import _DATA, _get_text_for_command
+from bot.router import CMD
+
+
+@async_bot.message_handler(commands=_DATA)
+async def command_handler(
+    message: types.Message = None,
+    callback: types.CallbackQuery = None,
+    command: str = None,
+) -> None:
+    '''Обрабатывает входящую команду/коллбэк и отправляет пользователю сообщение из базы.'''
+
+    if message:
+        command = message.text[1:] if message.text.startswith('/') else message.text
+    elif callback:
+        command = command or callback.data
+        message = callback.message
+
+    text = await db(_get_text_for_command)(command)
+
+    await async_bot.send_message(
+        message.chat.id,
+        text=text,
+        parse_mode="HTML",
+    )
+
+
+@async_router.route(CMD, *_DATA)
+async def callback_handler(callback: types.CallbackQuery, command: str) -> None:
+    '''Перенаправляет коллбэк на обработчик команды.'''
+    await command_handler(callback=callback, command=command)
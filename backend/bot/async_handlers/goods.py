@@ -0,0 +1,57 @@
+import logging
+
+from telebot import types
+
+from bot.async_bot import async_bot, async_router, db
+from bot.handlers.goods import _KEYS, build_store_keyboard, load_good
+from bot.handlers.invoices import good_invoice_kwargs
+from bot.models import Configuration
+from bot.router import CMD, GOOD
+
+logger = logging.getLogger(__name__)
+
+
+@async_bot.message_handler(commands=_KEYS)
+async def merchandise(message: types.Message) -> None:
+    '''Отправляет сообщение со списком Callback-кнопок доступных товаров.'''
+
+    config = await db(Configuration.objects.get_config)()
+    keyboard = await db(build_store_keyboard)()
+
+    await async_bot.send_message(
+        chat_id=message.chat.id,
+        text=config.merchant_message,
+        reply_markup=keyboard,
+        parse_mode='HTML'
+    )
+
+
+@async_router.route(CMD, *_KEYS)
+async def merchandise_callback(callback: types.CallbackQuery, command: str) -> None:
+    '''Перенаправляет коллбэк на функцию обработки сообщения.'''
+    await merchandise(callback.message)
+
+
+@async_router.route(GOOD)
+async def good_callback(callback: types.CallbackQuery, value: str) -> None:
+    '''Отправка медиа группы с кешированием и сообщения, следующего после нее.'''
+    if not value.isdigit():
+        return
+    good_id = int(value)
+    chat_id = callback.message.chat.id
+
+    good = await db(load_good)(good_id)
+    if good is None:
+        logger.warning(f'Good {good_id} not found')
+        return
+
+    if good.images:
+        await async_bot.send_cached_media_group(chat_id=chat_id, queryset_of_images=good.images)
+
+    await async_bot.send_message(chat_id, text=good.description, parse_mode='HTML')
+
+    try:
+        await async_bot.send_invoice(**good_invoice_kwargs(chat_id, good))
+    except Exception as e:
+        logger.error(f"Good invoice failed: {e}")
+        await async_bot.send_message(chat_id, "Ошибка при формировании счета.")
@@ -0,0 +1,26 @@
+from telebot import types
+
+from bot.async_bot import async_bot, db
+from bot.async_handlers.utils import send_replies
+from bot.handlers.invoices import check_pre_checkout, process_payment
+
+
+@async_bot.pre_checkout_query_handler(func=lambda query: True)
+async def checkout(pre_checkout_query: types.PreCheckoutQuery) -> None:
+    error_message = await db(check_pre_checkout)(pre_checkout_query)
+
+    if error_message:
+        await async_bot.answer_pre_checkout_query(
+            pre_checkout_query.id,
+            ok=False,
+            error_message=error_message
+        )
+        return
+
+    await async_bot.answer_pre_checkout_query(pre_checkout_query.id, ok=True)
+
+
+@async_bot.message_handler(content_types=['successful_payment'])
+async def got_payment(message: types.Message) -> None:
+    replies = await db(process_payment)(message)
+    await send_replies(message.chat.id, replies)
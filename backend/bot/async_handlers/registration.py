@@ -0,0 +1,28 @@
+from telebot import types
+
+from bot.async_bot import async_bot, async_router, db
+from bot.async_handlers.utils import send_replies
+from bot.handlers.registration import (
+    REGISTER,
+    is_in_registration,
+    process_registration_answer,
+    start_registration,
+)
+from bot.router import CMD
+
+
+async def _is_in_registration(message: types.Message) -> bool:
+    return await db(is_in_registration)(message)
+
+
+@async_bot.message_handler(func=_is_in_registration, content_types=['text', 'contact'])
+async def registration_message_handler(message: types.Message) -> None:
+    replies = await db(process_registration_answer)(message)
+    await send_replies(message.chat.id, replies)
+
+
+@async_router.route(CMD, REGISTER)
+async def registration_entry(call: types.CallbackQuery, command: str) -> None:
+    """Старт регистрации при нажатии на кнопку 'Регистрация' в меню."""
+    replies = await db(start_registration)(call)
+    await send_replies(call.message.chat.id, replies)
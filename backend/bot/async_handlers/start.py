@@ -0,0 +1,19 @@
+from telebot import types
+
+from bot.async_bot import async_bot, db
+from bot.handlers.start import build_start_keyboard
+from bot.models import Configuration
+
+
+@async_bot.message_handler(commands=['start'])
+async def start_handler(message: types.Message) -> None:
+    '''Получает команду /start, отправляет приветственное сообщение с callback-кнопками'''
+
+    config = await db(Configuration.objects.get_config)()
+
+    await async_bot.send_message(
+        message.chat.id,
+        text=config.start_message,
+        parse_mode="HTML",
+        reply_markup=build_start_keyboard(),
+    )
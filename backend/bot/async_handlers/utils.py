@@ -0,0 +1,18 @@
+from typing import List
+
+from bot.async_bot import async_bot
+from bot.handlers.utils import Reply
+
+
+async def send_replies(chat_id: int, replies: List[Reply]) -> None:
+    '''Отправляет ответы хендлера через asyncio-бота'''
+    for reply in replies:
+        if reply.invoice:
+            await async_bot.send_invoice(**reply.invoice)
+        else:
+            await async_bot.send_message(
+                chat_id,
+                text=reply.text,
+                parse_mode=reply.parse_mode,
+                reply_markup=reply.reply_markup,
+            )
@@ -1,7 +1,8 @@
 import logging
 
+from django.conf import settings
 from django.db.models.query import QuerySet
-from typing import List
+from typing import List, Optional
 from telebot import types
 
 import telebot
@@ -9,38 +10,84 @@ import os
 from dotenv import load_dotenv, find_dotenv
 from telebot import apihelper
 
+from bot.dispatcher import ChatDispatcher
+from bot.router import CallbackRouter
+from bot import transport
 
 
 load_dotenv(find_dotenv())
 
 BOT_TOKEN = os.getenv('BOT_TOKEN') or ''
 
+# Все запросы к Bot API проходят через общий лимитер и пул соединений
+transport.install()
+
 class TeleBot(telebot.TeleBot):
 
+    def __init__(self, token: str, dispatcher_workers: int = 0, **kwargs):
+        # С диспетчером хендлеры выполняются прямо в потоке шарда чата,
+        # собственный пул потоков TeleBot не нужен
+        if dispatcher_workers:
+            kwargs['threaded'] = False
+        super().__init__(token, **kwargs)
+
+        self.dispatcher = None
+        if dispatcher_workers:
+            self.dispatcher = ChatDispatcher(
+                dispatcher_workers,
+                handler=super().process_new_updates,
+                queue_size=settings.BOT_DISPATCHER_QUEUE_SIZE,
+            )
+
+    def process_new_updates(self, updates: List[types.Update], on_error=None) -> None:
+        """Раздаёт апдейты по шардам чатов (polling, вебхук и консьюмеры очереди).
+
+        ``on_error(update)`` — для консьюмеров очереди: апдейт, обработка
+        которого упала, не подтверждается.
+        """
+        if self.dispatcher is None:
+            if on_error is None:
+                return super().process_new_updates(updates)
+            for update in updates:
+                try:
+                    super().process_new_updates([update])
+                except Exception as e:
+                    logger.error(f'Update {update.update_id} failed: {e}', exc_info=True)
+                    on_error(update)
+            return
+
+        for update in updates:
+            self.dispatcher.submit(update, on_error)
+
+    @staticmethod
     def _group_images_and_files_ids(
-            self,
-            sent_images: QuerySet,
-            media_group: List[types.Message]
+            sent_images: List,
+            media_group: List[types.Message],
+            file_ids: List[Optional[str]],
     ) -> None:
-        """Привязывает file_id из ответа Telegram к объектам в базе."""
+        """Привязывает file_id загруженных файлов к объектам в базе."""
+        from bot.media import store_file_id
 
         for index, photo in enumerate(sent_images):
+            if file_ids[index]:
+                continue
             tg_id = media_group[index].photo[-1].file_id
 
             photo.telegram_file_id = tg_id
-            photo.save(update_fields=['telegram_file_id'])
+            store_file_id(photo, tg_id)
 
-    def _prepare_media_group(self, images: QuerySet, use_cache: bool = True) -> list:
+    @staticmethod
+    def _prepare_media_group(images: List, file_ids: List[Optional[str]]) -> tuple:
         """Вспомогательная функция для сборки списка InputMediaPhoto."""
         media_group = []
         opened_files = []
 
-        for img in images:
+        for img, file_id in zip(images, file_ids):
 
-            if use_cache and img.telegram_file_id:
-                media_group.append(types.InputMediaPhoto(media=img.telegram_file_id))
+            if file_id:
+                media_group.append(types.InputMediaPhoto(media=file_id))
             else:
-                f = open(img.image.path, 'rb')
+                f = open(img.telegram_source.path, 'rb')
                 opened_files.append(f)
                 media_group.append(types.InputMediaPhoto(media=f))
 
@@ -51,29 +98,36 @@ class TeleBot(telebot.TeleBot):
             queryset_of_images: QuerySet,
             chat_id: int,
     ) -> List[types.Message]:
-        '''Отправка media_group с использованием telegram_chat_id картинки'''
+        '''Отправка media_group с использованием telegram_file_id картинки'''
+        from bot.media import acquire_file_ids, release_uploads
+
+        images = list(queryset_of_images)
+        stale = frozenset()
 
-        media, files = self._prepare_media_group(queryset_of_images, use_cache=True)
+        while True:
+            file_ids, claimed = acquire_file_ids(images, stale)
+            media, files = self._prepare_media_group(images, file_ids)
 
-        try:
             try:
                 sent_msgs = self.send_media_group(chat_id, media, timeout=60)
-                if files:
-                    self._group_images_and_files_ids(queryset_of_images, sent_msgs)
+                self._group_images_and_files_ids(images, sent_msgs, file_ids)
                 return sent_msgs
             except telebot.apihelper.ApiTelegramException:
+                used = frozenset(filter(None, file_ids))
+                if stale or not used:
+                    raise
+                # Telegram не принял сохранённые file_id: перезагружаем файлы один раз
+                stale = used
+            finally:
                 for f in files: f.close()
+                release_uploads(claimed)
 
-                media, files = self._prepare_media_group(queryset_of_images, use_cache=False)
-                sent_msgs = self.send_media_group(chat_id, media, timeout=60)
-
-                self._group_images_and_files_ids(queryset_of_images, sent_msgs)
-                return sent_msgs
-        finally:
-            for f in files: f.close()
 
+bot = TeleBot(BOT_TOKEN, dispatcher_workers=settings.BOT_DISPATCHER_WORKERS)
 
-bot = TeleBot(BOT_TOKEN)
+# Все коллбэки бота разбираются одним роутером (см. bot.router)
+router = CallbackRouter()
+router.register(bot)
 
 logger = logging.getLogger(__name__)
 
@@ -88,6 +142,9 @@ def run_bot() -> None:
     except Exception as e:
         logger.warning(f'Stopped with error: {e}')
     finally:
+        if bot.dispatcher:
+            logger.info(f'Dispatcher stats: {bot.dispatcher.stats()}')
+        logger.info(f'HTTP session stats: {transport.session_stats()}')
         logger.info('Bot complete')
 
 
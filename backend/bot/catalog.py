@@ -0,0 +1,91 @@
+import logging
+import os
+from types import MappingProxyType
+from typing import NamedTuple, Optional, Tuple
+
+from django.conf import settings
+from telebot import types
+
+from bot.router import GOOD, pack
+from config.cache import VersionedSnapshot
+from goods.models import Good, GoodImage
+
+logger = logging.getLogger(__name__)
+
+
+class CatalogGood(NamedTuple):
+    '''Товар магазина бота, собранный заранее вместе с параметрами инвойса'''
+    id: int
+    title: str
+    description: str
+    images: Tuple[GoodImage, ...]  # фото медиа группы (без фото инвойса)
+    invoice: MappingProxyType  # параметры send_invoice без chat_id
+
+    def invoice_kwargs(self, chat_id: int) -> dict:
+        return dict(self.invoice, chat_id=chat_id)
+
+
+def _invoice(good: Good, invoice_image: Optional[GoodImage]) -> MappingProxyType:
+    return MappingProxyType(dict(
+        title=good.title,
+        description=good.label or good.title,
+        invoice_payload=f"good_{good.id}",
+        provider_token=os.getenv('PROVIDER_TOKEN'),
+        currency=os.getenv('CURRENCY'),
+        prices=[types.LabeledPrice(label=str(good.label), amount=int(good.price * 100))],
+        need_email=True,
+        send_email_to_provider=True,
+        provider_data=good.provider_data,
+        photo_url=settings.BASE_URL + invoice_image.telegram_source.url if invoice_image else None,
+    ))
+
+
+class Catalog:
+    '''Неизменяемый снимок магазина: товары, фото, инвойсы и клавиатура'''
+
+    def __init__(self, goods):
+        entries = {}
+        keyboard = types.InlineKeyboardMarkup()
+
+        for good in goods:
+            images = list(good.images.all())
+            invoice_image = next((img for img in images if img.is_invoice), None)
+
+            entries[good.id] = CatalogGood(
+                id=good.id,
+                title=good.title,
+                description=good.description,
+                images=tuple(img for img in images if not img.is_invoice),
+                invoice=_invoice(good, invoice_image),
+            )
+            if good.available:
+                keyboard.add(types.InlineKeyboardButton(text=good.title, callback_data=pack(GOOD, good.id)))
+
+        self._entries = MappingProxyType(entries)
+        # Готовый JSON: telebot передаёт строку в reply_markup как есть
+        self.keyboard = keyboard.to_json()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, good_id: int) -> Optional[CatalogGood]:
+        return self._entries.get(good_id)
+
+
+def _build_catalog() -> Catalog:
+    goods = Good.objects.prefetch_related('images').order_by('pk')
+    catalog = Catalog(goods)
+    logger.info(f'Store catalog built: {len(catalog)} goods')
+    return catalog
+
+
+_catalog = VersionedSnapshot('bot:catalog', _build_catalog)
+
+
+def get_catalog() -> Catalog:
+    '''Снимок магазина текущего процесса (перестраивается после изменения товаров)'''
+    return _catalog.get()
+
+
+def invalidate_catalog() -> None:
+    _catalog.invalidate()
@@ -0,0 +1,153 @@
+import logging
+import queue
+import threading
+import time
+from typing import Callable, List, Optional
+
+from django.db import close_old_connections
+from telebot import types
+
+logger = logging.getLogger(__name__)
+
+_CHAT_ATTRS = ('message', 'edited_message', 'channel_post', 'edited_channel_post')
+_USER_ATTRS = (
+    'pre_checkout_query', 'shipping_query', 'inline_query', 'chosen_inline_result',
+    'my_chat_member', 'chat_member', 'chat_join_request', 'poll_answer',
+)
+
+
+def get_chat_id(update: types.Update) -> Optional[int]:
+    '''Чат, к которому относится апдейт (для лички совпадает с id пользователя)'''
+    for attr in _CHAT_ATTRS:
+        message = getattr(update, attr, None)
+        if message is not None:
+            return message.chat.id
+
+    callback = update.callback_query
+    if callback is not None:
+        return callback.message.chat.id if callback.message else callback.from_user.id
+
+    for attr in _USER_ATTRS:
+        obj = getattr(update, attr, None)
+        if obj is None:
+            continue
+        if getattr(obj, 'chat', None) is not None:
+            return obj.chat.id
+        user = getattr(obj, 'from_user', None) or getattr(obj, 'user', None)
+        if user is not None:
+            return user.id
+    return None
+
+
+def raw_chat_id(data: dict) -> Optional[int]:
+    '''То же по сырому JSON апдейта: вебхуку не нужно собирать Update'''
+    for attr in _CHAT_ATTRS:
+        if attr in data:
+            return (data[attr].get('chat') or {}).get('id')
+
+    callback = data.get('callback_query')
+    if callback is not None:
+        message = callback.get('message')
+        return (message.get('chat') or {}).get('id') if message else (callback.get('from') or {}).get('id')
+
+    for attr in _USER_ATTRS:
+        obj = data.get(attr)
+        if obj is None:
+            continue
+        if obj.get('chat'):
+            return obj['chat'].get('id')
+        user = obj.get('from') or obj.get('user')
+        if user:
+            return user.get('id')
+    return None
+
+
+class ChatDispatcher:
+    '''
+    Обработка апдейтов: последовательно внутри чата, параллельно между чатами.
+
+    ``chat_id`` хешируется в один из ``workers`` шардов. У каждого шарда
+    своя очередь и свой поток, поэтому два быстрых сообщения одного
+    пользователя не гоняются за ``User.registration_step``.
+    '''
+
+    def __init__(self, workers: int, handler: Callable[[List[types.Update]], None], queue_size: int = 0):
+        self.workers = workers
+        self._handler = handler
+        self._queues = [queue.Queue(maxsize=queue_size) for _ in range(workers)]
+        self._threads = []
+        self._lock = threading.Lock()
+
+        self._submitted = 0
+        self._processed = 0
+        self._failed = 0
+        self._wait_total = 0.0
+        self._wait_max = 0.0
+
+    def start(self) -> None:
+        with self._lock:
+            if self._threads:
+                return
+            for index, shard in enumerate(self._queues):
+                thread = threading.Thread(
+                    target=self._work, args=(shard,), name=f'bot-shard-{index}', daemon=True
+                )
+                thread.start()
+                self._threads.append(thread)
+
+    def submit(self, update: types.Update, on_error: Optional[Callable[[types.Update], None]] = None) -> None:
+        '''
+        Ставит апдейт в очередь его чата (блокируется, если очередь полна).
+
+        ``on_error`` вызывается из потока шарда, если обработка упала.
+        '''
+        if not self._threads:
+            self.start()
+
+        chat_id = get_chat_id(update)
+        key = chat_id if chat_id is not None else update.update_id
+        shard = self._queues[hash(key) % self.workers]
+
+        with self._lock:
+            self._submitted += 1
+        shard.put((time.monotonic(), update, on_error))
+
+    def join(self) -> None:
+        '''Ждёт обработки всех поставленных апдейтов'''
+        for shard in self._queues:
+            shard.join()
+
+    def _work(self, shard: queue.Queue) -> None:
+        while True:
+            enqueued_at, update, on_error = shard.get()
+            wait = time.monotonic() - enqueued_at
+            failed = False
+            try:
+                close_old_connections()
+                self._handler([update])
+            except Exception as e:
+                failed = True
+                logger.error(f'Update {update.update_id} failed: {e}', exc_info=True)
+                if on_error is not None:
+                    on_error(update)
+            finally:
+                with self._lock:
+                    self._processed += 1
+                    self._failed += failed
+                    self._wait_total += wait
+                    self._wait_max = max(self._wait_max, wait)
+                shard.task_done()
+
+    def stats(self) -> dict:
+        '''Счётчики: глубина очередей и время ожидания апдейтов'''
+        with self._lock:
+            processed = self._processed
+            return {
+                'workers': self.workers,
+                'queue_depth': [shard.qsize() for shard in self._queues],
+                'submitted': self._submitted,
+                'processed': processed,
+                'failed': self._failed,
+                'wait_avg_ms': round(self._wait_total / processed * 1000, 2) if processed else 0.0,
+                'wait_max_ms': round(self._wait_max * 1000, 2),
+            }
@@ -1 +1,3 @@
-from . import callbacks, start, invoices, registration, goods
\ No newline at end of file
+# Порядок импорта — порядок проверки хендлеров сообщений: команды и платежи
+# проверяются без запросов к базе, состояние регистрации — последним
+from . import callbacks, start, invoices, goods, registration
@@ -1,5 +1,6 @@
 from bot.models import Configuration
-from bot.bot import bot
+from bot.bot import bot, router
+from bot.router import CMD
 from telebot import types
 
 _DATA = [
@@ -19,14 +20,15 @@ def _get_text_for_command(command: str) -> str:
 @bot.message_handler(commands=_DATA)
 def command_handler(
     message: types.Message = None,
-    callback: types.CallbackQuery = None
+    callback: types.CallbackQuery = None,
+    command: str = None,
 ) -> None:
     '''Обрабатывает входящую команду/коллбэк и отправляет пользователю сообщение из базы.'''
 
     if message:
         command = message.text[1:] if message.text.startswith('/') else message.text
     elif callback:
-        command = callback.data
+        command = command or callback.data
         message = callback.message
 
 
@@ -38,9 +40,9 @@ def command_handler(
         parse_mode="HTML",
     )
 
-@bot.callback_query_handler(func=lambda callback: callback.data in _DATA)
-def callback_handler(callback: types.CallbackQuery) -> None:
+@router.route(CMD, *_DATA)
+def callback_handler(callback: types.CallbackQuery, command: str) -> None:
     '''Перенаправляет коллбэк на обработчик команды.'''
-    command_handler(callback=callback)
+    command_handler(callback=callback, command=command)
 
 
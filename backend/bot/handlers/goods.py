@@ -1,14 +1,14 @@
 import os
 import logging
-from typing import List
-from django.db.models import QuerySet
+from typing import Optional
 from dotenv import load_dotenv, find_dotenv
 from telebot import types
 
 from bot.handlers.invoices import send_good_invoice
 from bot.models import Configuration
-from bot.bot import bot
-from goods.models import Good
+from bot.bot import bot, router
+from bot.catalog import CatalogGood, get_catalog
+from bot.router import CMD, GOOD
 
 load_dotenv(find_dotenv())
 
@@ -20,53 +20,52 @@ _KEYS = [
     'merchandise'
 ]
 
+def build_store_keyboard() -> str:
+    '''Callback-кнопки доступных товаров (JSON из снимка каталога)'''
+    return get_catalog().keyboard
+
+
+def load_good(good_id: int) -> Optional[CatalogGood]:
+    '''Товар из снимка каталога вместе с фото для медиа группы'''
+    return get_catalog().get(good_id)
+
+
 @bot.message_handler(commands=_KEYS)
 def merchandise(message: types.Message) -> None:
     '''Отправляет сообщение со списком Callback-кнопок доступных товаров.'''
 
     config = Configuration.objects.get_config()
-    goods = Good.objects.filter(available=True).values('title', 'id')
-
-    keyboard = types.InlineKeyboardMarkup()
-
-    for good in goods:
-        button = types.InlineKeyboardButton(
-            text=good['title'],
-            callback_data=str(good['id'])
-        )
-        keyboard.add(button)
 
     bot.send_message(
         chat_id=message.chat.id,
         text=config.merchant_message,
-        reply_markup=keyboard,
+        reply_markup=build_store_keyboard(),
         parse_mode='HTML'
     )
 
 
-@bot.callback_query_handler(func=lambda callback: callback.data in _KEYS)
-def merchandise_callback(callback: types.CallbackQuery) -> None:
+@router.route(CMD, *_KEYS)
+def merchandise_callback(callback: types.CallbackQuery, command: str) -> None:
     '''Перенаправляет коллбэк на функцию обработки сообщения.'''
     merchandise(callback.message)
 
 
-@bot.callback_query_handler(func=lambda callback: callback.data.isdigit())
-def good_callback(callback: types.CallbackQuery) -> None:
+@router.route(GOOD)
+def good_callback(callback: types.CallbackQuery, value: str) -> None:
     '''Отправка медиа группы с кешированием и сообщения, следующего после нее.'''
-    good_id = int(callback.data)
+    if not value.isdigit():
+        return
+    good_id = int(value)
     chat_id = callback.message.chat.id
 
-    good = Good.objects.prefetch_related('images').get(pk=good_id)
-    non_invoice_images = good.images.filter(is_invoice=False)
+    good = load_good(good_id)
+    if good is None:
+        logger.warning(f'Good {good_id} not found')
+        return
 
-    if non_invoice_images.exists():
+    if good.images:
 
-        bot.send_cached_media_group(chat_id=chat_id, queryset_of_images=non_invoice_images)
+        bot.send_cached_media_group(chat_id=chat_id, queryset_of_images=good.images)
 
     bot.send_message(chat_id, text=good.description, parse_mode='HTML')
     send_good_invoice(callback.message, good)
-
-
-
-
-
@@ -1,7 +1,10 @@
 import os
 import logging
 import json
+from typing import List, Optional
+
 from django.utils import timezone
+from django.db import transaction
 from django.db.models import QuerySet
 from telebot import types, apihelper
 from rest_framework.exceptions import APIException
@@ -9,58 +12,57 @@ from django.conf import settings
 
 from bot.models import Configuration
 from bot.bot import bot
+from bot.catalog import CatalogGood, get_catalog
+from bot.handlers.utils import Reply, send_replies
 from config.settings import BASE_URL
 from users.models import User
-from goods.models import Good  # Импортируем товары
+from goods.ledger import claim_payment, record_payment, release_payment
+from goods.models import Order
+from goods.reservations import confirm, parse_good_payload, reserve
 
 logger = logging.getLogger(__name__)
 
 
 # --- Вспомогательные функции ---
 
-def _handle_registration_payment(user, chat_id):
+def _handle_registration_payment(user) -> str:
     """Логика после оплаты регистрации"""
     user.paid = True
     user.paid_at = timezone.now()
     user.save(update_fields=['paid', 'paid_at'])
 
-    bot.send_message(
-        chat_id,
-        "<b>Оплата принята!</b>\nТеперь вы зарегистрированы. Ожидайте подтверждения администратором.",
-        parse_mode='HTML'
-    )
     logger.info(f"User {user.id} paid for registration")
+    return "<b>Оплата принята!</b>\nТеперь вы зарегистрированы. Ожидайте подтверждения администратором."
 
 
-def _handle_good_payment(chat_id: int, payload: str) -> None:
+def _handle_good_payment(chat_id: int, payload: str) -> Optional[str]:
     """Логика после оплаты конкретного товара"""
-    try:
-
-        good_id = int(payload)
-        good = Good.objects.get(id=good_id)
-
-        if good.quantity > 0:
-            good.quantity -= 1
-            good.save(update_fields=['quantity'])
-
-        bot.send_message(
-            chat_id,
-            f"<b>Оплата получена!</b>\nТовар: {good.title}\nМы готовим его к выдаче.",
-            parse_mode='HTML'
+    good_id = parse_good_payload(payload)
+    good = get_catalog().get(good_id) if good_id is not None else None
+    if good is None:
+        logger.error(f"Error processing good payment for payload {payload}")
+        return None
+
+    if not confirm(good_id, chat_id):
+        # Резерв истёк до оплаты, а товар успели купить: заказ ждёт админа
+        return (
+            f"<b>Оплата получена</b>, но товар «{good.title}» уже закончился.\n"
+            f"Мы вернём деньги или предложим замену — напишите, пожалуйста, в поддержку."
         )
-        logger.info(f"Good {good.id} purchased by {chat_id}")
-    except (Good.DoesNotExist, IndexError, ValueError) as e:
-        logger.error(f"Error processing good payment for payload {payload}: {e}")
+
+    logger.info(f"Good {good_id} purchased by {chat_id}")
+    return f"<b>Оплата получена!</b>\nТовар: {good.title}\nМы готовим его к выдаче."
 
 
 # --- Основные функции инвойсов ---
 
-def send_invoice(message: types.Message) -> None:
+def registration_invoice_kwargs(chat_id: int) -> dict:
+    """Параметры send_invoice для оплаты регистрации"""
     config = Configuration.objects.get_config()
     price_amount = int(config.price * 100)
 
-    bot.send_invoice(
-        chat_id=message.chat.id,
+    return dict(
+        chat_id=chat_id,
         title=config.invoice_title,
         description=config.invoice_description,
         invoice_payload=config.INVOICE_PAYLOAD,
@@ -70,100 +72,120 @@ def send_invoice(message: types.Message) -> None:
         need_email=True,
         send_email_to_provider=True,
         provider_data=config.provider_data,
-        photo_url = settings.BASE_URL + config.invoice_image.url if config.invoice_image else None,
+        photo_url = settings.BASE_URL + (config.invoice_image_telegram or config.invoice_image).url if config.invoice_image else None,
     )
 
 
-def send_good_invoice(message: types.Message, good: Good):
-    price_amount = int(good.price * 100)
+def good_invoice_kwargs(chat_id: int, good: CatalogGood) -> dict:
+    """Параметры send_invoice для оплаты товара (собраны в снимке каталога)"""
+    return good.invoice_kwargs(chat_id)
+
+
+def send_invoice(message: types.Message) -> None:
+    bot.send_invoice(**registration_invoice_kwargs(message.chat.id))
+
+
+def send_good_invoice(message: types.Message, good: CatalogGood):
     try:
-        invoice_image = good.images.filter(is_invoice=True).first()
-        invoice_image_url = invoice_image.image.url
-        bot.send_invoice(
-            chat_id=message.chat.id,
-            title=good.title,
-            description=good.label or good.title,
-            invoice_payload=f"good_{good.id}",
-            provider_token=os.getenv('PROVIDER_TOKEN'),
-            currency=os.getenv('CURRENCY'),
-            prices=[types.LabeledPrice(label=str(good.label), amount=price_amount)],
-            need_email=True,
-            send_email_to_provider=True,
-            provider_data=good.provider_data,
-            photo_url=settings.BASE_URL + invoice_image_url if invoice_image else None,
-        )
+        bot.send_invoice(**good_invoice_kwargs(message.chat.id, good))
     except Exception as e:
         logger.error(f"Good invoice failed: {e}")
         bot.send_message(message.chat.id, "Ошибка при формировании счета.")
 
 
-# --- Хендлеры ---
-
-@bot.pre_checkout_query_handler(func=lambda query: True)
-def checkout(pre_checkout_query):
+def check_pre_checkout(pre_checkout_query) -> Optional[str]:
+    """Проверяет платёж перед списанием. Возвращает текст ошибки или None"""
     payload = pre_checkout_query.invoice_payload
     config = Configuration.objects.get_config()
 
 
-    if payload.isdigit():
+    good_id = parse_good_payload(payload)
+    if good_id is not None:
         try:
-            good_id = int(payload.split('_')[1])
-            good = Good.objects.get(id=good_id)
-            if good.quantity <= 0 or not good.available:
-                return bot.answer_pre_checkout_query(
-                    pre_checkout_query.id,
-                    ok=False,
-                    error_message="Извините, этот товар только что закончился."
-                )
+            if not reserve(good_id, pre_checkout_query.from_user.id):
+                return "Извините, этот товар только что закончился."
         except Exception:
-            return bot.answer_pre_checkout_query(pre_checkout_query.id, ok=False,
-                                                 error_message="Ошибка проверки товара.")
+            logger.exception(f"Reservation failed for payload {payload}")
+            return "Ошибка проверки товара."
     if payload == config.INVOICE_PAYLOAD:
         try:
             chat_id = pre_checkout_query.from_user.id
             user = User.objects.get(telegram_chat_id=chat_id)
 
             if not user or not user.is_registered:
-                return bot.answer_pre_checkout_query(
-                    pre_checkout_query.id,
-                    ok=False,
-                    error_message="Не нашли зарегистрированного пользователя с вашим идентификатором. Пройдите регистрацию и попробуйте снова"
-                )
+                return "Не нашли зарегистрированного пользователя с вашим идентификатором. Пройдите регистрацию и попробуйте снова"
             if user.paid:
-                return bot.answer_pre_checkout_query(
-                    pre_checkout_query.id,
-                    ok=False,
-                    error_message="Кажется, вы уже зарегистрированы. Оплатить регистрацию заново у вас не получится."
-                )
+                return "Кажется, вы уже зарегистрированы. Оплатить регистрацию заново у вас не получится."
             if pre_checkout_query.total_amount/100 != config.price:
-                return bot.answer_pre_checkout_query(
-                    pre_checkout_query.id,
-                    ok=False,
-                    error_message=f'Цена на регистрацию поменялась. Попробуйте оплатить снова. \n\nЧтобы это сделать, нажмите "Регистрация" в боте.'
-                )
+                return f'Цена на регистрацию поменялась. Попробуйте оплатить снова. \n\nЧтобы это сделать, нажмите "Регистрация" в боте.'
 
         except Exception:
-            return bot.answer_pre_checkout_query(pre_checkout_query.id, ok=False,
-                                                 error_message="Ошибка проверки регистрации")
+            return "Ошибка проверки регистрации"
 
-
-    bot.answer_pre_checkout_query(pre_checkout_query.id, ok=True)
+    return None
 
 
-@bot.message_handler(content_types=['successful_payment'])
-def got_payment(message):
+def process_payment(message) -> List[Reply]:
+    """Фиксирует успешную оплату и возвращает ответ пользователю"""
     payment = message.successful_payment
     payload = payment.invoice_payload
     chat_id = message.chat.id
+    charge_id = payment.telegram_payment_charge_id
+
+    if not claim_payment(charge_id):
+        logger.info(f"Payment {charge_id} already processed")
+        return []
 
     try:
-        user = User.objects.get(telegram_chat_id=chat_id)
+        user = User.objects.filter(telegram_chat_id=chat_id).first()
+        good_id = parse_good_payload(payload)
+        # Товар могли удалить, пока шла оплата: в журнал без ссылки на него
+        known_good_id = good_id if good_id is not None and get_catalog().get(good_id) else None
+
+        # Списание товара и оплата регистрации коммитятся вместе со строкой журнала:
+        # если запись упала, повторная доставка апдейта не спишет товар второй раз
+        with transaction.atomic():
+            if user is None:
+                logger.error(f"Payment from unknown user: {chat_id}")
+                replies = [Reply("Ошибка: профиль не найден. Свяжитесь с поддержкой.")]
+            else:
+                text = None
+                if payload == 'registration':
+                    text = _handle_registration_payment(user)
+                elif payload.startswith('good_'):
+                    text = _handle_good_payment(chat_id, payload)
+                replies = [Reply(text, parse_mode='HTML')] if text else []
+
+            record_payment(
+                payment,
+                chat_id,
+                kind=Order.GOOD if good_id is not None else Order.REGISTRATION,
+                user_id=user.id if user else None,
+                good_id=known_good_id,
+            )
+    except Exception:
+        release_payment(charge_id)
+        raise
+
+    return replies
 
-        if payload == 'registration':
-            _handle_registration_payment(user, chat_id)
-        elif payload.startswith('good_'):
-            _handle_good_payment(chat_id, payload)
 
-    except User.DoesNotExist:
-        logger.error(f"Payment from unknown user: {chat_id}")
-        bot.send_message(chat_id, "Ошибка: профиль не найден. Свяжитесь с поддержкой.")
\ No newline at end of file
+# --- Хендлеры ---
+
+@bot.pre_checkout_query_handler(func=lambda query: True)
+def checkout(pre_checkout_query):
+    error_message = check_pre_checkout(pre_checkout_query)
+
+    if error_message:
+        return bot.answer_pre_checkout_query(
+            pre_checkout_query.id,
+            ok=False,
+            error_message=error_message
+        )
+
+    bot.answer_pre_checkout_query(pre_checkout_query.id, ok=True)
+
+
+@bot.message_handler(content_types=['successful_payment'])
+def got_payment(message):
+    send_replies(message.chat.id, process_payment(message))
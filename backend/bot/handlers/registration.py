@@ -1,5 +1,6 @@
 import logging
 import os
+from typing import List
 
 import pytz
 from datetime import datetime
@@ -7,11 +8,15 @@ from datetime import datetime
 from django.db.models import QuerySet
 from django.utils import timezone
 
-from bot.handlers.invoices import send_invoice
-from bot.bot import bot
+from bot.handlers.invoices import registration_invoice_kwargs
+from bot.handlers.utils import Reply, send_replies
+from bot.bot import bot, router
 from users.models import User
 from telebot import types
-from bot.models import RegistrationStep, Configuration
+from bot.models import Configuration
+from bot.registration_flow import StepNode, get_flow
+from bot.router import CMD
+from bot.user_state import get_user_state, update_user_state
 from django.db import transaction
 
 
@@ -23,7 +28,7 @@ logger = logging.getLogger(__name__)
 
 
 
-def extract_value(message, step: RegistrationStep) -> str:
+def extract_value(message, step: StepNode) -> str:
     if step.field_type == 'phone':
         if getattr(message, 'contact', None) and message.contact.phone_number:
             return message.contact.phone_number
@@ -37,36 +42,41 @@ def is_in_registration(message):
     if message.content_type == 'text' and message.text and message.text.startswith('/'):
         return False
 
-    return User.objects.filter(
-        telegram_chat_id=message.from_user.id,
-        is_registered=False,
-        registration_step__isnull=False
-    ).exists()
+    state = get_user_state(message.from_user.id)
+    return state is not None and state.in_registration
 
 
-@bot.message_handler(func=is_in_registration, content_types=['text', 'contact'])
-def registration_message_handler(message: types.Message):
-    user = User.objects.select_related('registration_step').get(
-        telegram_chat_id=message.from_user.id
-    )
-    step = user.registration_step
+def process_registration_answer(message: types.Message) -> List[Reply]:
+    '''Сохраняет ответ на текущий шаг регистрации и возвращает следующий вопрос'''
+    state = get_user_state(message.from_user.id)
+    flow = get_flow()
+    step = flow.get(state.registration_step_id) if state and not state.is_registered else None
 
-    if user.is_registered or step is None:
-        bot.send_message(message.chat.id, "Регистрация уже завершена.")
-        return
+    if step is None:
+        return [Reply("Регистрация уже завершена.")]
 
     raw = extract_value(message, step)
 
-    ok, validated_or_error = step.validate_data(raw)
+    ok, validated_or_error = step.validate(raw)
     if not ok:
-        bot.send_message(message.chat.id, validated_or_error, parse_mode='HTML')
-        return
+        return [Reply(validated_or_error, parse_mode='HTML')]
+
+    next_step = flow.get(step.next_id)
 
     with transaction.atomic():
+        user = User.objects.select_for_update().get(pk=state.user_id)
+
+        if user.registration_step_id != step.id:
+            # Состояние в кеше устарело: повторяем актуальный вопрос
+            update_user_state(user)
+            current = flow.get(user.registration_step_id)
+            if user.is_registered or current is None:
+                return [Reply("Регистрация уже завершена.")]
+            return [Reply(current.prompt, parse_mode='HTML', reply_markup=current.markup)]
+
         step.save_to_user(user, validated_or_error)
 
-        next_step = step.next_step
-        user.registration_step = next_step
+        user.registration_step_id = step.next_id
 
         if next_step is None:
             user.is_registered = True
@@ -76,30 +86,22 @@ def registration_message_handler(message: types.Message):
 
     # отвечаем пользователю
     if user.is_registered:
-        bot.send_message(message.chat.id, "Отлично! Регистрация завершена, формирую инвойс…")
-        send_invoice(
-            message
-        )
-    else:
+        return [
+            Reply("Отлично! Регистрация завершена, формирую инвойс…"),
+            Reply(invoice=registration_invoice_kwargs(message.chat.id)),
+        ]
 
-        markup = generate_phone_markup(user.registration_step)
-
-        bot.send_message(
-            message.chat.id,
-            user.registration_step.message_text,
-            parse_mode='HTML',
-            reply_markup=markup
-        )
+    return [Reply(
+        next_step.prompt,
+        parse_mode='HTML',
+        reply_markup=next_step.markup
+    )]
 
 
-def generate_phone_markup(registration_step: RegistrationStep):
+@bot.message_handler(func=is_in_registration, content_types=['text', 'contact'])
+def registration_message_handler(message: types.Message):
+    send_replies(message.chat.id, process_registration_answer(message))
 
-    if registration_step.field_type == 'phone':
-        logger.info("YES")
-        markup = types.ReplyKeyboardMarkup(row_width=1, resize_keyboard=True)
-        markup.add(types.KeyboardButton(text='Отправить номер', request_contact=True))
-        return markup
-    return None
 
 def check_date(config) -> bool:
     if not config.end_of_registration:
@@ -120,9 +122,8 @@ def check_max_users(config) -> bool:
     logger.info('Юзеров уже много')
     return True
 
-@bot.callback_query_handler(func=lambda call: call.data == "register")
-def registration_entry(call: types.CallbackQuery):
-    """Старт регистрации при нажатии на кнопку 'Регистрация' в меню."""
+def start_registration(call: types.CallbackQuery) -> List[Reply]:
+    """Старт регистрации: проверяет лимиты и возвращает первый вопрос."""
 
 
 
@@ -130,20 +131,11 @@ def registration_entry(call: types.CallbackQuery):
     config = Configuration.objects.get_config()
 
     if check_date(config) and check_max_users(config):
-        bot.send_message(
-            chat_id=chat_id,
-            text=config.closed_registrations_message
-        )
-        return
+        return [Reply(config.closed_registrations_message)]
 
 
     if config.end_of_registration and config.end_of_registration <= timezone.now().date():
-        bot.send_message(
-            chat_id=chat_id,
-            text=config.closed_registrations_message,
-            parse_mode='HTML'
-        )
-        return
+        return [Reply(config.closed_registrations_message, parse_mode='HTML')]
 
     user, created = User.objects.get_or_create(
         telegram_chat_id=chat_id,
@@ -154,34 +146,32 @@ def registration_entry(call: types.CallbackQuery):
 
     if user.is_registered:
         if not user.paid:
-            bot.send_message(
-                chat_id=chat_id,
-                text='Регистрация прошла, но ты все еще не зарегистрирован')
-            send_invoice(call.message)
-            return
+            return [
+                Reply('Регистрация прошла, но ты все еще не зарегистрирован'),
+                Reply(invoice=registration_invoice_kwargs(chat_id)),
+            ]
 
-        bot.send_message(
-            chat_id=call.message.chat.id,
-            text=config.already_registered_message)
-        return
+        return [Reply(config.already_registered_message)]
 
-    registration_step = RegistrationStep.objects.order_by('order').first()
+    registration_step = get_flow().first()
 
     if not registration_step:
-        bot.send_message(
-            chat_id=call.message.chat.id,
-            text=config.closed_registrations_message
-        )
-        return
+        return [Reply(config.closed_registrations_message)]
 
-    user.registration_step = registration_step
+    user.registration_step_id = registration_step.id
     user.save(update_fields=['registration_step', ])
 
-    markup = generate_phone_markup(user.registration_step)
-    bot.send_message(
-        chat_id=call.message.chat.id,
-        text=registration_step.message_text,
+    return [Reply(
+        registration_step.prompt,
         parse_mode='HTML',
-        reply_markup=markup
-    )
+        reply_markup=registration_step.markup
+    )]
 
+
+REGISTER = 'register'
+
+
+@router.route(CMD, REGISTER)
+def registration_entry(call: types.CallbackQuery, command: str):
+    """Старт регистрации при нажатии на кнопку 'Регистрация' в меню."""
+    send_replies(call.message.chat.id, start_registration(call))
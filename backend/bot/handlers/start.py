@@ -5,44 +5,49 @@ from telebot import types
 
 from bot.models import Configuration
 from bot.bot import bot
+from bot.router import CMD, pack
 from users.models import User
 
 
 
 
-@bot.message_handler(commands=['start'])
-def start_handler(message) -> types.Message:
-    '''Получает команду /start, отправляет приветственное сообщение с callback-кнопками'''
-
-    config = Configuration.objects.get_config()
+def build_start_keyboard() -> types.InlineKeyboardMarkup:
+    '''Callback-кнопки главного меню'''
 
     keyboard = types.InlineKeyboardMarkup()
 
     register_button = types.InlineKeyboardButton(
         text="Регистрация",
-        callback_data="register",
+        callback_data=pack(CMD, "register"),
     )
     format_button = types.InlineKeyboardButton(
         text="Формат мероприятия",
-        callback_data="format",
+        callback_data=pack(CMD, "format"),
     )
     ceo_button = types.InlineKeyboardButton(
         text="Сотрудничество",
-        callback_data="ceo",
+        callback_data=pack(CMD, "ceo"),
     )
     store_button = types.InlineKeyboardButton(
         text="Мерч",
-        callback_data="merchandise",
+        callback_data=pack(CMD, "merchandise"),
     )
 
     keyboard.row(register_button, format_button)
     keyboard.row(ceo_button)
     keyboard.row(store_button)
+    return keyboard
+
 
+@bot.message_handler(commands=['start'])
+def start_handler(message) -> types.Message:
+    '''Получает команду /start, отправляет приветственное сообщение с callback-кнопками'''
+
+    config = Configuration.objects.get_config()
 
     bot.send_message(
         message.chat.id,
         text=config.start_message,
         parse_mode="HTML",
-        reply_markup=keyboard,
+        reply_markup=build_start_keyboard(),
     )
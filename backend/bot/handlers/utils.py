@@ -1,7 +1,37 @@
 import re
-from typing import Optional
+from typing import NamedTuple, Optional
 from typing import List
 
+from telebot import types
+
+from bot.bot import bot
+
+
+class Reply(NamedTuple):
+    '''Сообщение, которое хендлер должен отправить пользователю.
+
+    Логика хендлеров (запросы к базе) возвращает список ``Reply``,
+    а отправкой занимается рантайм — синхронный или asyncio.
+    '''
+    text: Optional[str] = None
+    parse_mode: Optional[str] = None
+    reply_markup: Optional[types.JsonSerializable] = None
+    invoice: Optional[dict] = None  # kwargs для send_invoice вместо текста
+
+
+def send_replies(chat_id: int, replies: List[Reply]) -> None:
+    '''Отправляет ответы хендлера через синхронного бота'''
+    for reply in replies:
+        if reply.invoice:
+            bot.send_invoice(**reply.invoice)
+        else:
+            bot.send_message(
+                chat_id,
+                text=reply.text,
+                parse_mode=reply.parse_mode,
+                reply_markup=reply.reply_markup,
+            )
+
 
 def validate_phone(phone: str) -> Optional[str]:
     """
@@ -0,0 +1,55 @@
+import logging
+import multiprocessing
+import signal
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import connections
+
+logger = logging.getLogger(__name__)
+
+
+def _run_consumer(index: int) -> None:
+    from bot.bot import bot
+    from bot.update_queue import consume_forever, get_update_queue
+
+    # Хендлеры выполняются в этом процессе, подтверждение — после обработки
+    bot.threaded = False
+    # Имя постоянное: перезапущенный процесс забирает свои неподтверждённые апдейты
+    consume_forever(get_update_queue().partition(index), f'partition-{index}')
+
+
+class Command(BaseCommand):
+    help = (
+        'Обработка апдейтов Telegram из очереди вебхука (BOT_WEBHOOK_MODE=queue): '
+        'по процессу на каждую из BOT_UPDATES_PARTITIONS партиций. '
+        'Запускается в одном экземпляре — иначе партицию читают два процесса'
+    )
+
+    def handle(self, *args, **options):
+        partitions = settings.BOT_UPDATES_PARTITIONS
+
+        # Соединения с базой не должны наследоваться дочерними процессами
+        connections.close_all()
+
+        processes = []
+        for index in range(partitions):
+            process = multiprocessing.Process(
+                target=_run_consumer,
+                args=(index,),
+                name=f'bot-consumer-{index}',
+            )
+            process.start()
+            processes.append(process)
+
+        logger.info(f'Started {partitions} update consumers')
+
+        def stop(signum, frame):
+            for process in processes:
+                process.terminate()
+
+        signal.signal(signal.SIGTERM, stop)
+        signal.signal(signal.SIGINT, stop)
+
+        for process in processes:
+            process.join()
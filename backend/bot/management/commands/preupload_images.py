@@ -0,0 +1,59 @@
+import logging
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import close_old_connections
+from django.db.models import Q
+
+from bot.media import IMAGE_MODELS, get_image_model, upload_enabled, upload_image
+
+logger = logging.getLogger(__name__)
+
+
+def _upload(image):
+    try:
+        return upload_image(image)
+    finally:
+        close_old_connections()
+
+
+class Command(BaseCommand):
+    help = 'Загрузить в Telegram все картинки без telegram_file_id (BOT_MEDIA_STORAGE_CHAT_ID)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=4, help='Параллельных загрузок')
+
+    def handle(self, *args, **options):
+        if not upload_enabled():
+            raise CommandError('BOT_MEDIA_STORAGE_CHAT_ID не задан')
+
+        images = []
+        for label in IMAGE_MODELS:
+            model = get_image_model(label)
+            seen = set()
+            # Одинаковые файлы (один hash) загружаем один раз
+            pending = (
+                model.objects
+                .filter(Q(telegram_file_id__isnull=True) | Q(telegram_file_id=''))
+                .filter(image__isnull=False)
+                .exclude(image='')
+                .order_by('pk')
+            )
+            for image in pending:
+                if image.hash not in seen:
+                    seen.add(image.hash)
+                    images.append(image)
+
+        uploaded = failed = 0
+        with ThreadPoolExecutor(max_workers=options['workers']) as pool:
+            futures = {pool.submit(_upload, image): image for image in images}
+            for future in as_completed(futures):
+                image = futures[future]
+                try:
+                    future.result()
+                    uploaded += 1
+                except Exception as e:
+                    failed += 1
+                    logger.error(f'{image._meta.label} {image.pk} upload failed: {e}')
+
+        self.stdout.write(f'Uploaded {uploaded} images, failed {failed}')
@@ -15,11 +15,23 @@ logger = logging.getLogger(__name__)
 class Command(BaseCommand):
     help = 'Запустить Telegram бота'
 
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--async',
+            action='store_true',
+            dest='use_async',
+            help='Запустить asyncio-рантайм (AsyncTeleBot) вместо потокового',
+        )
+
     def handle(self, *args, **options):
         logger.info('Bot starting...')
         try:
             logger.info('Configuration created')
-            run_bot()
+            if options['use_async']:
+                from ...async_bot import run_async_bot
+                run_async_bot()
+            else:
+                run_bot()
         except Exception as e:
             logger.error(e)
 
@@ -0,0 +1,147 @@
+import logging
+import time
+from typing import FrozenSet, List, Optional, Tuple
+
+from django.apps import apps
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Q
+
+from bot.catalog import invalidate_catalog
+from bot.ratelimit import bulk_priority
+
+logger = logging.getLogger(__name__)
+
+# Модели-наследники BaseImage, которые бот отправляет по file_id
+IMAGE_MODELS = ('goods.GoodImage', 'newsletters.NewsletterImage')
+
+
+def upload_enabled() -> bool:
+    return bool(settings.BOT_MEDIA_STORAGE_CHAT_ID)
+
+
+def store_file_id(image, file_id: str) -> int:
+    '''Проставляет file_id всем строкам с этим файлом (дедупликация по hash)'''
+    model = type(image)
+    rows = model.objects.filter(hash=image.hash) if image.hash else model.objects.filter(pk=image.pk)
+    updated = rows.update(telegram_file_id=file_id)
+    if model._meta.label == 'goods.GoodImage':
+        # update() не шлёт post_save, а снимок магазина держит file_id
+        invalidate_catalog()
+    return updated
+
+
+def upload_image(image) -> Optional[str]:
+    '''
+    Загружает файл картинки в служебный чат и сохраняет полученный file_id.
+
+    После этого пользователи получают фото по file_id без загрузки с диска.
+    '''
+    if not upload_enabled() or not image.image:
+        return None
+
+    from bot.bot import bot
+
+    if not image.telegram_image:
+        try:
+            changed = image.build_variants()
+            if changed:
+                image.save(update_fields=changed)
+        except Exception as e:
+            # Битую для Pillow картинку Telegram ещё может принять как есть
+            logger.warning(f'{image._meta.label} {image.pk}: variants failed ({e}), uploading original')
+
+    with bulk_priority(), open(image.telegram_source.path, 'rb') as f:
+        message = bot.send_photo(settings.BOT_MEDIA_STORAGE_CHAT_ID, f, disable_notification=True)
+
+    file_id = message.photo[-1].file_id
+    store_file_id(image, file_id)
+    logger.info(f'{image._meta.label} {image.pk} uploaded: {file_id}')
+    return file_id
+
+
+def get_image_model(label: str):
+    return apps.get_model(label)
+
+
+# --- Single-flight загрузки файла между процессами ---
+
+def _lock_key(image, stale: FrozenSet[str]) -> str:
+    if image.telegram_file_id and image.telegram_file_id in stale:
+        # Перезагрузка после отказа Telegram: одна на устаревший file_id
+        return f'bot:reupload:{image.telegram_file_id}'
+    return f'bot:upload:{image.hash or f"{image._meta.label}:{image.pk}"}'
+
+
+def _stored_file_id(image, stale: FrozenSet[str]) -> Optional[str]:
+    model = type(image)
+    rows = model.objects.filter(hash=image.hash) if image.hash else model.objects.filter(pk=image.pk)
+    return (
+        rows
+        .exclude(Q(telegram_file_id__isnull=True) | Q(telegram_file_id=''))
+        .exclude(telegram_file_id__in=stale)
+        .values_list('telegram_file_id', flat=True)
+        .first()
+    )
+
+
+def plan_uploads(images, stale: FrozenSet[str] = frozenset()) -> Tuple[List[Optional[str]], List[Tuple[int, str]]]:
+    '''
+    Известные file_id картинок и (индекс, ключ блокировки) для остальных.
+
+    Ключи отсортированы: группы с теми же картинками в другом порядке
+    берут блокировки в одном порядке и не ждут друг друга до таймаута.
+    '''
+    file_ids, waiting = [], []
+    for index, image in enumerate(images):
+        file_id = image.telegram_file_id if image.telegram_file_id not in stale else None
+        file_ids.append(file_id or None)
+        if not file_id:
+            waiting.append((index, _lock_key(image, stale)))
+    return file_ids, sorted(waiting, key=lambda item: item[1])
+
+
+def poll_upload(image, key: str, stale: FrozenSet[str] = frozenset()) -> Tuple[bool, Optional[str]]:
+    '''
+    Одна попытка без ожидания: (True, None) — блокировка взята, загружаем
+    сами; (True, file_id) — файл уже загрузили; (False, None) — ждём.
+    '''
+    if cache.add(key, 1, settings.BOT_UPLOAD_LOCK_TTL):
+        return True, None
+    file_id = _stored_file_id(image, stale)
+    return bool(file_id), file_id
+
+
+def acquire_file_ids(images, stale: FrozenSet[str] = frozenset()) -> Tuple[List[Optional[str]], List[str]]:
+    '''
+    file_id для каждой картинки или None, если файл загружает текущий процесс.
+
+    Загрузку одного файла получает только владелец блокировки, остальные
+    ждут появления его file_id в базе. Возвращает ещё и взятые блокировки,
+    их нужно отпустить через ``release_uploads`` после сохранения file_id.
+    '''
+    file_ids, waiting = plan_uploads(images, stale)
+    claimed = []
+
+    for index, key in waiting:
+        if key in claimed:
+            # Тот же файл дважды в группе: загружаем его сами
+            continue
+
+        deadline = time.monotonic() + settings.BOT_UPLOAD_WAIT
+        while True:
+            done, file_id = poll_upload(images[index], key, stale)
+            if done or time.monotonic() > deadline:
+                # Не дождались — загружаем сами, это дешевле, чем не ответить
+                break
+            time.sleep(settings.BOT_UPLOAD_WAIT_INTERVAL)
+
+        if done and file_id is None:
+            claimed.append(key)
+        file_ids[index] = file_id
+    return file_ids, claimed
+
+
+def release_uploads(keys: List[str]) -> None:
+    if keys:
+        cache.delete_many(keys)
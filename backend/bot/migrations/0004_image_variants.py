@@ -0,0 +1,23 @@
+# Generated by Django 4.2.7 on 2026-10-18 05:15
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('bot', '0003_init_configuration'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='configuration',
+            name='invoice_image_telegram',
+            field=models.ImageField(blank=True, editable=False, null=True, upload_to='variants/'),
+        ),
+        migrations.AddField(
+            model_name='configuration',
+            name='invoice_image_thumbnail',
+            field=models.ImageField(blank=True, editable=False, null=True, upload_to='variants/'),
+        ),
+    ]
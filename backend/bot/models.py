@@ -8,17 +8,29 @@ from django.core.validators import validate_email, MinValueValidator, MaxValueVa
 from django.db import models
 import re
 
+from config.cache import VersionedSnapshot
+from config.images import TELEGRAM, THUMBNAIL, build_variants
 from users.models import User
 
 
 class ConfigurationManager(models.Manager):
     """Удобный доступ к конфигурации с кешем"""
 
-    _cache = None
+    def __init__(self):
+        super().__init__()
+        self._cache = VersionedSnapshot('bot:configuration', self.first)
 
     def get_config(self) -> 'Configuration':
-        """Возвращает единственную конфигурацию (кеширует)"""
-        return self.first()
+        """Возвращает единственную конфигурацию (кеширует)
+
+        Снимок общий для процесса — не изменяйте его. Для записи
+        берите свежий объект через ``Configuration.objects.first()``.
+        """
+        return self._cache.get()
+
+    def invalidate_cache(self) -> None:
+        """Сбрасывает кеш конфигурации во всех процессах"""
+        self._cache.invalidate()
 
 
 class Configuration(models.Model):
@@ -49,6 +61,8 @@ class Configuration(models.Model):
         blank=True,
         verbose_name='Фото инвойса'
     )
+    invoice_image_telegram = models.ImageField(upload_to='variants/', null=True, blank=True, editable=False)
+    invoice_image_thumbnail = models.ImageField(upload_to='variants/', null=True, blank=True, editable=False)
 
     end_of_registration = models.DateField(null=True, blank=True)
 
@@ -61,6 +75,11 @@ class Configuration(models.Model):
 
     objects = ConfigurationManager()
 
+    VARIANT_FIELDS = {TELEGRAM: 'invoice_image_telegram', THUMBNAIL: 'invoice_image_thumbnail'}
+
+    def build_variants(self) -> list:
+        return build_variants(self, 'invoice_image', self.VARIANT_FIELDS)
+
     def save(self, *args, **kwargs):
         """Сохранение только исходной записи"""
         super().save(*args, **kwargs)
@@ -0,0 +1,224 @@
+import asyncio
+import contextlib
+import contextvars
+import logging
+import threading
+import time
+from typing import Optional
+
+from django.conf import settings
+
+from config.redis import get_redis
+
+logger = logging.getLogger(__name__)
+
+
+INTERACTIVE = 'interactive'
+BULK = 'bulk'
+
+_priority = contextvars.ContextVar('bot_send_priority', default=INTERACTIVE)
+
+
+@contextlib.contextmanager
+def bulk_priority():
+    '''Отправки внутри блока — массовые (рассылки) и уступают интерактивным'''
+    token = _priority.set(BULK)
+    try:
+        yield
+    finally:
+        _priority.reset(token)
+
+
+def current_priority() -> str:
+    return _priority.get()
+
+
+def get_retry_after(exc: Exception) -> Optional[int]:
+    '''retry_after из ответа 429 (ApiTelegramException) или None'''
+    result_json = getattr(exc, 'result_json', None) or {}
+    if getattr(exc, 'error_code', None) != 429:
+        return None
+    return int((result_json.get('parameters') or {}).get('retry_after') or 1)
+
+
+# KEYS: глобальный бакет, бакет чата, ключ паузы
+# ARGV: has_chat, cost, global_rate, global_burst, chat_rate, chat_burst, reserve
+# Возвращает 0, если токены выданы, иначе сколько миллисекунд подождать.
+# Чату любой запрос стоит один токен: медиагруппа — одна отправка,
+# иначе ответ с карточкой товара (альбом + текст + счёт) не влезал в бакет.
+_ACQUIRE_SCRIPT = '''
+local t = redis.call('TIME')
+local now = tonumber(t[1]) * 1000 + math.floor(tonumber(t[2]) / 1000)
+
+local paused = tonumber(redis.call('GET', KEYS[3]) or '0')
+if paused > now then
+    return paused - now
+end
+
+local cost = tonumber(ARGV[2])
+
+local function level(key, rate, burst)
+    local bucket = redis.call('HMGET', key, 'tokens', 'ts')
+    local tokens = tonumber(bucket[1]) or burst
+    local ts = tonumber(bucket[2]) or now
+    return math.min(burst, tokens + (now - ts) * rate / 1000)
+end
+
+local global_rate = tonumber(ARGV[3])
+local global_tokens = level(KEYS[1], global_rate, tonumber(ARGV[4]))
+local need = cost + tonumber(ARGV[7])
+if global_tokens < need then
+    return math.ceil((need - global_tokens) * 1000 / global_rate)
+end
+
+if ARGV[1] == '1' then
+    local chat_rate = tonumber(ARGV[5])
+    local chat_tokens = level(KEYS[2], chat_rate, tonumber(ARGV[6]))
+    if chat_tokens < 1 then
+        return math.ceil((1 - chat_tokens) * 1000 / chat_rate)
+    end
+    redis.call('HSET', KEYS[2], 'tokens', chat_tokens - 1, 'ts', now)
+    redis.call('PEXPIRE', KEYS[2], 60000)
+end
+
+redis.call('HSET', KEYS[1], 'tokens', global_tokens - cost, 'ts', now)
+redis.call('PEXPIRE', KEYS[1], 60000)
+return 0
+'''
+
+
+# KEYS: ключ паузы; ARGV: длительность в миллисекундах.
+# Время берётся у Redis, как в _ACQUIRE_SCRIPT; короткая пауза не затирает длинную.
+_PAUSE_SCRIPT = '''
+local t = redis.call('TIME')
+local now = tonumber(t[1]) * 1000 + math.floor(tonumber(t[2]) / 1000)
+local ms = tonumber(ARGV[1])
+local current = tonumber(redis.call('GET', KEYS[1]) or '0')
+if now + ms > current then
+    redis.call('SET', KEYS[1], now + ms, 'PX', ms + 1000)
+end
+'''
+
+
+class RedisRateLimiter:
+    '''Token bucket в Redis: общий для всех воркеров celery и процесса бота'''
+
+    prefix = 'bot:ratelimit'
+
+    def __init__(self, client):
+        self.redis = client
+        self._script = client.register_script(_ACQUIRE_SCRIPT)
+        self._pause_script = client.register_script(_PAUSE_SCRIPT)
+
+    def try_acquire(self, chat_id: Optional[int], cost: int, reserve: int) -> float:
+        wait_ms = self._script(
+            keys=[f'{self.prefix}:global', f'{self.prefix}:chat:{chat_id}', f'{self.prefix}:pause'],
+            args=[
+                '1' if chat_id is not None else '0', cost,
+                settings.BOT_RATE_LIMIT_GLOBAL, settings.BOT_RATE_LIMIT_GLOBAL_BURST,
+                settings.BOT_RATE_LIMIT_CHAT, settings.BOT_RATE_LIMIT_CHAT_BURST,
+                reserve,
+            ],
+        )
+        return int(wait_ms) / 1000
+
+    def pause(self, seconds: float) -> None:
+        self._pause_script(keys=[f'{self.prefix}:pause'], args=[int(seconds * 1000)])
+
+
+class LocalRateLimiter:
+    '''Тот же token bucket в памяти процесса (без Redis)'''
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._buckets = {}
+        self._paused_until = 0.0
+
+    def _level(self, key, rate, burst, now):
+        tokens, ts = self._buckets.get(key, (burst, now))
+        return min(burst, tokens + (now - ts) * rate)
+
+    def try_acquire(self, chat_id: Optional[int], cost: int, reserve: int) -> float:
+        with self._lock:
+            now = time.monotonic()
+            if self._paused_until > now:
+                return self._paused_until - now
+
+            global_rate = settings.BOT_RATE_LIMIT_GLOBAL
+            global_tokens = self._level('global', global_rate, settings.BOT_RATE_LIMIT_GLOBAL_BURST, now)
+            if global_tokens < cost + reserve:
+                return (cost + reserve - global_tokens) / global_rate
+
+            if chat_id is not None:
+                chat_rate = settings.BOT_RATE_LIMIT_CHAT
+                chat_tokens = self._level(chat_id, chat_rate, settings.BOT_RATE_LIMIT_CHAT_BURST, now)
+                if chat_tokens < 1:
+                    return (1 - chat_tokens) / chat_rate
+                self._buckets[chat_id] = (chat_tokens - 1, now)
+
+            self._buckets['global'] = (global_tokens - cost, now)
+            return 0.0
+
+    def pause(self, seconds: float) -> None:
+        with self._lock:
+            self._paused_until = max(self._paused_until, time.monotonic() + seconds)
+
+
+_limiter = None
+_lock = threading.Lock()
+
+
+def get_limiter():
+    global _limiter
+
+    if _limiter is None:
+        with _lock:
+            if _limiter is None:
+                client = get_redis()
+                _limiter = RedisRateLimiter(client) if client is not None else LocalRateLimiter()
+    return _limiter
+
+
+def acquire(chat_id: Optional[int], cost: int = 1) -> None:
+    '''Блокирует поток, пока отправка в чат не уложится в лимиты Telegram'''
+    reserve = settings.BOT_RATE_LIMIT_BULK_RESERVE if current_priority() == BULK else 0
+    # Медиа группа больше бакета иначе никогда бы не прошла
+    cost = min(cost, settings.BOT_RATE_LIMIT_GLOBAL_BURST)
+    limiter = get_limiter()
+
+    while True:
+        try:
+            wait = limiter.try_acquire(chat_id, cost, reserve)
+        except Exception as e:
+            # Лимитер не должен ронять отправку сообщений
+            logger.warning(f'Rate limiter unavailable: {e}')
+            return
+        if not wait:
+            return
+        time.sleep(min(wait, 1.0))
+
+
+async def acquire_async(chat_id: Optional[int], cost: int = 1) -> None:
+    '''acquire для asyncio-рантайма: ждёт в event loop, запрос к Redis — в потоке'''
+    reserve = settings.BOT_RATE_LIMIT_BULK_RESERVE if current_priority() == BULK else 0
+    cost = min(cost, settings.BOT_RATE_LIMIT_GLOBAL_BURST)
+    limiter = get_limiter()
+
+    while True:
+        try:
+            wait = await asyncio.to_thread(limiter.try_acquire, chat_id, cost, reserve)
+        except Exception as e:
+            logger.warning(f'Rate limiter unavailable: {e}')
+            return
+        if not wait:
+            return
+        await asyncio.sleep(min(wait, 1.0))
+
+
+def pause(seconds: float) -> None:
+    '''Приостанавливает все отправки (ответ 429 с retry_after)'''
+    logger.warning(f'Telegram flood control: pausing sends for {seconds}s')
+    try:
+        get_limiter().pause(seconds)
+    except Exception as e:
+        logger.warning(f'Rate limiter unavailable: {e}')
@@ -0,0 +1,78 @@
+import logging
+from types import MappingProxyType
+from typing import Callable, NamedTuple, Optional
+
+from telebot import types
+
+from bot.models import RegistrationStep
+from config.cache import VersionedSnapshot
+
+logger = logging.getLogger(__name__)
+
+
+def generate_phone_markup(registration_step: RegistrationStep):
+
+    if registration_step.field_type == 'phone':
+        markup = types.ReplyKeyboardMarkup(row_width=1, resize_keyboard=True)
+        markup.add(types.KeyboardButton(text='Отправить номер', request_contact=True))
+        return markup
+    return None
+
+
+class StepNode(NamedTuple):
+    '''Шаг регистрации, собранный заранее: ответ обрабатывается без запросов к шагам'''
+    id: int
+    field_type: str
+    prompt: str
+    markup: Optional[types.ReplyKeyboardMarkup]
+    next_id: Optional[int]
+    validate: Callable  # RegistrationStep.validate_data
+    save_to_user: Callable  # RegistrationStep.save_to_user
+
+
+class RegistrationFlow:
+    '''Неизменяемый граф шагов регистрации'''
+
+    def __init__(self, steps):
+        steps = sorted(steps, key=lambda s: s.order)
+
+        self.first_id = steps[0].id if steps else None
+        self._nodes = MappingProxyType({
+            step.id: StepNode(
+                id=step.id,
+                field_type=step.field_type,
+                prompt=step.message_text,
+                markup=generate_phone_markup(step),
+                next_id=step.next_step_id,
+                validate=step.validate_data,
+                save_to_user=step.save_to_user,
+            )
+            for step in steps
+        })
+
+    def __len__(self):
+        return len(self._nodes)
+
+    def first(self) -> Optional[StepNode]:
+        return self.get(self.first_id)
+
+    def get(self, step_id: Optional[int]) -> Optional[StepNode]:
+        return self._nodes.get(step_id) if step_id is not None else None
+
+
+def _build_flow() -> RegistrationFlow:
+    flow = RegistrationFlow(RegistrationStep.objects.all())
+    logger.info(f'Registration flow compiled: {len(flow)} steps')
+    return flow
+
+
+_flow = VersionedSnapshot('bot:registration_flow', _build_flow)
+
+
+def get_flow() -> RegistrationFlow:
+    '''Граф шагов текущего процесса (перестраивается после изменения шагов)'''
+    return _flow.get()
+
+
+def invalidate_flow() -> None:
+    _flow.invalidate()
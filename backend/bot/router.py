@@ -0,0 +1,72 @@
+from typing import Callable, Dict, Optional, Tuple
+
+# Разделы callback_data: ``cmd:<команда>``, ``g:<id товара>``
+CMD = 'cmd'
+GOOD = 'g'
+
+_SEP = ':'
+
+
+def pack(kind: str, value) -> str:
+    '''Собирает callback_data кнопки (Telegram ограничивает её 64 байтами)'''
+    return f'{kind}{_SEP}{value}'
+
+
+def unpack(data: Optional[str]) -> Tuple[str, str]:
+    '''Раздел и значение callback_data.
+
+    Кнопки в уже отправленных сообщениях несут старый формат без раздела:
+    число — это товар, остальное — команда.
+    '''
+    data = data or ''
+    kind, sep, value = data.partition(_SEP)
+    if sep:
+        return kind, value
+    if data.isdigit():
+        return GOOD, data
+    return CMD, data
+
+
+class CallbackRouter:
+    '''
+    Индекс коллбэков: хендлер находится одним поиском в словаре.
+
+    Вместо цепочки ``func=lambda`` у каждого хендлера бот регистрирует
+    один обработчик коллбэков, а маршрут выбирается по callback_data:
+    сначала точное совпадение ``(раздел, значение)``, затем хендлер
+    всего раздела. Хендлер получает коллбэк и значение из callback_data.
+    '''
+
+    def __init__(self):
+        self._exact: Dict[Tuple[str, str], Callable] = {}
+        self._prefix: Dict[str, Callable] = {}
+
+    def route(self, kind: str, *values: str) -> Callable:
+        '''Декоратор: хендлер для значений раздела (без значений — для всего раздела)'''
+        def decorator(handler):
+            if values:
+                for value in values:
+                    self._exact[(kind, value)] = handler
+            else:
+                self._prefix[kind] = handler
+            return handler
+        return decorator
+
+    def resolve(self, data: Optional[str]) -> Optional[Tuple[Callable, str]]:
+        kind, value = unpack(data)
+        handler = self._exact.get((kind, value)) or self._prefix.get(kind)
+        if handler is None:
+            return None
+        return handler, value
+
+    def matches(self, callback) -> bool:
+        return self.resolve(callback.data) is not None
+
+    def dispatch(self, callback):
+        '''Вызывает хендлер коллбэка (для asyncio-бота возвращает корутину)'''
+        handler, value = self.resolve(callback.data)
+        return handler(callback, value)
+
+    def register(self, bot) -> None:
+        '''Подключает роутер к боту единственным обработчиком коллбэков'''
+        bot.callback_query_handler(func=self.matches)(self.dispatch)
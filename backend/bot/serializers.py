@@ -8,6 +8,7 @@ class ConfigurationSerializer(serializers.ModelSerializer):
     class Meta:
         model = Configuration
         fields = '__all__'
+        read_only_fields = ['invoice_image_telegram', 'invoice_image_thumbnail']
 
     def validate_invoice_image(self, value):
         if value:
@@ -1,7 +1,89 @@
+import logging
 import os
-from django.db.models.signals import post_delete, pre_save
+from django.db.models.signals import post_delete, pre_save, post_save
 from django.dispatch import receiver
-from .models import Configuration
+from django.db import transaction
+
+from goods.models import Good, GoodImage
+from newsletters.models import NewsletterImage
+from config.images import delete_unused_variants, schedule_variants, variants_failed
+from users.models import User
+from .catalog import invalidate_catalog
+from .media import upload_enabled
+from .models import Configuration, RegistrationStep
+from .registration_flow import invalidate_flow
+from .user_state import drop_user_state, update_user_state
+
+logger = logging.getLogger(__name__)
+
+
+@receiver(post_save, sender=Configuration)
+@receiver(post_delete, sender=Configuration)
+def config_invalidate_cache(sender, **kwargs):
+    """Сбрасывает кеш конфигурации во всех процессах"""
+    Configuration.objects.invalidate_cache()
+
+
+@receiver(post_save, sender=RegistrationStep)
+@receiver(post_delete, sender=RegistrationStep)
+def registration_step_invalidate_flow(sender, **kwargs):
+    """Перестраивает граф шагов регистрации во всех процессах"""
+    invalidate_flow()
+
+
+@receiver(post_save, sender=Good)
+@receiver(post_delete, sender=Good)
+@receiver(post_save, sender=GoodImage)
+@receiver(post_delete, sender=GoodImage)
+def goods_invalidate_catalog(sender, **kwargs):
+    """Пересобирает снимок магазина во всех процессах"""
+    invalidate_catalog()
+
+
+def _schedule_preupload(sender, instance) -> None:
+    from .tasks import upload_image_file_id
+
+    label, pk = sender._meta.label, instance.pk
+
+    def enqueue():
+        try:
+            upload_image_file_id.delay(label, pk)
+        except Exception as e:
+            # file_id всё равно появится при первой отправке
+            logger.warning(f'{label} {pk}: preupload not scheduled ({e})')
+
+    transaction.on_commit(enqueue)
+
+
+@receiver(post_save, sender=GoodImage)
+@receiver(post_save, sender=NewsletterImage)
+def image_preupload(sender, instance, **kwargs):
+    """Загружает новую картинку в Telegram заранее, до первого пользователя"""
+    # Ждём уменьшенный JPEG: сохранение вариантов снова вызовет этот сигнал
+    if instance.telegram_file_id or not instance.telegram_image or not upload_enabled():
+        return
+    _schedule_preupload(sender, instance)
+
+
+@receiver(variants_failed, sender=GoodImage)
+@receiver(variants_failed, sender=NewsletterImage)
+def image_preupload_original(sender, instance, **kwargs):
+    """Вариантов не будет: загружаем в Telegram исходный файл"""
+    if instance.telegram_file_id or not upload_enabled():
+        return
+    _schedule_preupload(sender, instance)
+
+
+@receiver(post_save, sender=User)
+def user_update_state(sender, instance, **kwargs):
+    """Записывает новое состояние пользователя в кеш бота"""
+    update_user_state(instance)
+
+
+@receiver(post_delete, sender=User)
+def user_drop_state(sender, instance, **kwargs):
+    drop_user_state(instance.telegram_chat_id)
+
 
 @receiver(pre_save, sender=Configuration)
 def config_delete_old_file_on_change(sender, instance, **kwargs):
@@ -17,10 +99,18 @@ def config_delete_old_file_on_change(sender, instance, **kwargs):
     if old_instance.invoice_image and instance.invoice_image != old_instance.invoice_image:
         if os.path.isfile(old_instance.invoice_image.path):
             os.remove(old_instance.invoice_image.path)
+        delete_unused_variants(old_instance, old_instance.VARIANT_FIELDS.values())
+        instance.invoice_image_telegram = instance.invoice_image_thumbnail = None
+
+
+@receiver(post_save, sender=Configuration)
+def config_build_variants(sender, instance, **kwargs):
+    schedule_variants(instance, 'invoice_image', instance.VARIANT_FIELDS)
 
 @receiver(post_delete, sender=Configuration)
 def config_delete_file_on_delete(sender, instance, **kwargs):
     """Удаляет файл при удалении записи (если модель будет удалена)"""
     if instance.invoice_image:
         if os.path.isfile(instance.invoice_image.path):
-            os.remove(instance.invoice_image.path)
\ No newline at end of file
+            os.remove(instance.invoice_image.path)
+    delete_unused_variants(instance, instance.VARIANT_FIELDS.values())
@@ -0,0 +1,22 @@
+import logging
+
+from celery import shared_task
+
+from bot.media import get_image_model, upload_image
+from bot.ratelimit import get_retry_after
+
+logger = logging.getLogger(__name__)
+
+
+@shared_task(bind=True, ignore_result=True, max_retries=5)
+def upload_image_file_id(self, model_label: str, image_id: int):
+    '''Заранее получает telegram_file_id для сохранённой картинки'''
+    image = get_image_model(model_label).objects.filter(pk=image_id).first()
+    if image is None or image.telegram_file_id:
+        return
+
+    try:
+        upload_image(image)
+    except Exception as exc:
+        logger.warning(f'{model_label} {image_id} upload failed: {exc}')
+        raise self.retry(exc=exc, countdown=get_retry_after(exc) or 60)
@@ -0,0 +1,169 @@
+import asyncio
+import json
+import logging
+import os
+import threading
+import time
+
+import requests
+from django.conf import settings
+from requests.adapters import HTTPAdapter
+from telebot import apihelper, asyncio_helper
+
+from bot import ratelimit
+
+logger = logging.getLogger(__name__)
+
+
+# Методы, которые отправляют сообщения в чат и попадают под лимиты Telegram
+_LIMITED_METHODS = {'copyMessage', 'copyMessages', 'forwardMessage', 'forwardMessages'}
+
+
+def _is_limited(method_name: str) -> bool:
+    return method_name.startswith('send') or method_name in _LIMITED_METHODS
+
+
+def _message_cost(method_name: str, params: dict) -> int:
+    if method_name == 'sendMediaGroup':
+        try:
+            return len(json.loads(params.get('media') or '[]')) or 1
+        except ValueError:
+            return 1
+    return 1
+
+
+_session = None
+_session_pid = None
+_session_lock = threading.Lock()
+
+
+def get_session() -> requests.Session:
+    '''
+    Одна keep-alive сессия на процесс вместо сессии на поток.
+
+    Соединения с api.telegram.org переиспользуются всеми потоками процесса
+    (бот, шарды диспетчера, воркеры celery). После fork сессия
+    пересоздаётся: сокеты родителя дочерним процессам не достаются.
+    '''
+    global _session, _session_pid
+
+    pid = os.getpid()
+    if _session is None or _session_pid != pid:
+        with _session_lock:
+            if _session is None or _session_pid != pid:
+                session = requests.Session()
+                adapter = HTTPAdapter(
+                    pool_connections=1,
+                    pool_maxsize=settings.BOT_HTTP_POOL_SIZE,
+                    pool_block=True,
+                )
+                session.mount('https://', adapter)
+                session.mount('http://', adapter)
+                _session, _session_pid = session, pid
+    return _session
+
+
+def session_stats() -> dict:
+    '''Счётчики пула: сколько запросов ушло по уже открытым соединениям'''
+    connections = requests_sent = 0
+    if _session is not None and _session_pid == os.getpid():
+        for adapter in set(_session.adapters.values()):
+            for key in adapter.poolmanager.pools.keys():
+                pool = adapter.poolmanager.pools[key]
+                connections += pool.num_connections
+                requests_sent += pool.num_requests
+    return {
+        'connections': connections,
+        'requests': requests_sent,
+        'reused': max(requests_sent - connections, 0),
+    }
+
+
+def _rewind(files) -> None:
+    '''Перематывает файлы перед повторной отправкой'''
+    for value in (files or {}).values():
+        file = value[1] if isinstance(value, tuple) else value
+        if hasattr(file, 'seek'):
+            file.seek(0)
+
+
+def send_request(method, url, params=None, files=None, timeout=None, proxies=None):
+    '''
+    Отправка запроса к Bot API с учётом общих лимитов.
+
+    Устанавливается в ``apihelper.CUSTOM_REQUEST_SENDER``: методы отправки
+    ждут токены в общем бакете, а ответ 429 ставит все отправки на паузу
+    на ``retry_after`` и повторяет запрос.
+    '''
+    method_name = url.rsplit('/', 1)[-1]
+    limited = _is_limited(method_name)
+    chat_id = (params or {}).get('chat_id')
+
+    attempts = settings.BOT_RATE_LIMIT_MAX_429_RETRIES + 1
+    for attempt in range(attempts):
+        if limited:
+            ratelimit.acquire(chat_id, _message_cost(method_name, params or {}))
+
+        response = get_session().request(
+            method, url, params=params, files=files, timeout=timeout, proxies=proxies
+        )
+        if response.status_code != 429 or attempt == attempts - 1:
+            return response
+
+        try:
+            retry_after = response.json()['parameters']['retry_after']
+        except (ValueError, KeyError, TypeError):
+            retry_after = 1
+
+        ratelimit.pause(retry_after)
+        logger.info(f'{method_name}: 429, retry {attempt + 1} after {retry_after}s')
+        time.sleep(retry_after)
+        _rewind(files)
+
+    return response
+
+
+async def send_request_async(token, url, method='get', params=None, files=None, **kwargs):
+    '''
+    То же для asyncio-рантайма (``runbot --async``): общий бакет и пауза 429.
+
+    У ``asyncio_helper`` нет CUSTOM_REQUEST_SENDER, поэтому подменяется
+    его ``_process_request``; ``url`` здесь — имя метода Bot API.
+    '''
+    limited = _is_limited(url)
+    chat_id = (params or {}).get('chat_id')
+
+    attempts = settings.BOT_RATE_LIMIT_MAX_429_RETRIES + 1
+    for attempt in range(attempts):
+        if limited:
+            await ratelimit.acquire_async(chat_id, _message_cost(url, params or {}))
+
+        try:
+            # _process_request забирает timeout из params: повтору нужна копия
+            return await _async_process_request(
+                token, url, method=method, params=dict(params) if params else params, files=files, **kwargs
+            )
+        except asyncio_helper.ApiTelegramException as e:
+            retry_after = ratelimit.get_retry_after(e)
+            if not retry_after or attempt == attempts - 1:
+                raise
+
+        await asyncio.to_thread(ratelimit.pause, retry_after)
+        logger.info(f'{url}: 429, retry {attempt + 1} after {retry_after}s')
+        await asyncio.sleep(retry_after)
+        _rewind(files)
+
+
+_async_process_request = asyncio_helper._process_request
+
+
+def install() -> None:
+    '''Подключает лимитер и общую сессию ко всем запросам telebot'''
+    apihelper.CUSTOM_REQUEST_SENDER = send_request
+    apihelper.CONNECT_TIMEOUT = settings.BOT_HTTP_CONNECT_TIMEOUT
+    apihelper.READ_TIMEOUT = settings.BOT_HTTP_READ_TIMEOUT
+
+
+def install_async() -> None:
+    '''Подключает лимитер к запросам AsyncTeleBot'''
+    asyncio_helper._process_request = send_request_async
@@ -0,0 +1,241 @@
+import json
+import logging
+import queue
+import threading
+import time
+from typing import List, Optional, Tuple
+
+from django.conf import settings
+from django.db import close_old_connections
+from telebot.types import Update
+
+from config.redis import get_redis
+
+logger = logging.getLogger(__name__)
+
+_GROUP = 'bot-consumers'
+
+
+def process_raw_updates(bodies: List[bytes]) -> List[bool]:
+    '''
+    Разбирает сырые апдейты из очереди и передаёт их боту.
+
+    Возвращает для каждого тела, можно ли его подтвердить: False — обработка
+    упала, апдейт остаётся в очереди до повторной доставки. Битый JSON
+    подтверждается сразу, повтор его не исправит.
+    '''
+    from bot.bot import bot
+
+    done = [True] * len(bodies)
+    updates = []
+    positions = {}
+    for index, body in enumerate(bodies):
+        try:
+            update = Update.de_json(json.loads(body))
+        except Exception as e:
+            logger.error(f'Broken update in queue: {e}')
+            continue
+        updates.append(update)
+        positions[id(update)] = index
+
+    def failed(update):
+        done[positions[id(update)]] = False
+
+    if updates:
+        close_old_connections()
+        bot.process_new_updates(updates, on_error=failed)
+
+        # Подтверждаем пачку только после того, как шарды её обработали
+        if bot.dispatcher:
+            bot.dispatcher.join()
+
+    return done
+
+
+class RedisStreamQueue:
+    '''Одна партиция очереди апдейтов: Redis Stream с consumer group.
+
+    Вебхук только делает XADD, а процесс ``consume_updates`` этой партиции
+    читает поток через XREADGROUP и подтверждает апдейты после обработки.
+    '''
+
+    def __init__(self, client, stream: str, maxlen: int):
+        self.redis = client
+        self.stream = stream
+        self.maxlen = maxlen
+        self._group_ready = False
+
+    def push(self, body: bytes, key: Optional[int] = None) -> None:
+        self.redis.xadd(self.stream, {'u': body}, maxlen=self.maxlen, approximate=True)
+
+    def _ensure_group(self) -> None:
+        if self._group_ready:
+            return
+        import redis
+
+        try:
+            self.redis.xgroup_create(self.stream, _GROUP, id='0', mkstream=True)
+        except redis.ResponseError as e:
+            if 'BUSYGROUP' not in str(e):
+                raise
+        self._group_ready = True
+
+    def consume(self, consumer: str, count: int, block_ms: int) -> List[Tuple[bytes, bytes]]:
+        self._ensure_group()
+        response = self.redis.xreadgroup(
+            _GROUP, consumer, {self.stream: '>'}, count=count, block=block_ms
+        )
+        if not response:
+            return []
+        return [(entry_id, fields[b'u']) for entry_id, fields in response[0][1]]
+
+    def reclaim(self, consumer: str, min_idle_ms: int, count: int) -> List[Tuple[bytes, bytes]]:
+        '''
+        Забирает неподтверждённые апдейты: упавших консьюмеров и свои неудачные.
+
+        Апдейт, доставленный больше ``BOT_UPDATES_MAX_DELIVERIES`` раз,
+        подтверждается без обработки, чтобы не крутиться в очереди вечно.
+        '''
+        self._ensure_group()
+        response = self.redis.xautoclaim(
+            self.stream, _GROUP, consumer, min_idle_ms, start_id='0-0', count=count
+        )
+        entries = [(entry_id, fields[b'u']) for entry_id, fields in response[1] if fields]
+        if not entries:
+            return []
+
+        deliveries = {
+            item['message_id']: item['times_delivered']
+            for item in self.redis.xpending_range(
+                self.stream, _GROUP, min=entries[0][0], max=entries[-1][0],
+                count=len(entries), consumername=consumer,
+            )
+        }
+        dropped = [
+            entry_id for entry_id, _ in entries
+            if deliveries.get(entry_id, 0) > settings.BOT_UPDATES_MAX_DELIVERIES
+        ]
+        if dropped:
+            logger.error(f'Updates dropped after {settings.BOT_UPDATES_MAX_DELIVERIES} deliveries: {dropped}')
+            self.ack(dropped)
+        return [entry for entry in entries if entry[0] not in dropped]
+
+    def ack(self, ids: List[bytes]) -> None:
+        if ids:
+            self.redis.xack(self.stream, _GROUP, *ids)
+
+
+class PartitionedQueue:
+    '''
+    Очередь апдейтов из ``BOT_UPDATES_PARTITIONS`` потоков ``<stream>:<n>``.
+
+    Апдейт попадает в партицию своего чата, у каждой партиции ровно один
+    консьюмер: два апдейта одного чата не обрабатываются параллельно
+    разными процессами и идут в порядке поступления.
+    '''
+
+    def __init__(self, client, stream: str, maxlen: int, partitions: int):
+        self.partitions = [
+            RedisStreamQueue(client, f'{stream}:{index}', maxlen) for index in range(partitions)
+        ]
+
+    def push(self, body: bytes, key: Optional[int] = None) -> None:
+        '''``key`` — чат апдейта; без него апдейт идёт в нулевую партицию'''
+        self.partitions[(key or 0) % len(self.partitions)].push(body)
+
+    def partition(self, index: int) -> RedisStreamQueue:
+        return self.partitions[index]
+
+
+class LocalQueue:
+    '''Замена Redis Stream внутри одного процесса (dev, тесты), без повторной доставки'''
+
+    def __init__(self):
+        self._queue = queue.Queue()
+
+    def push(self, body: bytes, key: Optional[int] = None) -> None:
+        # Порядок внутри чата держит диспетчер единственного консьюмера
+        self._queue.put(body)
+
+    def partition(self, index: int) -> 'LocalQueue':
+        return self
+
+    def consume(self, consumer: str, count: int, block_ms: int) -> List[Tuple[None, bytes]]:
+        try:
+            items = [self._queue.get(timeout=block_ms / 1000)]
+        except queue.Empty:
+            return []
+        while len(items) < count:
+            try:
+                items.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return [(None, body) for body in items]
+
+    def reclaim(self, consumer: str, min_idle_ms: int, count: int) -> list:
+        return []
+
+    def ack(self, ids: list) -> None:
+        pass
+
+
+def consume_forever(update_queue, consumer: str, stop: Optional[threading.Event] = None,
+                   clock=time.monotonic) -> None:
+    '''
+    Цикл консьюмера: читает пачку, обрабатывает, подтверждает удачные.
+
+    Неподтверждённые апдейты (свои упавшие и зависшие у мёртвых консьюмеров)
+    забираются заново раз в ``BOT_UPDATES_RECLAIM_MS``, не только на старте.
+    '''
+    batch = settings.BOT_UPDATES_BATCH
+    reclaim_every = settings.BOT_UPDATES_RECLAIM_MS / 1000
+    logger.info(f'Update consumer {consumer} started')
+
+    last_reclaim = None
+    while stop is None or not stop.is_set():
+        entries = []
+        if last_reclaim is None or clock() - last_reclaim >= reclaim_every:
+            last_reclaim = clock()
+            entries = update_queue.reclaim(consumer, settings.BOT_UPDATES_RECLAIM_MS, batch)
+        if not entries:
+            entries = update_queue.consume(consumer, batch, block_ms=5000)
+        if not entries:
+            continue
+
+        try:
+            done = process_raw_updates([body for _, body in entries])
+        except Exception as e:
+            # Пачка целиком остаётся в очереди и будет забрана повторно
+            logger.error(f'Update consumer {consumer} failed: {e}', exc_info=True)
+            continue
+        update_queue.ack([entry_id for (entry_id, _), ok in zip(entries, done) if ok])
+
+
+_update_queue = None
+_lock = threading.Lock()
+
+
+def get_update_queue():
+    '''Очередь апдейтов процесса: Redis Stream или локальная замена'''
+    global _update_queue
+
+    if _update_queue is None:
+        with _lock:
+            if _update_queue is None:
+                client = get_redis()
+                if client is not None:
+                    _update_queue = PartitionedQueue(
+                        client,
+                        settings.BOT_UPDATES_STREAM,
+                        settings.BOT_UPDATES_STREAM_MAXLEN,
+                        settings.BOT_UPDATES_PARTITIONS,
+                    )
+                else:
+                    _update_queue = LocalQueue()
+                    threading.Thread(
+                        target=consume_forever,
+                        args=(_update_queue, 'local'),
+                        name='bot-updates-local',
+                        daemon=True,
+                    ).start()
+    return _update_queue
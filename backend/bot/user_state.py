@@ -0,0 +1,144 @@
+import logging
+import threading
+import time
+from collections import OrderedDict
+from typing import NamedTuple, Optional
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+
+from users.models import User
+
+logger = logging.getLogger(__name__)
+
+_GENERATION_KEY = 'bot:user_state:generation'
+
+
+class UserState(NamedTuple):
+    '''Всё, что фильтрам бота нужно знать о пользователе чата'''
+    user_id: int
+    registration_step_id: Optional[int]
+    is_registered: bool
+    paid: bool
+
+    @property
+    def in_registration(self) -> bool:
+        return not self.is_registered and self.registration_step_id is not None
+
+
+class _LocalLRU:
+    '''Маленький LRU процесса перед Redis с коротким временем жизни записей'''
+
+    def __init__(self, maxsize: int):
+        self.maxsize = maxsize
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, chat_id):
+        with self._lock:
+            entry = self._data.get(chat_id)
+            if entry is None:
+                return None
+            if entry[0] < time.monotonic():
+                del self._data[chat_id]
+                return None
+            self._data.move_to_end(chat_id)
+            return entry
+
+    def set(self, chat_id, state: Optional[UserState]) -> None:
+        with self._lock:
+            self._data[chat_id] = (time.monotonic() + settings.BOT_USER_STATE_LOCAL_TTL, state)
+            self._data.move_to_end(chat_id)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+
+
+_local = _LocalLRU(settings.BOT_USER_STATE_LRU_SIZE)
+
+
+def _key(chat_id: int) -> str:
+    return f'bot:user_state:{chat_id}'
+
+
+def _state_from_user(user) -> UserState:
+    return UserState(user.id, user.registration_step_id, user.is_registered, user.paid)
+
+
+def get_user_state(chat_id: int) -> Optional[UserState]:
+    '''
+    Состояние пользователя чата или None, если пользователя нет.
+
+    LRU процесса -> Redis (одним get_many вместе с поколением) -> база.
+    '''
+    entry = _local.get(chat_id)
+    if entry is not None:
+        return entry[1]
+
+    key = _key(chat_id)
+    try:
+        cached = cache.get_many([_GENERATION_KEY, key])
+    except Exception as e:
+        logger.warning(f'User state cache unavailable: {e}')
+        cached = {}
+
+    generation = cached.get(_GENERATION_KEY)
+    value = cached.get(key)
+    if value is not None and value[0] == generation:
+        state = UserState(*value[1]) if value[1] else None
+        _local.set(chat_id, state)
+        return state
+
+    user = (
+        User.objects
+        .filter(telegram_chat_id=chat_id)
+        .only('id', 'registration_step_id', 'is_registered', 'paid')
+        .first()
+    )
+    state = _state_from_user(user) if user else None
+    _store(chat_id, state, generation)
+    return state
+
+
+def _store(chat_id: int, state: Optional[UserState], generation) -> None:
+    _local.set(chat_id, state)
+    try:
+        cache.set(_key(chat_id), (generation, tuple(state) if state else None), settings.BOT_USER_STATE_TTL)
+    except Exception as e:
+        logger.warning(f'User state cache unavailable: {e}')
+
+
+def update_user_state(user) -> None:
+    '''Записывает состояние после сохранения пользователя (после коммита)'''
+    if not user.telegram_chat_id:
+        return
+    chat_id, state = user.telegram_chat_id, _state_from_user(user)
+    transaction.on_commit(lambda: _store(chat_id, state, cache.get(_GENERATION_KEY)))
+
+
+def drop_user_state(chat_id: Optional[int]) -> None:
+    if not chat_id:
+        return
+
+    def drop():
+        _local.set(chat_id, None)
+        cache.delete(_key(chat_id))
+
+    transaction.on_commit(drop)
+
+
+def invalidate_all() -> None:
+    '''Сбрасывает состояния всех чатов (массовый queryset.update())'''
+
+    def bump():
+        _local.clear()
+        try:
+            cache.incr(_GENERATION_KEY)
+        except ValueError:
+            cache.set(_GENERATION_KEY, 1, timeout=None)
+
+    transaction.on_commit(bump)
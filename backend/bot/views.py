@@ -1,5 +1,6 @@
 import json
 import logging
+from django.conf import settings
 from django.http import JsonResponse
 from django.db import transaction, IntegrityError
 from django.db.models import F
@@ -12,12 +13,15 @@ from rest_framework.views import APIView
 from telebot.types import Update
 
 from bot.models import Configuration, RegistrationStep
+from bot.registration_flow import invalidate_flow
 from bot.serializers import ConfigurationSerializer, RegistrationStepSerializer, RegistrationStepReorderSerializer
 from rest_framework.decorators import action
 from rest_framework.response import Response
 from rest_framework.status import HTTP_200_OK, HTTP_400_BAD_REQUEST
 
 from bot.bot import bot
+from bot.dispatcher import raw_chat_id
+from bot.update_queue import get_update_queue
 
 logger = logging.getLogger('gfs')
 
@@ -32,7 +36,8 @@ class ConfigurationAPIView(APIView):
         return Response(serializer.data)
 
     def patch(self, request):
-        config = Configuration.objects.get_config()
+        # Снимок из get_config() общий для процесса, меняем свежую копию
+        config = Configuration.objects.first()
 
 
         data = request.data.copy()
@@ -114,15 +119,45 @@ class RegistrationStepViewSet(viewsets.ModelViewSet):
 
         with transaction.atomic():
             RegistrationStep.objects.bulk_update(ordered_steps, ["order", "next_step"])
+            # bulk_update не шлёт сигналы — граф шагов сбрасываем явно
+            invalidate_flow()
 
         return Response({"count": len(ordered_steps)}, status=HTTP_200_OK)
 
 
+def _enqueue_update(request):
+    """Быстрый путь вебхука: проверить апдейт и положить его в очередь"""
+    secret = settings.BOT_WEBHOOK_SECRET
+    if secret and request.headers.get('X-Telegram-Bot-Api-Secret-Token') != secret:
+        return JsonResponse({'error': 'Forbidden'}, status=403)
+
+    body = request.body
+    try:
+        update_dict = json.loads(body)
+    except ValueError:
+        return JsonResponse({'error': 'Invalid JSON'}, status=400)
+
+    if not isinstance(update_dict, dict) or 'update_id' not in update_dict:
+        return JsonResponse({'error': 'Not an update'}, status=400)
+
+    try:
+        get_update_queue().push(body, raw_chat_id(update_dict))
+    except Exception as e:
+        # 500 — Telegram доставит апдейт повторно
+        logger.error(f'Webhook enqueue error: {e}', exc_info=True)
+        return JsonResponse({'error': str(e)}, status=500)
+
+    return JsonResponse({'ok': True})
+
+
 @csrf_exempt
 def webhook(request):
     if request.method != 'POST':
         return JsonResponse({'error': 'Method not allowed'}, status=405)
 
+    if settings.BOT_WEBHOOK_MODE == 'queue':
+        return _enqueue_update(request)
+
     try:
         body_unicode = request.body.decode('utf-8')
         update_dict = json.loads(body_unicode)
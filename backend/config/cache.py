@@ -0,0 +1,60 @@
+import logging
+import threading
+
+from django.core.cache import cache
+from django.db import transaction
+
+logger = logging.getLogger('gfs')
+
+
+class VersionedSnapshot:
+    '''
+    Локальный снимок данных в памяти процесса с общей версией в кеше.
+
+    Каждый процесс (gunicorn, runbot, celery) держит свою копию и на каждом
+    обращении сверяет только номер версии в Redis. Данные перечитываются
+    из базы лишь после ``invalidate()`` в любом из процессов.
+    '''
+
+    def __init__(self, key: str, loader):
+        self.version_key = f'{key}:version'
+        self._loader = loader
+        self._state = None  # (version, value)
+        self._lock = threading.Lock()
+
+    def get(self):
+        '''Возвращает актуальный снимок, перечитывая его при смене версии'''
+        try:
+            version = cache.get(self.version_key)
+        except Exception as e:
+            logger.warning(f'Snapshot {self.version_key}: cache unavailable ({e})')
+            return self._loader()
+
+        state = self._state
+        if state is not None and state[0] == version:
+            return state[1]
+
+        with self._lock:
+            state = self._state
+            if state is not None and state[0] == version:
+                return state[1]
+
+            # Версию читаем ДО загрузки: если между ними произойдёт
+            # инвалидация, следующий вызов просто перечитает данные ещё раз.
+            value = self._loader()
+            self._state = (version, value)
+            return value
+
+    def invalidate(self) -> None:
+        '''Сбрасывает снимок во всех процессах после коммита транзакции'''
+        transaction.on_commit(self._bump)
+
+    def _bump(self) -> None:
+        self._state = None
+        try:
+            cache.incr(self.version_key)
+        except ValueError:
+            # Ключа нет (первая инвалидация или кеш очищен)
+            cache.set(self.version_key, 1, timeout=None)
+        except Exception as e:
+            logger.warning(f'Snapshot {self.version_key}: version bump failed ({e})')
@@ -0,0 +1,139 @@
+import hashlib
+import io
+import logging
+from typing import Dict, Optional
+
+from django.apps import apps
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.db import transaction
+from django.dispatch import Signal
+from PIL import Image, ImageOps
+
+from config.storage import digest_from_name
+
+logger = logging.getLogger(__name__)
+
+# Pillow не смог построить варианты (sender — модель, instance — картинка)
+variants_failed = Signal()
+
+
+# Варианты картинки: имя -> (формат Pillow, расширение, максимальная сторона, качество)
+TELEGRAM = 'telegram'
+THUMBNAIL = 'thumbnail'
+
+VARIANTS = {
+    TELEGRAM: ('JPEG', 'jpg', settings.IMAGE_TELEGRAM_MAX_SIDE, 85),
+    THUMBNAIL: ('WEBP', 'webp', settings.IMAGE_THUMBNAIL_MAX_SIDE, 80),
+}
+
+
+def _file_hash(field_file) -> str:
+    hasher = hashlib.md5()
+    field_file.open('rb')
+    try:
+        for chunk in field_file.chunks():
+            hasher.update(chunk)
+    finally:
+        field_file.close()
+    return hasher.hexdigest()
+
+
+def render_variant(source: Image.Image, variant: str) -> bytes:
+    '''Уменьшенная копия без EXIF (ориентация применяется к пикселям)'''
+    image_format, _, max_side, quality = VARIANTS[variant]
+
+    image = source.copy()
+    image.thumbnail((max_side, max_side), Image.LANCZOS)
+
+    buffer = io.BytesIO()
+    if image_format == 'JPEG':
+        image.save(buffer, image_format, quality=quality, optimize=True, progressive=True)
+    else:
+        image.save(buffer, image_format, quality=quality, method=6)
+    return buffer.getvalue()
+
+
+def build_variants(instance, source_field: str, fields: Dict[str, str], digest: Optional[str] = None) -> list:
+    '''
+    Строит варианты картинки и записывает их в поля ``fields`` (вариант -> поле).
+
+    Имена файлов производные от содержимого (``variants/<md5>.<вариант>.<ext>``),
+    поэтому одинаковые картинки делят один файл, а nginx может кешировать
+    их навсегда. Возвращает список изменённых полей.
+    '''
+    source = getattr(instance, source_field)
+    if not source:
+        return []
+
+    digest = digest or digest_from_name(source.name) or _file_hash(source)
+    changed = []
+    opened = None
+
+    try:
+        for variant, field in fields.items():
+            name = f'variants/{digest}.{variant}.{VARIANTS[variant][1]}'
+            storage = getattr(instance, field).storage
+            if getattr(instance, field).name == name:
+                continue
+
+            if not storage.exists(name):
+                if opened is None:
+                    source.open('rb')
+                    opened = ImageOps.exif_transpose(Image.open(source)).convert('RGB')
+                storage.save(name, ContentFile(render_variant(opened, variant)))
+
+            setattr(instance, field, name)
+            changed.append(field)
+    finally:
+        if opened is not None:
+            source.close()
+
+    return changed
+
+
+def schedule_variants(instance, source_field: str, fields: Dict[str, str]) -> None:
+    '''Ставит построение вариантов в фон после коммита, если их ещё нет'''
+    if not getattr(instance, source_field) or all(getattr(instance, f) for f in fields.values()):
+        return
+
+    from config.tasks import build_image_variants
+
+    label, pk = instance._meta.label, instance.pk
+
+    def enqueue():
+        try:
+            build_image_variants.delay(label, pk)
+        except Exception as e:
+            # Без брокера картинка остаётся исходной; варианты достроит загрузка в Telegram
+            logger.warning(f'{label} {pk}: variants not scheduled ({e})')
+
+    transaction.on_commit(enqueue)
+
+
+def variant_in_use(name: str, exclude=None) -> bool:
+    '''
+    Ссылается ли на файл варианта хоть одна строка.
+
+    Имя варианта зависит только от содержимого, поэтому один файл делят
+    строки разных моделей: проверяются все модели с ``VARIANT_FIELDS``.
+    ``exclude`` — строка, которая сама отказывается от файла.
+    '''
+    for model in apps.get_models():
+        for field in getattr(model, 'VARIANT_FIELDS', {}).values():
+            rows = model.objects.filter(**{field: name})
+            if exclude is not None and isinstance(exclude, model):
+                rows = rows.exclude(pk=exclude.pk)
+            if rows.exists():
+                return True
+    return False
+
+
+def delete_unused_variants(instance, fields) -> None:
+    '''Удаляет файлы вариантов ``instance``, на которые больше не ссылается ни одна строка'''
+    for field in fields:
+        file = getattr(instance, field)
+        if not file or not file.name:
+            continue
+        if not variant_in_use(file.name, exclude=instance) and file.storage.exists(file.name):
+            file.storage.delete(file.name)
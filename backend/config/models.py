@@ -1,6 +1,25 @@
-from django.db import models
+from django.db import models, transaction
 import hashlib
 
+from config.images import TELEGRAM, THUMBNAIL, build_variants
+from config.storage import digest_from_name, is_content_addressed
+
+
+class MediaBlob(models.Model):
+    '''Файл хранилища по содержимому и число строк, которые на него ссылаются'''
+    class Meta:
+        verbose_name = "Файл"
+        verbose_name_plural = "Файлы"
+
+    name = models.CharField(max_length=255, primary_key=True)
+    size = models.PositiveBigIntegerField(default=0)
+    refcount = models.PositiveIntegerField(default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"{self.name} ({self.refcount})"
+
+
 class BaseImage(models.Model):
     '''Базовая модель для картинок, использующая дедубликацию'''
     class Meta:
@@ -9,8 +28,41 @@ class BaseImage(models.Model):
     telegram_file_id = models.CharField(max_length=255, null=True, blank=True)
     hash = models.CharField(max_length=64, null=True, db_index=True, blank=True)
 
+    # Производные файлы: строятся в фоне после загрузки (config.tasks)
+    telegram_image = models.ImageField(upload_to='variants/', null=True, blank=True, editable=False)
+    thumbnail = models.ImageField(upload_to='variants/', null=True, blank=True, editable=False)
+
+    VARIANT_FIELDS = {TELEGRAM: 'telegram_image', THUMBNAIL: 'thumbnail'}
 
     def save(self, *args, **kwargs):
+        uploaded = None
+        try:
+            # Ссылка на файл добавляется в одной транзакции со строкой:
+            # упавший INSERT/UPDATE откатывает и её
+            with transaction.atomic():
+                if self.image and not self.image._committed:
+                    # Файл пишется в хранилище по содержимому: хеш считается на лету
+                    self.image.save(self.image.name, self.image.file, save=False)
+                    uploaded = self.image.name
+                    if self.pk and self.__class__.objects.filter(pk=self.pk, image=uploaded).exists():
+                        # То же содержимое в той же строке: ссылка у неё уже есть
+                        self.image.storage.delete(uploaded)
+                self._save_row(*args, **kwargs)
+        except Exception:
+            if is_content_addressed(uploaded):
+                # Файл, на который так и не сослалась ни одна строка, убираем с диска
+                self.image.storage.discard(uploaded)
+            raise
+
+    def _save_row(self, *args, **kwargs):
+        digest = digest_from_name(self.image.name if self.image else None)
+        if digest and self.hash != digest:
+            # Новое содержимое: file_id и варианты берём у строки с тем же файлом
+            existing = self.__class__.objects.filter(hash=digest).exclude(pk=self.pk).first()
+            self.hash = digest
+            self.telegram_file_id = existing.telegram_file_id if existing else None
+            self.telegram_image = existing.telegram_image if existing else None
+            self.thumbnail = existing.thumbnail if existing else None
 
         if not self.hash:
             hash = self._generate_hash(self.image)
@@ -19,6 +71,8 @@ class BaseImage(models.Model):
             if existing:
                 self.image = existing.image
                 self.telegram_file_id = existing.telegram_file_id
+                self.telegram_image = existing.telegram_image
+                self.thumbnail = existing.thumbnail
                 self.hash = hash
             else:
                 self.hash = hash
@@ -26,6 +80,14 @@ class BaseImage(models.Model):
 
         super().save(*args, **kwargs)
 
+    @property
+    def telegram_source(self):
+        '''Файл для загрузки в Telegram: уменьшенный JPEG, если он уже готов'''
+        return self.telegram_image or self.image
+
+    def build_variants(self) -> list:
+        return build_variants(self, 'image', self.VARIANT_FIELDS)
+
     @staticmethod
     def _generate_hash(file):
         '''Генерирует MD5 хеш для картинки'''
@@ -0,0 +1,24 @@
+import threading
+from typing import Optional
+
+from django.conf import settings
+
+_client = None
+_lock = threading.Lock()
+
+
+def get_redis() -> Optional['redis.Redis']:
+    '''Общий клиент Redis процесса или None, если REDIS_URL не задан'''
+    global _client
+
+    if not settings.REDIS_URL:
+        return None
+
+    if _client is None:
+        with _lock:
+            if _client is None:
+                import redis
+
+                # Пул соединений redis-py сам пересоздаётся после fork
+                _client = redis.Redis.from_url(settings.REDIS_URL)
+    return _client
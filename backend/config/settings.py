@@ -3,8 +3,10 @@ import os
 import ssl
 from datetime import timedelta
 from pathlib import Path
+from urllib.parse import urlsplit, urlunsplit
 
 from celery.schedules import crontab
+from django.core.exceptions import ImproperlyConfigured
 from dotenv import load_dotenv, find_dotenv
 
 load_dotenv(find_dotenv())
@@ -30,12 +32,16 @@ CELERY_TIMEZONE = 'Europe/Moscow'
 CELERY_BEAT_SCHEDULE = {
     'send-scheduled-newsletters': {
         'task': 'newsletters.tasks.send_scheduled_newsletters',
-        'schedule': crontab(minute=0, hour='*/5'),
+        'schedule': crontab(),
     },
     'cleanup-old-newsletters': {
         'task': 'newsletters.tasks.cleanup_old_newsletters',
         'schedule': crontab(hour=3, minute=0),
     },
+    'release-expired-reservations': {
+        'task': 'goods.tasks.release_expired_reservations',
+        'schedule': crontab(),
+    },
 }
 
 # Отдельный брокер/бэкэнд под тесты
@@ -44,6 +50,37 @@ if os.getenv('PYTEST_RUNNING'):
     CELERY_RESULT_BACKEND = 'redis://redis:6379/8'
 
 
+# --- Кеш ---
+
+# Общий Redis для версий кешей, состояний, блокировок и лимитов между
+# процессами (gunicorn, runbot, celery). Без REDIS_URL берётся Redis брокера
+# Celery (отдельная база REDIS_CACHE_DB: cache.clear() не тронет очередь).
+# Без обоих кеш локальный для процесса — только для тестов и dev (DEBUG).
+REDIS_CACHE_DB = 1
+REDIS_URL = os.getenv('REDIS_URL')
+if not REDIS_URL and os.getenv('CELERY_BROKER_URL', '').startswith('redis'):
+    REDIS_URL = urlunsplit(urlsplit(os.environ['CELERY_BROKER_URL'])._replace(path=f'/{REDIS_CACHE_DB}'))
+
+# Тесты не трогают общий Redis: фикстура вызывает cache.clear(), а это FLUSHDB
+# базы с лимитами, паузами, блокировками, состояниями и оплатами
+if os.getenv('PYTEST_RUNNING'):
+    REDIS_URL = None
+
+if REDIS_URL:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': REDIS_URL,
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        }
+    }
+
+
 # --- Django REST Framework / SimpleJWT ---
 
 REST_FRAMEWORK = {
@@ -87,6 +124,10 @@ CORS_ALLOW_CREDENTIALS = False
 SECRET_KEY = os.environ.get('SECRET_KEY')
 DEBUG = True
 
+if not DEBUG and not REDIS_URL:
+    # Локальный кеш процесса тихо ломает инвалидацию, блокировки и лимиты
+    raise ImproperlyConfigured('REDIS_URL (или redis CELERY_BROKER_URL) обязателен вне DEBUG')
+
 ALLOWED_HOSTS = [
     'guest-seasons.tech',
     'www.guest-seasons.tech',
@@ -121,6 +162,7 @@ INSTALLED_APPS = [
     'newsletters',
     'goods',
     'analytics',
+    'config',
 ]
 
 
@@ -211,6 +253,10 @@ STATIC_ROOT = BASE_DIR / 'staticfiles'
 MEDIA_URL = '/media/'
 MEDIA_ROOT = BASE_DIR / 'media'
 
+# Производные картинок (config/images.py)
+IMAGE_TELEGRAM_MAX_SIDE = 1280  # больше Telegram всё равно пережимает
+IMAGE_THUMBNAIL_MAX_SIDE = 320
+
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
 
@@ -221,6 +267,77 @@ PROVIDER_TOKEN = os.getenv('PROVIDER_TOKEN')
 PRICE = int(os.getenv('PRICE', '500'))
 CURRENCY = os.getenv('CURRENCY', 'RUB')
 MAXIMUM_USERS = int(os.getenv('MAXIMUM_USERS', '100'))
+
+# Asyncio-рантайм бота (manage.py runbot --async)
+BOT_ASYNC_DB_WORKERS = int(os.getenv('BOT_ASYNC_DB_WORKERS', '8'))  # потоки под ORM
+BOT_ASYNC_CONNECTIONS = int(os.getenv('BOT_ASYNC_CONNECTIONS', '100'))  # лимит aiohttp-коннектора
+
+# Вебхук: 'inline' — обработка в запросе, 'queue' — только запись в Redis Stream,
+# обработкой занимается пул процессов manage.py consume_updates
+BOT_WEBHOOK_MODE = os.getenv('BOT_WEBHOOK_MODE', 'inline')
+BOT_WEBHOOK_SECRET = os.getenv('BOT_WEBHOOK_SECRET')  # secret_token из setWebhook
+BOT_UPDATES_STREAM = 'bot:updates'
+# Потоки bot:updates:<n> по chat_id, на каждый — один процесс consume_updates
+BOT_UPDATES_PARTITIONS = int(os.getenv('BOT_UPDATES_PARTITIONS', '2'))
+BOT_UPDATES_STREAM_MAXLEN = 100_000
+BOT_UPDATES_BATCH = 100
+BOT_UPDATES_RECLAIM_MS = 60_000  # неподтверждённые апдейты забираются повторно через минуту
+BOT_UPDATES_MAX_DELIVERIES = 5  # потом апдейт подтверждается без обработки
+
+# Диспетчер апдейтов: один чат — последовательно, разные чаты — параллельно.
+# 0 — стандартный пул потоков TeleBot без гарантий порядка
+BOT_DISPATCHER_WORKERS = int(os.getenv('BOT_DISPATCHER_WORKERS', '8'))
+BOT_DISPATCHER_QUEUE_SIZE = 1000  # на шард; при переполнении polling ждёт
+
+# Лимиты отправки Bot API (общие для бота и воркеров celery через Redis)
+BOT_RATE_LIMIT_GLOBAL = 30  # сообщений в секунду на бота
+BOT_RATE_LIMIT_GLOBAL_BURST = 30
+BOT_RATE_LIMIT_CHAT = 1  # сообщений в секунду в один чат
+BOT_RATE_LIMIT_CHAT_BURST = 3  # ответ хендлера: альбом (одна отправка), текст и счёт
+BOT_RATE_LIMIT_BULK_RESERVE = 5  # токены, которые рассылки оставляют интерактиву
+BOT_RATE_LIMIT_MAX_429_RETRIES = 3
+
+# HTTP-пул к Bot API: keep-alive соединения на процесс
+BOT_HTTP_POOL_SIZE = int(os.getenv('BOT_HTTP_POOL_SIZE', '16'))
+BOT_HTTP_CONNECT_TIMEOUT = 5
+BOT_HTTP_READ_TIMEOUT = 30
+
+# Служебный чат, куда картинки загружаются заранее ради telegram_file_id
+BOT_MEDIA_STORAGE_CHAT_ID = int(os.getenv('BOT_MEDIA_STORAGE_CHAT_ID', '0')) or None
+
+# Один файл загружает один отправитель, остальные ждут его file_id
+BOT_UPLOAD_LOCK_TTL = 120
+BOT_UPLOAD_WAIT = 30
+BOT_UPLOAD_WAIT_INTERVAL = 0.5
+
+# Состояние пользователя чата для фильтров бота (Redis + LRU процесса)
+BOT_USER_STATE_TTL = 24 * 60 * 60
+BOT_USER_STATE_LOCAL_TTL = 2  # секунды: запись с другого процесса видна не позже
+BOT_USER_STATE_LRU_SIZE = 10_000
+
+# Резерв товара между pre_checkout и successful_payment
+GOODS_RESERVATION_TTL = 15 * 60
+
+# Журнал оплат: до скольких платежей пишется одним INSERT при всплеске
+PAYMENT_LEDGER_BATCH = 100
+PAYMENT_CLAIM_TTL = 24 * 60 * 60  # повторная доставка апдейта — в пределах суток
+
+# Рассылки: получатели обрабатываются пачками, одна задача celery на пачку
+NEWSLETTER_BATCH_SIZE = int(os.getenv('NEWSLETTER_BATCH_SIZE', '200'))
+NEWSLETTER_BATCH_MAX_RETRIES = 5
+NEWSLETTER_RESULTS_FLUSH = 50  # результатов доставки на один UPDATE
+NEWSLETTER_LEASE_TTL = 5 * 60  # аренда пачки/раскладки у живого воркера, продлевается по ходу
+
+# SSE-поток прогресса рассылок для дашборда (отдаёт ASGI-процесс sse, не gunicorn)
+NEWSLETTER_PROGRESS_INTERVAL = 2  # секунды между проверками счётчиков
+NEWSLETTER_PROGRESS_HEARTBEAT = 15
+NEWSLETTER_PROGRESS_STREAM_TTL = 5 * 60  # потом клиент переподключается
+NEWSLETTER_PROGRESS_TOKEN_TTL = 60  # токен из query string, только на подключение
+
+# Архив задач завершённых рассылок: строки уходят в gzip JSONL и удаляются из базы
+NEWSLETTER_ARCHIVE_AFTER_DAYS = int(os.getenv('NEWSLETTER_ARCHIVE_AFTER_DAYS', '30'))
+NEWSLETTER_ARCHIVE_DIR = Path(os.getenv('NEWSLETTER_ARCHIVE_DIR', BASE_DIR / 'archive' / 'newsletters'))
+NEWSLETTER_ARCHIVE_CHUNK = 1000  # строк на одну транзакцию DELETE
 # BOT_ADMINS = list(map(int, os.getenv('ADMINS', '').split(','))) if os.getenv('ADMINS') else []
 
 
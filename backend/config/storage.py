@@ -0,0 +1,119 @@
+import hashlib
+import os
+import re
+import tempfile
+from typing import Optional
+
+from django.core.files.storage import FileSystemStorage
+from django.db import IntegrityError, transaction
+from django.db.models import F
+from django.utils.deconstruct import deconstructible
+
+_PREFIX = 'cas'
+_NAME_RE = re.compile(rf'^{_PREFIX}/[0-9a-f]{{2}}/[0-9a-f]{{2}}/(?P<digest>[0-9a-f]{{64}})(\.\w+)?$')
+
+
+def digest_from_name(name: Optional[str]) -> Optional[str]:
+    '''sha256 файла из имени в хранилище по содержимому (None для старых файлов)'''
+    match = _NAME_RE.match(name or '')
+    return match.group('digest') if match else None
+
+
+def is_content_addressed(name: Optional[str]) -> bool:
+    return digest_from_name(name) is not None
+
+
+@deconstructible
+class ContentAddressedStorage(FileSystemStorage):
+    '''
+    Файлы раскладываются по sha256 содержимого: ``cas/ab/cd/<sha256>.<ext>``.
+
+    Хеш считается один раз, пока загрузка пишется во временный файл.
+    Одинаковое содержимое хранится в одном файле, а ``MediaBlob`` считает
+    ссылки на него: ``save`` добавляет ссылку, ``delete`` снимает, и файл
+    удаляется с диска вместе с последней ссылкой.
+    '''
+
+    def get_available_name(self, name, max_length=None):
+        # Имя определяется содержимым, суффиксы против коллизий не нужны
+        return name
+
+    def _save(self, name, content):
+        from config.models import MediaBlob
+
+        tmp_dir = self.path(f'{_PREFIX}/tmp')
+        os.makedirs(tmp_dir, exist_ok=True)
+
+        hasher = hashlib.sha256()
+        size = 0
+        fd, tmp_path = tempfile.mkstemp(dir=tmp_dir)
+        try:
+            with os.fdopen(fd, 'wb') as tmp:
+                for chunk in content.chunks():
+                    hasher.update(chunk)
+                    tmp.write(chunk)
+                    size += len(chunk)
+
+            digest = hasher.hexdigest()
+            ext = os.path.splitext(name)[1].lower()
+            name = f'{_PREFIX}/{digest[:2]}/{digest[2:4]}/{digest}{ext}'
+            path = self.path(name)
+
+            with transaction.atomic():
+                # Строка блокируется до проверки файла: параллельное удаление
+                # последней ссылки либо уже убрало файл, либо ждёт нас
+                if not MediaBlob.objects.filter(name=name).update(refcount=F('refcount') + 1):
+                    try:
+                        with transaction.atomic():
+                            MediaBlob.objects.create(name=name, size=size, refcount=1)
+                    except IntegrityError:
+                        MediaBlob.objects.filter(name=name).update(refcount=F('refcount') + 1)
+
+                if not os.path.exists(path):
+                    os.makedirs(os.path.dirname(path), exist_ok=True)
+                    os.replace(tmp_path, path)
+                    tmp_path = None
+                    if self.file_permissions_mode is not None:
+                        os.chmod(path, self.file_permissions_mode)
+        finally:
+            if tmp_path is not None:
+                try:
+                    os.remove(tmp_path)
+                except FileNotFoundError:
+                    pass
+
+        return name
+
+    def delete(self, name):
+        '''Снимает ссылку на файл; с диска он удаляется вместе с последней'''
+        if not is_content_addressed(name):
+            return super().delete(name)
+
+        from config.models import MediaBlob
+
+        with transaction.atomic():
+            blob = MediaBlob.objects.select_for_update().filter(name=name).first()
+            if blob is None:
+                # Ссылку уже сняли (повторное удаление) — файл не трогаем
+                return
+            if blob.refcount > 1:
+                MediaBlob.objects.filter(name=name).update(refcount=F('refcount') - 1)
+                return
+            blob.delete()
+            super().delete(name)
+
+    def discard(self, name):
+        '''Удаляет файл, если на него не осталось ссылок (строка с ним не записалась)'''
+        from config.models import MediaBlob
+
+        with transaction.atomic():
+            # get_or_create ждёт параллельную вставку той же строки, поэтому
+            # файл чужого незакоммиченного _save здесь не удалится
+            blob, _ = MediaBlob.objects.select_for_update().get_or_create(name=name)
+            if blob.refcount:
+                return
+            blob.delete()
+            super().delete(name)
+
+
+cas_storage = ContentAddressedStorage()
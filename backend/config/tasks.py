@@ -0,0 +1,27 @@
+import logging
+
+from celery import shared_task
+from django.apps import apps
+
+from config.images import variants_failed
+
+logger = logging.getLogger(__name__)
+
+
+@shared_task(ignore_result=True)
+def build_image_variants(model_label: str, pk: int):
+    '''Строит уменьшенные варианты картинки (Telegram и превью для админки)'''
+    instance = apps.get_model(model_label).objects.filter(pk=pk).first()
+    if instance is None:
+        return
+
+    try:
+        changed = instance.build_variants()
+    except Exception as e:
+        logger.warning(f'{model_label} {pk}: variants failed ({e})')
+        variants_failed.send(sender=type(instance), instance=instance)
+        return
+
+    if changed:
+        instance.save(update_fields=changed)
+        logger.info(f'{model_label} {pk}: built {", ".join(changed)}')
@@ -6,7 +6,7 @@ from rest_framework.routers import DefaultRouter
 
 from analytics.views import UsersAnalyticsAPIView
 from goods.views import GoodViewSet, GoodImageViewSet
-from newsletters.views import NewsletterViewSet
+from newsletters.views import NewsletterViewSet, progress_stream
 from rest_framework_simplejwt.views import TokenObtainPairView, TokenRefreshView, TokenBlacklistView
 from users.views import UserViewSet
 from bot.views import RegistrationStepViewSet, ConfigurationAPIView, webhook
@@ -22,6 +22,7 @@ router.register(r'bot/registration-steps', RegistrationStepViewSet, basename='bo
 urlpatterns = [
     path('admin/', admin.site.urls),
     path('api/analytics/users/', UsersAnalyticsAPIView.as_view(), name='users-analytics'),
+    path('api/newsletters/progress/stream/', progress_stream, name='newsletters-progress-stream'),
     path('api/', include(router.urls)),
     path('api/token/', TokenObtainPairView.as_view(), name='token_obtain_pair'),
     path('api/token/refresh/', TokenRefreshView.as_view(), name='token_refresh'),
@@ -2,7 +2,7 @@ from django.contrib import admin
 
 from goods.models import Good
 
-from goods.models import GoodImage
+from goods.models import GoodImage, Reservation
 
 
 
@@ -39,3 +39,12 @@ class GoodImageAdmin(admin.ModelAdmin):
     list_display = ["good", "image"]
 
 
+
+
+@admin.register(Reservation)
+class ReservationAdmin(admin.ModelAdmin):
+    """Админка для резервов товаров"""
+
+    list_display = ["good", "chat_id", "status", "expires_at", "created_at"]
+
+    list_filter = ["status"]
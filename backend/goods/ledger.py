@@ -0,0 +1,123 @@
+import logging
+import threading
+from decimal import Decimal
+from typing import Callable, List, Optional
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connection
+
+from goods.models import Order
+
+logger = logging.getLogger(__name__)
+
+
+class GroupCommitWriter:
+    '''
+    Групповая запись: потоки ставят строки в общий буфер и ждут их записи.
+
+    Первый свободный поток становится ведущим и пишет весь накопленный
+    буфер одним ``write_batch``. Пока он пишет, остальные копят следующую
+    пачку: при одиночных платежах это обычная запись одной строки, при
+    всплеске — один INSERT на десятки строк. Вызывающий возвращается
+    только после записи своей строки, поэтому буфер не теряется при падении.
+    '''
+
+    def __init__(self, write_batch: Callable[[list], None], max_batch: int):
+        self._write_batch = write_batch
+        self.max_batch = max_batch
+        self._cond = threading.Condition()
+        self._pending = []
+        self._flushing = False
+        self.batches = 0
+
+    def write(self, item) -> None:
+        entry = {'item': item, 'done': False, 'error': None}
+
+        with self._cond:
+            self._pending.append(entry)
+
+        while True:
+            with self._cond:
+                while self._flushing and not entry['done']:
+                    self._cond.wait()
+                if entry['done']:
+                    break
+                self._flushing = True
+                batch = self._pending[:self.max_batch]
+                del self._pending[:self.max_batch]
+
+            error = None
+            try:
+                self._write_batch([e['item'] for e in batch])
+            except Exception as e:
+                error = e
+            finally:
+                with self._cond:
+                    for e in batch:
+                        e['done'], e['error'] = True, error
+                    self._flushing = False
+                    self.batches += 1
+                    self._cond.notify_all()
+
+        if entry['error'] is not None:
+            raise entry['error']
+
+
+def _bulk_insert(orders: List[Order]) -> None:
+    # Повторно доставленный платёж уже в журнале — конфликт по charge_id пропускаем
+    Order.objects.bulk_create(orders, ignore_conflicts=True)
+
+
+_writer = GroupCommitWriter(_bulk_insert, settings.PAYMENT_LEDGER_BATCH)
+
+
+def _claim_key(charge_id: str) -> str:
+    return f'payments:charge:{charge_id}'
+
+
+def claim_payment(charge_id: str) -> bool:
+    '''
+    Закрепляет платёж за текущим обработчиком.
+
+    False — платёж уже обработан (повторная доставка апдейта).
+    '''
+    try:
+        if not cache.add(_claim_key(charge_id), 1, settings.PAYMENT_CLAIM_TTL):
+            return False
+    except Exception as e:
+        logger.warning(f'Payment claim cache unavailable: {e}')
+
+    # Кеш мог потерять ключ: журнал — окончательный источник
+    return not Order.objects.filter(telegram_payment_charge_id=charge_id).exists()
+
+
+def release_payment(charge_id: str) -> None:
+    '''Снимает закрепление, если обработка платежа упала (апдейт придёт снова)'''
+    cache.delete(_claim_key(charge_id))
+
+
+def record_payment(
+        payment,
+        chat_id: int,
+        kind: str,
+        user_id: Optional[int] = None,
+        good_id: Optional[int] = None,
+) -> None:
+    '''Добавляет платёж в журнал (SuccessfulPayment из апдейта Telegram)'''
+    order = Order(
+        kind=kind,
+        good_id=good_id,
+        user_id=user_id,
+        chat_id=chat_id,
+        telegram_payment_charge_id=payment.telegram_payment_charge_id,
+        provider_payment_charge_id=payment.provider_payment_charge_id or '',
+        amount=Decimal(payment.total_amount) / 100,
+        currency=payment.currency,
+    )
+
+    if connection.in_atomic_block:
+        # Внутри чужой транзакции пачка других потоков откатилась бы вместе с ней
+        _bulk_insert([order])
+        return
+    _writer.write(order)
@@ -0,0 +1,35 @@
+# Generated by Django 4.2.7 on 2026-10-18 05:06
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('goods', '0003_goodimage_hash'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='goodimage',
+            name='hash',
+            field=models.CharField(blank=True, db_index=True, max_length=64, null=True),
+        ),
+        migrations.CreateModel(
+            name='Reservation',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('chat_id', models.BigIntegerField(verbose_name='Чат покупателя')),
+                ('status', models.CharField(choices=[('held', 'Отложен'), ('confirmed', 'Оплачен'), ('released', 'Снят')], default='held', max_length=16, verbose_name='Статус')),
+                ('expires_at', models.DateTimeField(verbose_name='Резерв действует до')),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('good', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='reservations', to='goods.good', verbose_name='Товар')),
+            ],
+            options={
+                'verbose_name': 'Резерв',
+                'verbose_name_plural': 'Резервы',
+                'indexes': [models.Index(fields=['status', 'expires_at'], name='goods_reser_status_8b354a_idx'), models.Index(fields=['chat_id', 'good', 'status'], name='goods_reser_chat_id_3ca886_idx')],
+            },
+        ),
+    ]
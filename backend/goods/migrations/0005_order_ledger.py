@@ -0,0 +1,62 @@
+# Generated by Django 4.2.7 on 2026-10-18 05:08
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('goods', '0004_reservation'),
+    ]
+
+    # До журнала оплат заказы не записывались, таблица пустая
+    operations = [
+        migrations.AddField(
+            model_name='order',
+            name='amount',
+            field=models.DecimalField(decimal_places=2, default=0, max_digits=10, verbose_name='Сумма'),
+            preserve_default=False,
+        ),
+        migrations.AddField(
+            model_name='order',
+            name='chat_id',
+            field=models.BigIntegerField(default=0, verbose_name='Чат покупателя'),
+            preserve_default=False,
+        ),
+        migrations.AddField(
+            model_name='order',
+            name='currency',
+            field=models.CharField(default='RUB', max_length=3, verbose_name='Валюта'),
+            preserve_default=False,
+        ),
+        migrations.AddField(
+            model_name='order',
+            name='kind',
+            field=models.CharField(choices=[('registration', 'Регистрация'), ('good', 'Товар')], default='good', max_length=16, verbose_name='Что оплачено'),
+        ),
+        migrations.AddField(
+            model_name='order',
+            name='provider_payment_charge_id',
+            field=models.CharField(blank=True, max_length=255, verbose_name='ID платежа провайдера'),
+        ),
+        migrations.AddField(
+            model_name='order',
+            name='telegram_payment_charge_id',
+            field=models.CharField(default='', max_length=255, unique=True, verbose_name='ID платежа Telegram'),
+            preserve_default=False,
+        ),
+        migrations.AlterField(
+            model_name='order',
+            name='good',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.PROTECT, related_name='orders', to='goods.good', verbose_name='Заказы'),
+        ),
+        migrations.AddIndex(
+            model_name='order',
+            index=models.Index(fields=['good', 'created_at'], name='goods_order_good_id_e093cf_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='order',
+            index=models.Index(fields=['created_at'], name='goods_order_created_dd32db_idx'),
+        ),
+    ]
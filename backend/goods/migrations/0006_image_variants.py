@@ -0,0 +1,23 @@
+# Generated by Django 4.2.7 on 2026-10-18 05:15
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('goods', '0005_order_ledger'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='goodimage',
+            name='telegram_image',
+            field=models.ImageField(blank=True, editable=False, null=True, upload_to='variants/'),
+        ),
+        migrations.AddField(
+            model_name='goodimage',
+            name='thumbnail',
+            field=models.ImageField(blank=True, editable=False, null=True, upload_to='variants/'),
+        ),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 4.2.7 on 2026-10-18 05:18
+
+import config.storage
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('goods', '0006_image_variants'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='goodimage',
+            name='image',
+            field=models.ImageField(storage=config.storage.ContentAddressedStorage(), upload_to='goods/'),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 4.2.7 on 2026-10-18 05:52
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('goods', '0007_content_addressed_image'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='reservation',
+            name='status',
+            field=models.CharField(choices=[('held', 'Отложен'), ('confirmed', 'Оплачен'), ('released', 'Снят'), ('oversold', 'Оплачен без товара')], default='held', max_length=16, verbose_name='Статус'),
+        ),
+    ]
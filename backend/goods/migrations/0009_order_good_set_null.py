@@ -0,0 +1,19 @@
+# Generated by Django 4.2.7 on 2026-10-18 06:01
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('goods', '0008_reservation_oversold'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='order',
+            name='good',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='orders', to='goods.good', verbose_name='Заказы'),
+        ),
+    ]
@@ -4,6 +4,7 @@ from django.db import models
 from goods.provider import generate_provider_data
 from users.models import User
 from config.models import BaseImage
+from config.storage import cas_storage
 
 class Good(models.Model):
     class Meta:
@@ -54,7 +55,7 @@ class GoodImage(BaseImage):
         verbose_name_plural = "Фотографии товара"
 
     good = models.ForeignKey(Good, on_delete=models.CASCADE, related_name="images", verbose_name="Товар")
-    image = models.ImageField(upload_to="goods/")
+    image = models.ImageField(upload_to="goods/", storage=cas_storage)
     is_invoice = models.BooleanField(default=False,
                                      verbose_name="Фото в оплате",
                                      help_text="Если ни одно не отмечено, используется первое из предоставленных")
@@ -73,15 +74,37 @@ class GoodImage(BaseImage):
         super().save(*args, **kwargs)
 
 class Order(models.Model):
+    '''Запись журнала оплат: одна строка на платёж Telegram, только добавление'''
     class Meta:
         verbose_name = "Заказ"
         verbose_name_plural = "Заказы"
+        indexes = [
+            models.Index(fields=["good", "created_at"]),
+            models.Index(fields=["created_at"]),
+        ]
+
+    REGISTRATION = "registration"
+    GOOD = "good"
+    KIND_CHOICES = [
+        (REGISTRATION, "Регистрация"),
+        (GOOD, "Товар"),
+    ]
+
+    kind = models.CharField(
+        max_length=16,
+        choices=KIND_CHOICES,
+        default=GOOD,
+        verbose_name="Что оплачено",
+    )
 
     good = models.ForeignKey(
         Good,
         related_name="orders",
         verbose_name="Заказы",
-        on_delete=models.PROTECT,
+        # Товар можно удалить и после продаж: сумма, валюта и чат остаются в журнале
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
     )
 
     user = models.ForeignKey(
@@ -92,6 +115,77 @@ class Order(models.Model):
         null=True,
     )
 
+    chat_id = models.BigIntegerField(verbose_name="Чат покупателя")
+
+    telegram_payment_charge_id = models.CharField(
+        max_length=255,
+        unique=True,
+        verbose_name="ID платежа Telegram",
+    )
+
+    provider_payment_charge_id = models.CharField(
+        max_length=255,
+        blank=True,
+        verbose_name="ID платежа провайдера",
+    )
+
+    amount = models.DecimalField(
+        max_digits=10,
+        decimal_places=2,
+        verbose_name="Сумма",
+    )
+
+    currency = models.CharField(max_length=3, verbose_name="Валюта")
+
     created_at = models.DateTimeField(
         auto_now_add=True,
     )
+
+    def __str__(self):
+        return f"{self.kind} {self.amount} {self.currency} ({self.telegram_payment_charge_id})"
+
+
+class Reservation(models.Model):
+    '''Товар, отложенный под оплату между pre_checkout и successful_payment'''
+    class Meta:
+        verbose_name = "Резерв"
+        verbose_name_plural = "Резервы"
+        indexes = [
+            models.Index(fields=["status", "expires_at"]),
+            models.Index(fields=["chat_id", "good", "status"]),
+        ]
+
+    HELD = "held"
+    CONFIRMED = "confirmed"
+    RELEASED = "released"
+    # Оплачен после истечения резерва, а товар уже разобран: нужен возврат
+    OVERSOLD = "oversold"
+    STATUS_CHOICES = [
+        (HELD, "Отложен"),
+        (CONFIRMED, "Оплачен"),
+        (RELEASED, "Снят"),
+        (OVERSOLD, "Оплачен без товара"),
+    ]
+
+    good = models.ForeignKey(
+        Good,
+        related_name="reservations",
+        verbose_name="Товар",
+        on_delete=models.CASCADE,
+    )
+
+    chat_id = models.BigIntegerField(verbose_name="Чат покупателя")
+
+    status = models.CharField(
+        max_length=16,
+        choices=STATUS_CHOICES,
+        default=HELD,
+        verbose_name="Статус",
+    )
+
+    expires_at = models.DateTimeField(verbose_name="Резерв действует до")
+
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"{self.good_id} для {self.chat_id} ({self.status})"
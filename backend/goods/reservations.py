@@ -0,0 +1,112 @@
+import logging
+from datetime import timedelta
+from typing import Optional
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count, F
+from django.utils import timezone
+
+from goods.models import Good, Reservation
+
+logger = logging.getLogger(__name__)
+
+
+def _take_stock(good_id: int) -> bool:
+    '''Списывает единицу товара одним условным UPDATE (без read-modify-write)'''
+    return Good.objects.filter(
+        pk=good_id, available=True, quantity__gt=0
+    ).update(quantity=F('quantity') - 1) == 1
+
+
+def reserve(good_id: int, chat_id: int) -> bool:
+    '''
+    Откладывает товар под оплату на время pre_checkout.
+
+    Повторная оплата того же товара продлевает уже выданный резерв.
+    Возвращает False, если товар закончился.
+    '''
+    expires_at = timezone.now() + timedelta(seconds=settings.GOODS_RESERVATION_TTL)
+
+    with transaction.atomic():
+        extended = Reservation.objects.filter(
+            good_id=good_id, chat_id=chat_id, status=Reservation.HELD
+        ).update(expires_at=expires_at)
+        if extended:
+            return True
+
+        if not _take_stock(good_id):
+            return False
+
+        Reservation.objects.create(good_id=good_id, chat_id=chat_id, expires_at=expires_at)
+    return True
+
+
+def confirm(good_id: int, chat_id: int) -> bool:
+    '''
+    Подтверждает резерв после successful_payment.
+
+    Если резерв уже истёк и снят, товар списывается заново. Если товара
+    не осталось, оплата всё равно фиксируется резервом со статусом
+    OVERSOLD (для админки: возврат или выдача вручную) и возвращается False.
+    '''
+    with transaction.atomic():
+        reservation = (
+            Reservation.objects
+            .select_for_update()
+            .filter(good_id=good_id, chat_id=chat_id, status=Reservation.HELD)
+            .order_by('created_at')
+            .first()
+        )
+        if reservation is not None:
+            reservation.status = Reservation.CONFIRMED
+            reservation.save(update_fields=['status'])
+            return True
+
+        in_stock = bool(Good.objects.filter(pk=good_id, quantity__gt=0).update(quantity=F('quantity') - 1))
+        if not in_stock:
+            logger.error(f'Good {good_id} paid by {chat_id} but out of stock')
+
+        Reservation.objects.create(
+            good_id=good_id,
+            chat_id=chat_id,
+            status=Reservation.CONFIRMED if in_stock else Reservation.OVERSOLD,
+            expires_at=timezone.now(),
+        )
+    return in_stock
+
+
+def release_expired(limit: int = 1000) -> int:
+    '''Снимает истёкшие резервы и возвращает товар на склад'''
+    with transaction.atomic():
+        ids = list(
+            Reservation.objects
+            .select_for_update(skip_locked=True)
+            .filter(status=Reservation.HELD, expires_at__lt=timezone.now())
+            .values_list('pk', flat=True)[:limit]
+        )
+        if not ids:
+            return 0
+
+        per_good = (
+            Reservation.objects
+            .filter(pk__in=ids)
+            .values('good_id')
+            .annotate(count=Count('pk'))
+            .order_by('good_id')
+        )
+        for row in per_good:
+            Good.objects.filter(pk=row['good_id']).update(quantity=F('quantity') + row['count'])
+
+        Reservation.objects.filter(pk__in=ids).update(status=Reservation.RELEASED)
+
+    logger.info(f'Released {len(ids)} expired reservations')
+    return len(ids)
+
+
+def parse_good_payload(payload: str) -> Optional[int]:
+    '''id товара из payload инвойса вида good_<id>'''
+    if not payload.startswith('good_'):
+        return None
+    good_id = payload[len('good_'):]
+    return int(good_id) if good_id.isdigit() else None
@@ -6,8 +6,8 @@ from goods.models import GoodImage, Good
 class GoodImageSerializer(serializers.ModelSerializer):
     class Meta:
         model = GoodImage
-        fields = ['id', 'image', 'is_invoice']
-        read_only_fields = ['id']
+        fields = ['id', 'image', 'is_invoice', 'telegram_image', 'thumbnail']
+        read_only_fields = ['id', 'telegram_image', 'thumbnail']
 
     def validate(self, attrs):
         good = attrs.get('good') or (self.instance.good if self.instance else None)
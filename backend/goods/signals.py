@@ -1,6 +1,8 @@
-from django.db.models.signals import post_delete, pre_save
+from django.db.models.signals import post_delete, post_save, pre_save
 from django.dispatch import receiver
 
+from config.images import delete_unused_variants, schedule_variants
+from config.storage import is_content_addressed
 from goods.models import GoodImage
 
 @receiver(pre_save, sender=GoodImage)
@@ -15,6 +17,14 @@ def goodimage_delete_old_file_on_change(sender, instance: GoodImage, **kwargs):
 
     if old.image and instance.image and old.image.name != instance.image.name:
         old.image.delete(save=False)
+        # Варианты старого файла больше не подходят
+        delete_unused_variants(old, old.VARIANT_FIELDS.values())
+        instance.telegram_image = instance.thumbnail = None
+
+
+@receiver(post_save, sender=GoodImage)
+def goodimage_build_variants(sender, instance: GoodImage, **kwargs):
+    schedule_variants(instance, 'image', instance.VARIANT_FIELDS)
 
 @receiver(post_delete, sender=GoodImage)
 def delete_physical_file(sender, instance, **kwargs):
@@ -24,9 +34,9 @@ def delete_physical_file(sender, instance, **kwargs):
         return
 
     file_path = instance.image.name
-    still_used = sender.objects.filter(image=file_path).exists()
 
-    if not still_used:
-        storage = instance.image.storage
-        if storage.exists(file_path):
-            storage.delete(file_path)
\ No newline at end of file
+    # Файл по содержимому сам считает ссылки; старые файлы проверяем по базе
+    if is_content_addressed(file_path) or not sender.objects.filter(image=file_path).exists():
+        instance.image.storage.delete(file_path)
+
+    delete_unused_variants(instance, instance.VARIANT_FIELDS.values())
\ No newline at end of file
@@ -0,0 +1,14 @@
+import logging
+
+from celery import shared_task
+
+from goods.reservations import release_expired
+
+logger = logging.getLogger(__name__)
+
+
+@shared_task(ignore_result=True)
+def release_expired_reservations():
+    '''Возвращает на склад товары из неоплаченных резервов'''
+    while release_expired():
+        pass
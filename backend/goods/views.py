@@ -1,4 +1,9 @@
+from datetime import timedelta
+
+from django.db.models import Count, Sum
+from django.db.models.functions import TruncDate
 from django.shortcuts import render
+from django.utils import timezone
 from rest_framework import viewsets, status
 from rest_framework.decorators import action
 from rest_framework.pagination import PageNumberPagination
@@ -6,7 +11,7 @@ from rest_framework.response import Response
 
 from bot.management.commands.runbot import logger
 from config.utils import UploadImageMixin
-from goods.models import Good, GoodImage
+from goods.models import Good, GoodImage, Order
 from goods.serializers import GoodSerializer, GoodImageSerializer
 import logging
 
@@ -38,6 +43,25 @@ class GoodViewSet(UploadImageMixin, viewsets.ModelViewSet):
 
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
+    @action(detail=False, methods=['get'], url_path='sales')
+    def sales(self, request):
+        '''Выручка по дням и товарам из журнала оплат (?days=30)'''
+        try:
+            days = int(request.query_params.get('days', 30))
+        except ValueError:
+            return Response({'days': 'Ожидается число'}, status=status.HTTP_400_BAD_REQUEST)
+
+        since = timezone.now() - timedelta(days=days)
+        rows = (
+            Order.objects
+            .filter(created_at__gte=since)
+            .annotate(day=TruncDate('created_at'))
+            .values('day', 'kind', 'good_id', 'good__title')
+            .annotate(orders=Count('pk'), revenue=Sum('amount'))
+            .order_by('day', 'kind', 'good_id')
+        )
+        return Response(list(rows))
+
 class GoodImageViewSet(viewsets.ModelViewSet):
     serializer_class = GoodImageSerializer
 
@@ -0,0 +1,98 @@
+import gzip
+import json
+import logging
+from pathlib import Path
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count
+from django.utils import timezone
+
+from newsletters.models import Newsletter, NewsletterBatch, NewsletterTask
+
+logger = logging.getLogger(__name__)
+
+FINISHED_STATUSES = ['sent', 'failed', 'partial']
+
+_TASK_FIELDS = ('id', 'user_id', 'status', 'channel_sent', 'error_message', 'created_at', 'sent_at')
+
+
+def archive_path(newsletter_id: int) -> Path:
+    return Path(settings.NEWSLETTER_ARCHIVE_DIR) / f'newsletter-{newsletter_id}.jsonl.gz'
+
+
+def archivable_newsletters():
+    '''Завершённые рассылки старше срока хранения, задачи которых ещё в базе'''
+    cutoff = timezone.now() - timezone.timedelta(days=settings.NEWSLETTER_ARCHIVE_AFTER_DAYS)
+    return Newsletter.objects.filter(
+        status__in=FINISHED_STATUSES,
+        sent_at__lt=cutoff,
+        archived_at__isnull=True,
+    ).order_by('sent_at')
+
+
+def _roll_up(newsletter: Newsletter) -> None:
+    '''Итоги рассылки по задачам, пока они ещё в базе'''
+    stats = dict(newsletter.tasks.values_list('status').annotate(count=Count('id')))
+    Newsletter.objects.filter(pk=newsletter.pk).update(
+        total=max(newsletter.total, sum(stats.values())),
+        sent_count=stats.get('sent', 0),
+        failed_count=stats.get('failed', 0),
+    )
+
+
+def archive_newsletter(newsletter: Newsletter, chunk: int = None) -> int:
+    '''
+    Переносит задачи рассылки в ``<id>.jsonl.gz`` и удаляет их из базы.
+
+    Строки читаются по ключу (id > последнего), каждая пачка сначала
+    дописывается в архив, потом удаляется своей короткой транзакцией —
+    SQLite не блокируется надолго. Прерванный перенос продолжается с
+    того же места: уже удалённые строки в архиве, новые дописываются
+    в конец файла (gzip допускает несколько секций подряд). Итоги
+    считаются один раз, до первого удаления: файл архива появляется
+    только после них, поэтому продолжение их не пересчитывает.
+    '''
+    chunk = chunk or settings.NEWSLETTER_ARCHIVE_CHUNK
+    path = archive_path(newsletter.pk)
+    path.parent.mkdir(parents=True, exist_ok=True)
+
+    if not path.exists():
+        _roll_up(newsletter)
+
+    moved = 0
+    last_id = 0
+    while True:
+        rows = list(
+            NewsletterTask.objects
+            .filter(newsletter_id=newsletter.pk, pk__gt=last_id)
+            .order_by('pk')
+            .values(*_TASK_FIELDS)[:chunk]
+        )
+        if not rows:
+            break
+
+        with gzip.open(path, 'at', encoding='utf-8') as archive:
+            for row in rows:
+                archive.write(json.dumps(row, ensure_ascii=False, default=str) + '\n')
+
+        ids = [row['id'] for row in rows]
+        with transaction.atomic():
+            NewsletterTask.objects.filter(pk__in=ids).delete()
+
+        moved += len(rows)
+        last_id = ids[-1]
+
+    # Курсоры отправки больше не нужны
+    NewsletterBatch.objects.filter(newsletter_id=newsletter.pk).delete()
+    Newsletter.objects.filter(pk=newsletter.pk).update(archived_at=timezone.now())
+    logger.info(f'Newsletter {newsletter.pk}: {moved} tasks archived to {path}')
+    return moved
+
+
+def archive_old_newsletters(limit: int = 50) -> int:
+    '''Архивирует до ``limit`` рассылок, возвращает число перенесённых задач'''
+    moved = 0
+    for newsletter in archivable_newsletters()[:limit]:
+        moved += archive_newsletter(newsletter)
+    return moved
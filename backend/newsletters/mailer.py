@@ -0,0 +1,90 @@
+import logging
+import smtplib
+import time
+
+from django.conf import settings
+from django.core.mail import EmailMultiAlternatives, get_connection
+
+logger = logging.getLogger(__name__)
+
+# Обрыв соединения: переподключаемся и повторяем письмо. Отказ сервера
+# принять конкретное письмо (SMTPRecipientsRefused и т.п.) — ошибка получателя
+_CONNECTION_ERRORS = (smtplib.SMTPServerDisconnected, ConnectionError, TimeoutError)
+
+
+def build_email(subject: str, text: str, html: str, to: str) -> EmailMultiAlternatives:
+    message = EmailMultiAlternatives(
+        subject=subject,
+        body=text,
+        from_email=settings.DEFAULT_FROM_EMAIL,
+        to=[to],
+    )
+    message.attach_alternative(html, 'text/html')
+    return message
+
+
+class NewsletterMailer:
+    '''
+    Отправка писем рассылки через одно SMTP-соединение.
+
+    ``send_mail`` на каждое письмо заново подключается, делает STARTTLS
+    и логинится. Здесь соединение открывается при первом письме пачки,
+    живёт до ``close`` и переоткрывается, если сервер его оборвал.
+    '''
+
+    def __init__(self, backend: str = None):
+        self._backend = backend
+        self.connection = None
+        self.sent = 0
+        self.reconnects = 0
+        self._started = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def _connect(self) -> None:
+        self.connection = get_connection(self._backend, fail_silently=False)
+        # Открытое заранее соединение send_messages не закрывает за собой
+        self.connection.open()
+
+    def _reconnect(self) -> None:
+        try:
+            self.connection.close()
+        except Exception:
+            pass
+        self.reconnects += 1
+        self._connect()
+
+    def send(self, message: EmailMultiAlternatives) -> None:
+        '''Отправляет письмо; ошибка получателя пробрасывается вызывающему'''
+        if self.connection is None:
+            self._started = time.monotonic()
+            self._connect()
+
+        try:
+            self.connection.send_messages([message])
+        except _CONNECTION_ERRORS as e:
+            logger.warning(f'SMTP connection lost ({e}), reconnecting')
+            self._reconnect()
+            self.connection.send_messages([message])
+
+        self.sent += 1
+
+    def close(self) -> None:
+        if self.connection is None:
+            return
+
+        try:
+            self.connection.close()
+        except Exception as e:
+            logger.warning(f'SMTP connection close failed: {e}')
+        self.connection = None
+
+        elapsed = max(time.monotonic() - self._started, 1e-6)
+        logger.info(
+            f'Newsletter emails: {self.sent} sent in {elapsed:.1f}s '
+            f'({self.sent / elapsed:.1f}/s, reconnects: {self.reconnects})'
+        )
@@ -0,0 +1,28 @@
+# Generated by Django 4.2.7 on 2026-10-18 05:15
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('newsletters', '0003_newsletterimage_hash'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='newsletterimage',
+            name='telegram_image',
+            field=models.ImageField(blank=True, editable=False, null=True, upload_to='variants/'),
+        ),
+        migrations.AddField(
+            model_name='newsletterimage',
+            name='thumbnail',
+            field=models.ImageField(blank=True, editable=False, null=True, upload_to='variants/'),
+        ),
+        migrations.AlterField(
+            model_name='newsletterimage',
+            name='hash',
+            field=models.CharField(blank=True, db_index=True, max_length=64, null=True),
+        ),
+    ]
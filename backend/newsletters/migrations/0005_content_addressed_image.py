@@ -0,0 +1,19 @@
+# Generated by Django 4.2.7 on 2026-10-18 05:18
+
+import config.storage
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('newsletters', '0004_image_variants'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='newsletterimage',
+            name='image',
+            field=models.ImageField(null=True, storage=config.storage.ContentAddressedStorage(), upload_to='newsletters/'),
+        ),
+    ]
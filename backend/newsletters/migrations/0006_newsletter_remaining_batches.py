@@ -0,0 +1,18 @@
+# Generated by Django 4.2.7 on 2026-10-18 05:24
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('newsletters', '0005_content_addressed_image'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='newsletter',
+            name='remaining_batches',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+    ]
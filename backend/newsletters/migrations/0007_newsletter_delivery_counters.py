@@ -0,0 +1,37 @@
+# Generated by Django 4.2.7 on 2026-10-18 05:29
+
+from django.db import migrations, models
+from django.db.models import Count, Q
+
+
+def fill_counters(apps, schema_editor):
+    Newsletter = apps.get_model('newsletters', 'Newsletter')
+    counters = Newsletter.objects.annotate(
+        sent=Count('tasks', filter=Q(tasks__status='sent')),
+        failed=Count('tasks', filter=Q(tasks__status='failed')),
+    )
+    for newsletter in counters:
+        Newsletter.objects.filter(pk=newsletter.pk).update(
+            sent_count=newsletter.sent, failed_count=newsletter.failed,
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('newsletters', '0006_newsletter_remaining_batches'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='newsletter',
+            name='failed_count',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='Ошибок'),
+        ),
+        migrations.AddField(
+            model_name='newsletter',
+            name='sent_count',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='Отправлено'),
+        ),
+        migrations.RunPython(fill_counters, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 4.2.7 on 2026-10-18 05:32
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('newsletters', '0007_newsletter_delivery_counters'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='newsletter',
+            name='archived_at',
+            field=models.DateTimeField(blank=True, editable=False, null=True, verbose_name='Задачи в архиве'),
+        ),
+    ]
@@ -0,0 +1,35 @@
+# Generated by Django 4.2.7 on 2026-10-18 05:34
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('newsletters', '0008_newsletter_archived_at'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='newsletter',
+            name='dispatched_at',
+            field=models.DateTimeField(blank=True, editable=False, null=True),
+        ),
+        migrations.CreateModel(
+            name='NewsletterBatch',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('first_user_id', models.PositiveIntegerField(verbose_name='Первый пользователь')),
+                ('last_user_id', models.PositiveIntegerField(verbose_name='Последний пользователь')),
+                ('cursor', models.PositiveIntegerField(default=0, verbose_name='Обработано до пользователя')),
+                ('finished_at', models.DateTimeField(blank=True, null=True, verbose_name='Завершена')),
+                ('newsletter', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='batches', to='newsletters.newsletter', verbose_name='Рассылка')),
+            ],
+            options={
+                'verbose_name': 'Пачка рассылки',
+                'verbose_name_plural': 'Пачки рассылок',
+                'indexes': [models.Index(fields=['newsletter', 'finished_at'], name='newsletters_newslet_d7980d_idx')],
+            },
+        ),
+    ]
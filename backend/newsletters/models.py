@@ -1,6 +1,7 @@
 from django.core.exceptions import ValidationError
 from django.db import models
 from config.models import BaseImage
+from config.storage import cas_storage
 from users.models import User
 
 
@@ -52,15 +53,33 @@ class Newsletter(models.Model):
 
 
     total = models.IntegerField(default=0, verbose_name="Всего получателей")
-    # sent_count = models.IntegerField(default=0) Убрал, потому что поле вычисляемое
-    # failed = models.IntegerField(default=0, verbose_name="Количество проваленных")
+    # Счётчики доставки: пишутся пачками вместе с результатами задач (F() + n),
+    # чтобы прогресс не считался COUNT по задачам
+    sent_count = models.PositiveIntegerField(default=0, editable=False, verbose_name="Отправлено")
+    failed_count = models.PositiveIntegerField(default=0, editable=False, verbose_name="Ошибок")
+    # Пачки получателей, которые ещё не обработаны; последняя завершает рассылку
+    remaining_batches = models.PositiveIntegerField(default=0, editable=False)
+    # Все получатели разложены по пачкам (до этого рассылка не может завершиться)
+    dispatched_at = models.DateTimeField(null=True, blank=True, editable=False)
 
     created_at = models.DateTimeField(auto_now_add=True, verbose_name="Дата создания")
     sent_at = models.DateTimeField(null=True, blank=True, verbose_name="Дата отправки")
+    # Задачи перенесены в архив: итоги остаются в total/sent_count/failed_count
+    archived_at = models.DateTimeField(null=True, blank=True, editable=False, verbose_name="Задачи в архиве")
 
     def __str__(self):
         return f"{self.title}"
 
+    @property
+    def pending_count(self) -> int:
+        return max(self.total - self.sent_count - self.failed_count, 0)
+
+    @property
+    def progress(self) -> float:
+        if self.status in ['sent', 'partial']:
+            return 100
+        return self.sent_count / (self.total or 1) * 100
+
 
 
 class NewsletterTask(models.Model):
@@ -120,10 +139,40 @@ class NewsletterTask(models.Model):
     def __str__(self):
         return f"{self.newsletter.title} -> {self.user.username} ({self.get_status_display()})"
 
+class NewsletterBatch(models.Model):
+    """Пачка получателей рассылки: диапазон id пользователей и курсор отправки.
+
+    Курсор — последний обработанный ``user_id``; он пишется вместе с
+    результатами задач, поэтому после падения воркера пачка продолжается
+    с места остановки, а не с начала.
+    """
+
+    class Meta:
+        verbose_name = "Пачка рассылки"
+        verbose_name_plural = "Пачки рассылок"
+        indexes = [
+            models.Index(fields=['newsletter', 'finished_at'])]
+
+    newsletter = models.ForeignKey(
+        Newsletter,
+        on_delete=models.CASCADE,
+        related_name='batches',
+        verbose_name="Рассылка"
+    )
+    first_user_id = models.PositiveIntegerField(verbose_name="Первый пользователь")
+    last_user_id = models.PositiveIntegerField(verbose_name="Последний пользователь")
+    cursor = models.PositiveIntegerField(default=0, verbose_name="Обработано до пользователя")
+    finished_at = models.DateTimeField(null=True, blank=True, verbose_name="Завершена")
+
+    def __str__(self):
+        return f"{self.newsletter_id}: {self.first_user_id}-{self.last_user_id}"
+
+
 class NewsletterImage(BaseImage):
     image = models.ImageField(
         null=True,
         upload_to='newsletters/',
+        storage=cas_storage,
     )
 
     newsletter = models.ForeignKey(
@@ -0,0 +1,84 @@
+import asyncio
+import json
+import time
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core import signing
+
+from newsletters.models import Newsletter
+
+_FIELDS = ('id', 'status', 'total', 'sent_count', 'failed_count')
+
+_TOKEN_SALT = 'newsletters.progress'
+
+
+def stream_token(user) -> str:
+    '''Короткоживущий токен для EventSource: заголовок Authorization он не отправляет'''
+    return signing.dumps(user.pk, salt=_TOKEN_SALT)
+
+
+def check_stream_token(token: str) -> bool:
+    try:
+        signing.loads(token, salt=_TOKEN_SALT, max_age=settings.NEWSLETTER_PROGRESS_TOKEN_TTL)
+    except signing.BadSignature:
+        return False
+    return True
+
+
+def progress_snapshot() -> dict:
+    '''Прогресс всех рассылок одним запросом по счётчикам (без COUNT по задачам)'''
+    snapshot = {}
+    for newsletter in Newsletter.objects.only(*_FIELDS).order_by():
+        snapshot[newsletter.pk] = {
+            'id': newsletter.pk,
+            'status': newsletter.status,
+            'total': newsletter.total,
+            'sent': newsletter.sent_count,
+            'failed': newsletter.failed_count,
+            'pending': newsletter.pending_count,
+            'progress': newsletter.progress,
+        }
+    return snapshot
+
+
+def _event(name: str, data) -> str:
+    return f'event: {name}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n'
+
+
+async def progress_events(sleep=asyncio.sleep, clock=time.monotonic):
+    '''
+    Server-Sent Events с прогрессом рассылок.
+
+    Генератор асинхронный: между проверками соединение не занимает поток,
+    а ORM вызывается только на короткий снимок счётчиков.
+
+    Первое событие ``snapshot`` — все рассылки, дальше ``progress`` только
+    с изменившимися (и ``removed`` с удалёнными). Между проверками —
+    ``NEWSLETTER_PROGRESS_INTERVAL`` секунд, в тишине идёт комментарий-пинг,
+    чтобы прокси не закрыл соединение. Поток живёт
+    ``NEWSLETTER_PROGRESS_STREAM_TTL`` секунд, потом EventSource переподключается.
+    '''
+    started = last_sent = clock()
+    previous = await sync_to_async(progress_snapshot)()
+    yield f'retry: {settings.NEWSLETTER_PROGRESS_INTERVAL * 1000}\n\n'
+    yield _event('snapshot', list(previous.values()))
+
+    while clock() - started < settings.NEWSLETTER_PROGRESS_STREAM_TTL:
+        await sleep(settings.NEWSLETTER_PROGRESS_INTERVAL)
+
+        current = await sync_to_async(progress_snapshot)()
+        changed = [row for pk, row in current.items() if previous.get(pk) != row]
+        removed = [pk for pk in previous if pk not in current]
+        previous = current
+
+        if changed:
+            yield _event('progress', changed)
+        if removed:
+            yield _event('removed', removed)
+
+        if changed or removed:
+            last_sent = clock()
+        elif clock() - last_sent >= settings.NEWSLETTER_PROGRESS_HEARTBEAT:
+            last_sent = clock()
+            yield ': ping\n\n'
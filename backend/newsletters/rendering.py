@@ -0,0 +1,79 @@
+import hashlib
+import re
+from collections import OrderedDict
+from types import SimpleNamespace
+
+from django.conf import settings
+from django.template.loader import get_template
+from django.utils.html import escape
+
+EMAIL_TEMPLATE = 'newsletters/email.html'
+
+# Поля пользователя, которые шаблон может подставить в письмо
+PERSONAL_FIELDS = ('first_name', 'last_name', 'username')
+
+# Метки из цифр: фильтры регистра (upper, title) их не меняют, escape тоже
+_MARKER = '\x1e{}\x1e'
+_MARKER_RE = re.compile('\x1e(\\d+)\x1e')
+
+_CACHE_SIZE = 32
+
+
+class CompiledEmail:
+    '''
+    HTML письма рассылки, отрендеренный шаблонизатором один раз.
+
+    Шаблон рендерится с метками вместо полей пользователя и режется по ним
+    на куски. Для получателя остаётся склеить куски с его экранированными
+    значениями. Пустое поле может включать другую ветку ``{% if %}``,
+    поэтому куски строятся отдельно для каждого набора заполненных полей.
+    '''
+
+    def __init__(self, newsletter):
+        self._template = get_template(EMAIL_TEMPLATE)
+        self._context = {'newsletter': newsletter, 'base_url': settings.BASE_URL}
+        self._parts = {}
+
+    def _compile(self, filled: frozenset) -> list:
+        user = SimpleNamespace(**{
+            field: _MARKER.format(index) if field in filled else ''
+            for index, field in enumerate(PERSONAL_FIELDS)
+        })
+        html = self._template.render(dict(self._context, user=user))
+        # Чётные куски — готовый HTML, нечётные — номер поля
+        return _MARKER_RE.split(html)
+
+    def render(self, user) -> str:
+        values = [getattr(user, field, '') or '' for field in PERSONAL_FIELDS]
+        filled = frozenset(field for field, value in zip(PERSONAL_FIELDS, values) if value)
+
+        parts = self._parts.get(filled)
+        if parts is None:
+            parts = self._parts[filled] = self._compile(filled)
+
+        return ''.join(
+            part if index % 2 == 0 else escape(values[int(part)])
+            for index, part in enumerate(parts)
+        )
+
+
+def _fingerprint(newsletter) -> str:
+    images = [image.image.name for image in newsletter.images.all()]
+    return hashlib.md5(repr((newsletter.title, newsletter.message, images)).encode()).hexdigest()
+
+
+_compiled = OrderedDict()
+
+
+def get_compiled_email(newsletter) -> CompiledEmail:
+    '''Письмо рассылки из кеша процесса (перекомпилируется, если рассылку изменили)'''
+    key = (newsletter.pk, _fingerprint(newsletter))
+
+    email = _compiled.get(key)
+    if email is None:
+        email = _compiled[key] = CompiledEmail(newsletter)
+        while len(_compiled) > _CACHE_SIZE:
+            _compiled.popitem(last=False)
+    else:
+        _compiled.move_to_end(key)
+    return email
@@ -7,8 +7,8 @@ from users.serializers import UserBaseSerializer
 class NewsletterImageSerializer(serializers.ModelSerializer):
     class Meta:
         model = NewsletterImage
-        fields = ['id', 'image']
-        read_only_fields = ['id']
+        fields = ['id', 'image', 'telegram_image', 'thumbnail']
+        read_only_fields = ['id', 'telegram_image', 'thumbnail']
 
     def validate(self, attrs):
         newsletter = attrs.get('newsletter') or (self.instance.newsletter if self.instance else None)
@@ -56,14 +56,7 @@ class NewsletterProgressSerializer(serializers.ModelSerializer):
         read_only_fields = ['__all__']
 
     def get_progress(self, obj):
-        total = obj.tasks.count() or 1
-        sent = obj.tasks.filter(status='sent').count()
-
-        progress = sent / total * 100
-
-        if obj.status in ['sent', 'partial']:
-            progress = 100
-        return progress
+        return obj.progress
 
 
 
@@ -78,17 +71,19 @@ class NewsletterBaseSerializer(NewsletterProgressSerializer):
         read_only_fields = ['__all__']
 
     def get_image(self, obj):
-        if obj.images.all():
-            return obj.images.first().image.url
+        '''Превью для списка рассылок (исходник, пока превью не готово)'''
+        image = next(iter(obj.images.all()), None)
+        if image:
+            return (image.thumbnail or image.image).url
         return None
 
 
 class NewsletterSerializer(NewsletterBaseSerializer):
     tasks = NewsletterTaskSerializer(many=True, read_only=True)
     images = NewsletterImageSerializer(many=True, read_only=True)
-    total = serializers.SerializerMethodField()
-    sent = serializers.SerializerMethodField()
-    failed = serializers.SerializerMethodField()
+    sent = serializers.IntegerField(source='sent_count', read_only=True)
+    failed = serializers.IntegerField(source='failed_count', read_only=True)
+    pending = serializers.IntegerField(source='pending_count', read_only=True)
     message = serializers.SerializerMethodField()
 
     class Meta:
@@ -98,6 +93,7 @@ class NewsletterSerializer(NewsletterBaseSerializer):
             'total',
             'sent',
             'failed',
+            'pending',
             'only_paid',
             'sent_at',
             'tasks',
@@ -107,21 +103,9 @@ class NewsletterSerializer(NewsletterBaseSerializer):
         ]
         read_only_fields = [
             'id', 'failed_count', 'total_recipients', 'sent_at',
-            'total', 'sent', 'failed', 'progress'
+            'total', 'sent', 'failed', 'pending', 'progress'
         ]
 
-    def get_total(self, obj):
-        total = obj.tasks.count()
-        return total
-
-    def get_sent(self, obj):
-        sent = obj.tasks.filter(status='sent').count()
-        return sent
-
-    def get_failed(self, obj):
-        failed = obj.tasks.filter(status='failed').count()
-        return failed
-
     def get_message(self, obj):
         message = obj.message.replace('\n', '<br>')
         return message
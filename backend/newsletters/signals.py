@@ -1,9 +1,17 @@
 import os
-from django.db.models.signals import post_delete
+from django.db.models.signals import post_delete, post_save
 from django.dispatch import receiver
+
+from config.images import delete_unused_variants, schedule_variants
+from config.storage import is_content_addressed
 from .models import NewsletterImage
 
 
+@receiver(post_save, sender=NewsletterImage)
+def newsletterimage_build_variants(sender, instance, **kwargs):
+    schedule_variants(instance, 'image', instance.VARIANT_FIELDS)
+
+
 @receiver(post_delete, sender=NewsletterImage)
 def delete_physical_file(sender, instance, **kwargs):
     """Удаляет файл с диска, если он больше не используется в базе."""
@@ -12,9 +20,9 @@ def delete_physical_file(sender, instance, **kwargs):
         return
 
     file_path = instance.image.name
-    still_used = sender.objects.filter(image=file_path).exists()
 
-    if not still_used:
-        storage = instance.image.storage
-        if storage.exists(file_path):
-            storage.delete(file_path)
+    # Файл по содержимому сам считает ссылки; старые файлы проверяем по базе
+    if is_content_addressed(file_path) or not sender.objects.filter(image=file_path).exists():
+        instance.image.storage.delete(file_path)
+
+    delete_unused_variants(instance, instance.VARIANT_FIELDS.values())
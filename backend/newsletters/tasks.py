@@ -1,11 +1,17 @@
 import logging
-from celery import shared_task, chord
-from django.core.mail import send_mail
-from django.template.loader import render_to_string
+import time
+from celery import shared_task
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Count, F, Max
 from django.utils import timezone
-from telebot import types
 from django.conf import settings
-from newsletters.models import Newsletter, NewsletterTask
+
+from bot.ratelimit import bulk_priority, get_retry_after
+from newsletters.archive import archive_old_newsletters
+from newsletters.mailer import NewsletterMailer, build_email
+from newsletters.models import Newsletter, NewsletterBatch, NewsletterTask
+from newsletters.rendering import get_compiled_email
 from users.models import User
 
 logger = logging.getLogger(__name__)
@@ -30,153 +36,450 @@ def _get_friendly_error(error_exception):
 
 
 
-def _finalize_individual_task(task, channels_sent, errors):
+# Поля результата доставки: всегда пишутся вместе
+_RESULT_FIELDS = ['status', 'channel_sent', 'sent_at', 'error_message']
+
 
+def _finalize_individual_task(task, channels_sent, errors):
+    """Заполняет результат доставки (запись — пачкой в _flush_results)"""
     if channels_sent:
         task.status = 'sent'
         task.channel_sent = 'both' if len(channels_sent) > 1 else channels_sent[0]
         task.sent_at = timezone.now()
+        task.error_message = None
     else:
         task.status = 'failed'
+        task.channel_sent = None
+        task.sent_at = None
         task.error_message = "; ".join(errors) if errors else "Unknown error"
-    task.save()
+
+
+def _flush_results(batch, finished, cursor) -> None:
+    """Пишет накопленные результаты одним UPDATE ... CASE и очищает буфер.
+
+    ``finished`` — пары (задача, статус до отправки). В той же транзакции
+    счётчики рассылки сдвигаются на разницу статусов, а курсор пачки —
+    на последнего обработанного пользователя.
+    """
+    if not finished and cursor == batch.cursor:
+        return
+
+    sent = sum((task.status == 'sent') - (previous == 'sent') for task, previous in finished)
+    failed = sum((task.status == 'failed') - (previous == 'failed') for task, previous in finished)
+
+    with transaction.atomic():
+        if finished:
+            NewsletterTask.objects.bulk_update([task for task, _ in finished], _RESULT_FIELDS)
+            Newsletter.objects.filter(pk=batch.newsletter_id).update(
+                sent_count=F('sent_count') + sent,
+                failed_count=F('failed_count') + failed,
+            )
+        NewsletterBatch.objects.filter(pk=batch.pk).update(cursor=cursor)
+    batch.cursor = cursor
+    finished.clear()
+
+
+def _create_tasks(newsletter_id, user_ids) -> None:
+    NewsletterTask.objects.bulk_create(
+        [NewsletterTask(newsletter_id=newsletter_id, user_id=user_id) for user_id in user_ids],
+        ignore_conflicts=True,
+    )
+
+
+def get_recipients(newsletter):
+    recipients = User.objects.filter(is_superuser=False)
+
+    if newsletter.only_paid:
+        recipients = recipients.filter(paid=True)
+
+    return recipients
+
+
+def _deliver(bot, mailer, email, newsletter, images, user):
+    """Отправляет рассылку одному пользователю, возвращает (каналы, ошибки).
+
+    Флуд-контроль Telegram, не отпущенный лимитером, пробрасывается наверх:
+    пачка повторит оставшихся пользователей позже.
+    """
+    channels_sent = []
+    errors = []
+
+    # --- Email ---
+    if newsletter.channel in ['email', 'both'] and user.email:
+        try:
+            html_message = email.render(user)
+            mailer.send(build_email(newsletter.title, newsletter.message, html_message, user.email))
+            channels_sent.append('email')
+        except Exception as e:
+            errors.append(f"Email error: {str(e)}")
+
+    if newsletter.channel in ['telegram', 'both'] and user.telegram_chat_id:
+        try:
+            # Рассылка уступает лимит интерактивным ответам бота
+            with bulk_priority():
+                if images:
+                    bot.send_cached_media_group(chat_id=user.telegram_chat_id, queryset_of_images=images)
+                bot.send_message(user.telegram_chat_id, text=newsletter.message, parse_mode='HTML')
+            channels_sent.append('telegram')
+        except Exception as e:
+            if get_retry_after(e) and not channels_sent:
+                raise
+            errors.append(f"Telegram error: {str(e)}")
+
+    return channels_sent, errors
+
+
+def _is_complete(newsletter_id) -> bool:
+    remaining, dispatched_at = Newsletter.objects.filter(pk=newsletter_id).values_list(
+        'remaining_batches', 'dispatched_at').first()
+    return remaining == 0 and dispatched_at is not None
+
+
+def _finish_batch(batch) -> bool:
+    """Закрывает пачку и уменьшает счётчик; True — рассылку пора завершать"""
+    with transaction.atomic():
+        # Повторно закрытая пачка (resume) счётчик не трогает
+        if not NewsletterBatch.objects.filter(pk=batch.pk, finished_at__isnull=True).update(
+                finished_at=timezone.now()):
+            return False
+        # UPDATE держит строку до коммита: ноль увидит ровно одна пачка
+        Newsletter.objects.filter(pk=batch.newsletter_id, remaining_batches__gt=0).update(
+            remaining_batches=F('remaining_batches') - 1
+        )
+        return _is_complete(batch.newsletter_id)
+
+
+def plan_batch(newsletter_id, user_ids) -> NewsletterBatch:
+    """Создаёт задачи получателей (отсортированные id) и пачку на них.
+
+    Курсор начинается перед первым пользователем пачки: пачка отправляет
+    только свой диапазон, а не всех с начала.
+    """
+    _create_tasks(newsletter_id, user_ids)
+    with transaction.atomic():
+        batch = NewsletterBatch.objects.create(
+            newsletter_id=newsletter_id,
+            first_user_id=user_ids[0],
+            last_user_id=user_ids[-1],
+            cursor=user_ids[0] - 1,
+        )
+        Newsletter.objects.filter(pk=newsletter_id).update(remaining_batches=F('remaining_batches') + 1)
+    return batch
+
+
+class Lease:
+    '''Аренда пачки или раскладки рассылки в общем кеше.
+
+    Пока аренда жива, второй воркер ту же работу не берёт, а resume её
+    не ставит. Воркер продлевает аренду по ходу; у упавшего она истекает
+    через NEWSLETTER_LEASE_TTL.
+    '''
+
+    def __init__(self, key: str):
+        self.key = key
+        self._renewed = None
+
+    @classmethod
+    def for_batch(cls, batch_id) -> 'Lease':
+        return cls(f'newsletters:lease:batch:{batch_id}')
+
+    @classmethod
+    def for_dispatch(cls, newsletter_id) -> 'Lease':
+        return cls(f'newsletters:lease:dispatch:{newsletter_id}')
+
+    def acquire(self) -> bool:
+        try:
+            taken = cache.add(self.key, 1, settings.NEWSLETTER_LEASE_TTL)
+        except Exception as e:
+            logger.warning(f'Newsletter lease cache unavailable: {e}')
+            taken = True
+        if taken:
+            self._renewed = time.monotonic()
+        return taken
+
+    def renew(self) -> None:
+        '''Продлевает аренду, если с прошлого продления прошла треть срока'''
+        if time.monotonic() - self._renewed < settings.NEWSLETTER_LEASE_TTL / 3:
+            return
+        try:
+            cache.set(self.key, 1, settings.NEWSLETTER_LEASE_TTL)
+        except Exception as e:
+            logger.warning(f'Newsletter lease not renewed: {e}')
+        self._renewed = time.monotonic()
+
+    def release(self) -> None:
+        try:
+            cache.delete(self.key)
+        except Exception as e:
+            logger.warning(f'Newsletter lease not released: {e}')
+
+    def is_held(self) -> bool:
+        try:
+            return cache.get(self.key) is not None
+        except Exception:
+            return False
 
 
 # --- Основные задачи ---
 
 @shared_task(bind=True, max_retries=3, name='tasks.send_newsletter_task')
 def send_newsletter_task(self, newsletter_id):
+    lease = Lease.for_dispatch(newsletter_id)
+    if not lease.acquire():
+        return f"Newsletter {newsletter_id} is already being dispatched"
+
     try:
         newsletter = Newsletter.objects.get(pk=newsletter_id)
 
         if newsletter.status not in ['sending', 'scheduled']:
             return 'Newsletter is cancelled'
 
+        recipients = get_recipients(newsletter).order_by('pk')
+        total = recipients.count()
 
-        # Фильтруем получателей
-        recipients = User.objects.filter(is_superuser=False)
-
-        if newsletter.only_paid:
-            recipients = recipients.filter(paid=True)
-
-        user_ids = list(recipients.values_list('id', flat=True))
-
-        if not user_ids:
+        if not total:
             newsletter.status = 'failed'
             newsletter.save(update_fields=['status'])
             return "No recipients"
 
-
-        newsletter.total = len(user_ids)
-
+        newsletter.total = total
+        newsletter.status = 'sending'
         newsletter.save(update_fields=['total', 'status'])
 
-
-        header = [send_message_to_user.s(newsletter_id, uid) for uid in user_ids]
-
-        # Callback получит newsletter_id
-        callback = finalize_newsletter_status.s(newsletter_id)
-
-        chord(header)(callback)
+        # Вместо chord: пачки без результатов, завершает рассылку последняя из них.
+        # Получатели читаются страницами по ключу (id > последнего), задачи на
+        # страницу создаются одним INSERT — память не зависит от размера аудитории.
+        # Повторный запуск продолжает после последней созданной пачки
+        last_id = newsletter.batches.aggregate(last=Max('last_user_id'))['last'] or 0
+        batches = 0
+        while True:
+            user_ids = list(
+                recipients.filter(pk__gt=last_id).values_list('id', flat=True)[:settings.NEWSLETTER_BATCH_SIZE]
+            )
+            if not user_ids:
+                break
+
+            send_newsletter_batch.delay(plan_batch(newsletter_id, user_ids).pk)
+            last_id = user_ids[-1]
+            batches += 1
+            lease.renew()
+
+        with transaction.atomic():
+            Newsletter.objects.filter(pk=newsletter_id).update(dispatched_at=timezone.now())
+            complete = _is_complete(newsletter_id)
+        if complete:
+            finalize_newsletter_status(newsletter_id)
+
+        return f"Newsletter {newsletter_id}: {batches} batches"
 
     except Exception as exc:
         raise self.retry(exc=exc, countdown=60)
+    finally:
+        lease.release()
+
 
+@shared_task(bind=True, max_retries=settings.NEWSLETTER_BATCH_MAX_RETRIES, ignore_result=True)
+def send_newsletter_batch(self, batch_id):
+    """Отправляет рассылку пачке пользователей, начиная с её курсора.
 
-@shared_task(bind=True, max_retries=2)
-def send_message_to_user(self, newsletter_id, user_id):
+    Рассылка с картинками и задачи пачки вместе с пользователями читаются
+    один раз. Результаты и курсор пишутся каждые NEWSLETTER_RESULTS_FLUSH
+    получателей: повтор или resume не отправляет записанное повторно.
+    """
     from bot.bot import bot  # Импорт внутри для избежания циклической зависимости
 
+    batch = NewsletterBatch.objects.filter(pk=batch_id, finished_at__isnull=True).first()
+    if batch is None:
+        return
+
+    # Копия задачи (resume, повторная доставка брокером) не шлёт пачку параллельно
+    lease = Lease.for_batch(batch_id)
+    if not lease.acquire():
+        logger.info(f"Newsletter batch {batch_id} is already being sent")
+        return
+
+    newsletter_id = batch.newsletter_id
+    cursor = batch.cursor
+    finished = []
+    # Одно SMTP-соединение на пачку, открывается при первом письме
+    mailer = NewsletterMailer()
     try:
-        # Достаем объекты из базы внутри воркера
         newsletter = Newsletter.objects.prefetch_related('images').get(pk=newsletter_id)
-        user = User.objects.get(pk=user_id, is_superuser=False)
-
-        task, created = NewsletterTask.objects.get_or_create(
-            newsletter=newsletter,
-            user=user,
-            defaults={'status': 'pending'}
+        images = list(newsletter.images.all())
+        email = get_compiled_email(newsletter) if newsletter.channel in ['email', 'both'] else None
+
+        tasks = (
+            NewsletterTask.objects
+            .filter(
+                newsletter_id=newsletter_id,
+                user_id__gte=batch.first_user_id,
+                user_id__gt=batch.cursor,
+                user_id__lte=batch.last_user_id,
+            )
+            .select_related('user')
+            .order_by('user_id')
         )
 
-        if user.is_superuser:
-            return
+        for task in tasks:
+            user = task.user
 
-        if task.status == 'sent':
-            return "Already sent"
-
-        channels_sent = []
-        errors = []
-
-        can_email = newsletter.channel in ['email', 'both'] and user.email
-        can_tg = newsletter.channel in ['telegram', 'both'] and user.telegram_chat_id
-
-        if not (can_email or can_tg):
-            task.status = 'failed'
-            task.error_message = "No valid contact info"
-            task.save()
-            return "Missing contact info"
-
-        # --- Email ---
-        if can_email:
-            try:
-                html_message = render_to_string('newsletters/email.html', {
-                    'newsletter': newsletter,
-                    'user': user,
-                    'base_url': settings.BASE_URL
-                })
-                send_mail(
-                    subject=newsletter.title,
-                    message=newsletter.message,
-                    from_email=settings.DEFAULT_FROM_EMAIL,
-                    recipient_list=[user.email],
-                    fail_silently=False,
-                    html_message=html_message,
-                )
-                channels_sent.append('email')
-            except Exception as e:
-                errors.append(f"Email error: {str(e)}")
-
-        if can_tg:
-            try:
-                bot.send_cached_media_group(chat_id=user.telegram_chat_id, queryset_of_images=newsletter.images.all())
-                bot.send_message(user.telegram_chat_id, text=newsletter.message, parse_mode='HTML')
-                channels_sent.append('telegram')
-            except Exception as e:
-                errors.append(f"Telegram error: {str(e)}")
+            if task.status != 'sent':
+                previous = task.status
+                can_email = newsletter.channel in ['email', 'both'] and user.email
+                can_tg = newsletter.channel in ['telegram', 'both'] and user.telegram_chat_id
 
+                if not (can_email or can_tg):
+                    _finalize_individual_task(task, [], ["No valid contact info"])
+                else:
+                    channels_sent, errors = _deliver(bot, mailer, email, newsletter, images, user)
+                    _finalize_individual_task(task, channels_sent, errors)
+                finished.append((task, previous))
 
-        _finalize_individual_task(task, channels_sent, errors)
+            cursor = task.user_id
+            if len(finished) >= settings.NEWSLETTER_RESULTS_FLUSH:
+                _flush_results(batch, finished, cursor)
+            lease.renew()
+
+        _flush_results(batch, finished, batch.last_user_id)
 
     except Exception as exc:
-        logger.error(f"Error for user {user_id} in newsletter {newsletter_id}: {exc}")
-        raise self.retry(exc=exc, countdown=180)
+        # Отправленное до ошибки не должно уйти повторно
+        try:
+            _flush_results(batch, finished, cursor)
+        except Exception as e:
+            logger.error(f"Newsletter {newsletter_id}: results not saved: {e}")
+        # Курсор записан: повтор или resume продолжат пачку с него
+        lease.release()
+
+        if self.request.retries < self.max_retries:
+            # Повтор продолжит пачку с курсора
+            logger.warning(f"Newsletter {newsletter_id}: batch {batch_id} retry after user {cursor}: {exc}")
+            raise self.retry(exc=exc, countdown=get_retry_after(exc) or 180)
+        # Пачка остаётся незакрытой: её дошлёт resume
+        logger.error(f"Newsletter {newsletter_id}: batch {batch_id} stopped after user {cursor}: {exc}")
+        return
+    finally:
+        mailer.close()
+
+    try:
+        if _finish_batch(batch):
+            finalize_newsletter_status(newsletter_id)
+    finally:
+        lease.release()
 
 
-@shared_task
-def finalize_newsletter_status(results, newsletter_id):
+def resume_newsletter(newsletter_id) -> int:
+    """Дозапускает рассылку после падения воркеров: только незакрытые пачки.
+
+    Пачки продолжаются со своих курсоров; если не все получатели были
+    разложены по пачкам, раскладка тоже продолжается. Пачки и раскладка,
+    аренду которых держит живой воркер, не ставятся. Возвращает число
+    поставленных задач.
+    """
+    newsletter = Newsletter.objects.get(pk=newsletter_id)
+    unfinished = list(newsletter.batches.filter(finished_at__isnull=True).values_list('pk', flat=True))
+    batch_ids = [pk for pk in unfinished if not Lease.for_batch(pk).is_held()]
+
+    for batch_id in batch_ids:
+        send_newsletter_batch.delay(batch_id)
+
+    if newsletter.dispatched_at is None:
+        if Lease.for_dispatch(newsletter_id).is_held():
+            return len(batch_ids)
+        send_newsletter_task.delay(newsletter_id)
+        return len(batch_ids) + 1
+
+    if not unfinished and _is_complete(newsletter_id):
+        finalize_newsletter_status(newsletter_id)
+
+    return len(batch_ids)
+
+
+def _start_claimed(newsletter_id) -> None:
+    try:
+        send_newsletter_task.delay(newsletter_id)
+    except Exception as e:
+        # Брокер недоступен: вернём рассылку планировщику, следующий тик повторит
+        logger.error(f"Newsletter {newsletter_id} not started: {e}")
+        Newsletter.objects.filter(pk=newsletter_id, status='sending').update(status='scheduled')
+
+
+def claim_due_newsletters(limit: int = 100, exclude=()) -> list:
+    """Переводит наступившие запланированные рассылки в 'sending' и возвращает их id.
+
+    Строки берутся по индексу (status, scheduled_at); на Postgres занятые
+    соседним узлом пропускаются (SKIP LOCKED), а условный UPDATE по статусу
+    не даёт двум тикам запустить одну рассылку дважды. ``exclude`` — id,
+    которые этот тик уже пробовал запустить.
     """
-    results — это список того, что вернули задачи из header.
-    Но мы по-честному считаем статусы из БД для надежности.
+    with transaction.atomic():
+        ids = list(
+            Newsletter.objects
+            .select_for_update(skip_locked=True)
+            .filter(status='scheduled', scheduled_at__lte=timezone.now())
+            .exclude(pk__in=exclude)
+            .order_by('scheduled_at')
+            .values_list('pk', flat=True)[:limit]
+        )
+        if not ids:
+            return []
+
+        claimed = [
+            pk for pk in ids
+            if Newsletter.objects.filter(pk=pk, status='scheduled').update(status='sending')
+        ]
+
+        for pk in claimed:
+            transaction.on_commit(lambda pk=pk: _start_claimed(pk))
+
+    return claimed
+
+
+@shared_task(ignore_result=True)
+def send_scheduled_newsletters():
+    """Тик планировщика: запускает рассылки, время которых наступило.
+
+    Рассылка, которую не удалось поставить в брокер, возвращается в
+    'scheduled' — в этом тике её больше не берём, повторит следующий.
     """
+    attempted = set()
+    while True:
+        claimed = claim_due_newsletters(exclude=attempted)
+        if not claimed:
+            break
+        attempted.update(claimed)
+        logger.info(f"Scheduled newsletters started: {claimed}")
+
+
+@shared_task(ignore_result=True)
+def cleanup_old_newsletters():
+    """Переносит задачи давно завершённых рассылок в архив (gzip JSONL)"""
+    moved = archive_old_newsletters()
+    if moved:
+        logger.info(f"Newsletter tasks archived: {moved}")
+
+
+@shared_task
+def finalize_newsletter_status(newsletter_id):
+    """Итоговый статус рассылки по статусам задач в БД"""
     try:
         newsletter = Newsletter.objects.get(pk=newsletter_id)
 
-        stats = newsletter.tasks.all().values_list('status', flat=True)
-
-        total = len(stats)
-        sent_count = sum(1 for s in stats if s == 'sent')
-        failed_count = sum(1 for s in stats if s == 'failed')
+        # Итог — по задачам: заодно выравнивает счётчики, если пачка их не дописала
+        stats = dict(newsletter.tasks.values_list('status').annotate(count=Count('id')))
+        newsletter.sent_count = stats.get('sent', 0)
+        newsletter.failed_count = stats.get('failed', 0)
 
-        if failed_count == 0 and sent_count > 0:
+        if newsletter.failed_count == 0 and newsletter.sent_count > 0:
             newsletter.status = 'sent'
-        elif sent_count == 0:
+        elif newsletter.sent_count == 0:
             newsletter.status = 'failed'
         else:
             newsletter.status = 'partial'
 
         newsletter.sent_at = timezone.now()
-        newsletter.save(update_fields=['status', 'sent_at'])
+        newsletter.save(update_fields=['status', 'sent_at', 'sent_count', 'failed_count'])
 
         return f"Newsletter {newsletter_id} finished with status {newsletter.status}"
     except Newsletter.DoesNotExist:
-        return "Newsletter not found"
\ No newline at end of file
+        return "Newsletter not found"
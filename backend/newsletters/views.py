@@ -1,4 +1,6 @@
 from rest_framework import viewsets, status, views
+from django.core.handlers.wsgi import WSGIRequest
+from django.http import HttpResponse, HttpResponseForbidden, StreamingHttpResponse
 from rest_framework.decorators import action
 from rest_framework.pagination import PageNumberPagination
 from rest_framework.response import Response
@@ -6,9 +8,10 @@ from django.utils import timezone
 from rest_framework.views import APIView
 
 from config.utils import UploadImageMixin
-from .tasks import send_newsletter_task
+from .tasks import resume_newsletter, send_newsletter_task
 
 from newsletters.models import Newsletter
+from newsletters.progress import check_stream_token, progress_events, stream_token
 from newsletters.serializers import NewsletterCreateSerializer, NewsletterSerializer, NewsletterBaseSerializer, \
     NewsletterImageSerializer, NewsletterProgressSerializer
 import logging
@@ -16,7 +19,6 @@ import logging
 logger = logging.getLogger(__name__)
 
 
-
 class NewsletterViewSet(UploadImageMixin, viewsets.ModelViewSet):
 
 
@@ -49,21 +51,56 @@ class NewsletterViewSet(UploadImageMixin, viewsets.ModelViewSet):
                     args=(newsletter.pk,),
                     countdown=5)
             else:
+                # Запустит тик планировщика (send_scheduled_newsletters), eta в брокере не держим
                 newsletter.status = 'scheduled'
-                newsletter.save()
-                send_newsletter_task.apply_async(
-                    args=(newsletter.pk,),
-                    eta=newsletter.scheduled_at)
+                newsletter.save(update_fields=['status'])
             serializer = self.serializer_class(newsletter)
 
 
             return Response(serializer.data, status=status.HTTP_201_CREATED)
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
+    @action(detail=True, methods=['post'])
+    def resume(self, request, pk=None):
+        '''Дозапуск рассылки после падения воркеров: только необработанные получатели'''
+        newsletter = self.get_object()
+        if newsletter.status != 'sending':
+            return Response(
+                {'detail': 'Продолжить можно только отправляющуюся рассылку'},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+
+        queued = resume_newsletter(newsletter.pk)
+        return Response({'queued': queued})
+
     @action(detail=False, methods=['get'], url_path='progress')
     def progress(self, request):
-        newsletters = Newsletter.objects.all()
+        newsletters = Newsletter.objects.only('id', 'status', 'total', 'sent_count')
         serializer = NewsletterProgressSerializer(newsletters, many=True)
         return Response(serializer.data)
 
+    @action(detail=False, methods=['get'], url_path='progress/token')
+    def progress_token(self, request):
+        '''Токен для подключения EventSource к progress_stream'''
+        return Response({'token': stream_token(request.user)})
+
+
+async def progress_stream(request):
+    '''
+    Прогресс рассылок через Server-Sent Events: дашборду не нужно опрашивать progress.
+
+    Долгое соединение держит только ASGI-процесс (сервис sse), nginx
+    направляет туда этот путь. Синхронный воркер gunicorn отказывает:
+    он занял бы поток на всё время потока событий.
+    '''
+    if isinstance(request, WSGIRequest):
+        return HttpResponse('Progress stream is served by the ASGI process', status=503)
+    if not check_stream_token(request.GET.get('token', '')):
+        return HttpResponseForbidden()
+
+    response = StreamingHttpResponse(progress_events(), content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'  # nginx отдаёт события сразу, без буфера
+    return response
+
 
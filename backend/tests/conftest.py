@@ -1,4 +1,6 @@
 import pytest
+from django.conf import settings
+from django.core.cache import cache
 from django.core.files.uploadedfile import SimpleUploadedFile
 from rest_framework.test import APIClient
 
@@ -7,6 +9,39 @@ from users.models import User
 from newsletters.models import Newsletter
 
 
+@pytest.fixture(autouse=True)
+def clear_caches():
+    '''Кеш, снимки и LRU бота не должны переживать откат базы между тестами'''
+    from bot.catalog import _catalog
+    from bot.models import Configuration
+    from bot.registration_flow import _flow
+    from bot.user_state import _local
+    from newsletters.rendering import _compiled
+
+    if settings.REDIS_URL:
+        pytest.exit('Тесты запускаются с PYTEST_RUNNING=1, иначе cache.clear() очистит общий Redis')
+    cache.clear()
+    _local.clear()
+    _compiled.clear()
+    for snapshot in (Configuration.objects._cache, _flow, _catalog):
+        snapshot._state = None
+    yield
+
+
+@pytest.fixture
+def newsletter_batch(db):
+    '''Пачка рассылки на пользователей, как её раскладывает send_newsletter_task'''
+    from django.utils import timezone
+    from newsletters.tasks import plan_batch
+
+    def make(newsletter, users):
+        batch = plan_batch(newsletter.pk, sorted(user.pk for user in users))
+        Newsletter.objects.filter(pk=newsletter.pk).update(dispatched_at=timezone.now())
+        return batch
+
+    return make
+
+
 @pytest.fixture
 def api_client():
     return APIClient()
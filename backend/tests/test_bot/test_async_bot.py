@@ -0,0 +1,55 @@
+import asyncio
+from types import SimpleNamespace
+from unittest.mock import AsyncMock
+
+import pytest
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+
+from bot.async_bot import acquire_file_ids_async, async_bot, db
+from bot.models import Configuration
+from goods.models import Good, GoodImage
+
+
+@pytest.mark.django_db(transaction=True, serialized_rollback=True)
+class TestAsyncRuntime:
+
+    def test_db_runs_orm_in_thread_pool(self):
+        config = asyncio.run(db(Configuration.objects.first)())
+        assert config is not None
+
+    def test_start_handler(self, monkeypatch):
+        from bot.async_handlers.start import start_handler
+
+        send_message = AsyncMock()
+        monkeypatch.setattr(async_bot, 'send_message', send_message)
+
+        message = SimpleNamespace(chat=SimpleNamespace(id=1))
+        asyncio.run(start_handler(message))
+
+        kwargs = send_message.await_args.kwargs
+        assert kwargs['text'] == Configuration.objects.get_config().start_message
+        assert kwargs['reply_markup'] is not None
+
+    def test_upload_wait_does_not_hold_db_threads(self, settings, tmp_path):
+        settings.MEDIA_ROOT = tmp_path
+        settings.BOT_UPLOAD_WAIT_INTERVAL = 0.01
+        good = Good.objects.create(title='Кепка', label='cap', price=1000, description='Кепка', quantity=1)
+        image = GoodImage(good=good, image=SimpleUploadedFile('cap.jpg', b'cap'))
+        image.save()
+        cache.add(f'bot:upload:{image.hash}', 1)  # загрузку ведёт другой процесс
+
+        async def scenario():
+            waiters = [
+                asyncio.ensure_future(acquire_file_ids_async([image]))
+                for _ in range(settings.BOT_ASYNC_DB_WORKERS * 2)
+            ]
+            # Ждущих больше, чем потоков пула, а ORM всё равно отвечает
+            assert await asyncio.wait_for(db(Configuration.objects.count)(), timeout=1) == 1
+            assert not any(waiter.done() for waiter in waiters)
+
+            await db(GoodImage.objects.filter(pk=image.pk).update)(telegram_file_id='from-uploader')
+            return await asyncio.gather(*waiters)
+
+        results = asyncio.run(scenario())
+        assert results == [(['from-uploader'], [])] * len(results)
@@ -0,0 +1,63 @@
+import json
+from types import SimpleNamespace
+from unittest.mock import MagicMock
+
+import pytest
+
+from bot.bot import bot, router
+from bot.catalog import get_catalog
+from bot.handlers.goods import merchandise
+from goods.models import Good, GoodImage
+
+
+@pytest.fixture
+def goods(db, django_capture_on_commit_callbacks):
+    with django_capture_on_commit_callbacks(execute=True):
+        cap = Good.objects.create(title='Кепка', label='cap', price=1000, description='Кепка', quantity=5)
+        GoodImage.objects.create(good=cap, image='goods/cap.jpg', hash='cap', telegram_file_id='cap-file')
+        GoodImage.objects.create(good=cap, image='goods/cap-invoice.jpg', hash='invoice', is_invoice=True)
+        hidden = Good.objects.create(title='Худи', label='hoodie', price=3000, description='Худи', available=False)
+    return cap, hidden
+
+
+def make_callback(data):
+    return SimpleNamespace(data=data, message=SimpleNamespace(chat=SimpleNamespace(id=1)))
+
+
+@pytest.mark.django_db
+class TestCatalog:
+
+    def test_snapshot(self, goods):
+        cap, hidden = goods
+        catalog = get_catalog()
+
+        buttons = json.loads(catalog.keyboard)['inline_keyboard']
+        assert [row[0]['callback_data'] for row in buttons] == [f'g:{cap.id}']
+
+        entry = catalog.get(cap.id)
+        assert [img.telegram_file_id for img in entry.images] == ['cap-file']
+        assert entry.invoice['photo_url'].endswith('goods/cap-invoice.jpg')
+        assert entry.invoice_kwargs(1)['invoice_payload'] == f'good_{cap.id}'
+
+    def test_browsing_costs_no_queries(self, goods, monkeypatch, django_assert_num_queries):
+        cap, _ = goods
+        for method in ('send_message', 'send_invoice', 'send_cached_media_group'):
+            monkeypatch.setattr(bot, method, MagicMock())
+        merchandise(SimpleNamespace(chat=SimpleNamespace(id=1)))
+
+        with django_assert_num_queries(0):
+            merchandise(SimpleNamespace(chat=SimpleNamespace(id=1)))
+            router.dispatch(make_callback(f'g:{cap.id}'))
+
+        bot.send_invoice.assert_called_once()
+        assert bot.send_cached_media_group.call_args.kwargs['queryset_of_images'][0].telegram_file_id == 'cap-file'
+
+    def test_save_rebuilds_snapshot(self, goods, django_capture_on_commit_callbacks):
+        cap, hidden = goods
+        get_catalog()
+
+        with django_capture_on_commit_callbacks(execute=True):
+            hidden.available = True
+            hidden.save()
+
+        assert len(json.loads(get_catalog().keyboard)['inline_keyboard']) == 2
@@ -0,0 +1,94 @@
+import threading
+import time
+
+from telebot import types
+
+from bot.dispatcher import ChatDispatcher, get_chat_id, raw_chat_id
+
+
+def make_update(update_id: int, chat_id: int) -> types.Update:
+    return types.Update.de_json({
+        'update_id': update_id,
+        'message': {
+            'message_id': update_id,
+            'date': 0,
+            'chat': {'id': chat_id, 'type': 'private'},
+            'from': {'id': chat_id, 'is_bot': False, 'first_name': 'test'},
+            'text': str(update_id),
+        },
+    })
+
+
+class TestChatDispatcher:
+
+    def test_get_chat_id(self):
+        assert get_chat_id(make_update(1, 42)) == 42
+
+    def test_raw_chat_id(self):
+        assert raw_chat_id({'update_id': 1, 'message': {'chat': {'id': 42}}}) == 42
+        assert raw_chat_id({'update_id': 1, 'callback_query': {'from': {'id': 7}, 'message': {'chat': {'id': 42}}}}) == 42
+        assert raw_chat_id({'update_id': 1, 'pre_checkout_query': {'from': {'id': 7}}}) == 7
+        assert raw_chat_id({'update_id': 1, 'message': {}}) is None
+
+    def test_chat_updates_are_processed_in_order(self):
+        processed = []
+        lock = threading.Lock()
+
+        def handler(updates):
+            time.sleep(0.001)
+            with lock:
+                processed.extend((u.message.chat.id, u.update_id) for u in updates)
+
+        dispatcher = ChatDispatcher(4, handler)
+        for update_id in range(50):
+            dispatcher.submit(make_update(update_id, chat_id=update_id % 3))
+        dispatcher.join()
+
+        for chat_id in range(3):
+            ids = [u for c, u in processed if c == chat_id]
+            assert ids == sorted(ids)
+
+        stats = dispatcher.stats()
+        assert stats['submitted'] == stats['processed'] == 50
+        assert stats['queue_depth'] == [0, 0, 0, 0]
+
+    def test_slow_chat_does_not_block_others(self):
+        release = threading.Event()
+        done = threading.Event()
+
+        def handler(updates):
+            if updates[0].message.chat.id == 0:
+                release.wait(5)
+            else:
+                done.set()
+
+        dispatcher = ChatDispatcher(2, handler)
+        dispatcher.submit(make_update(1, chat_id=0))
+        dispatcher.submit(make_update(2, chat_id=1))
+
+        assert done.wait(2)
+        release.set()
+        dispatcher.join()
+
+    def test_failed_handler_is_counted(self):
+        def handler(updates):
+            raise RuntimeError('boom')
+
+        dispatcher = ChatDispatcher(1, handler)
+        dispatcher.submit(make_update(1, chat_id=1))
+        dispatcher.join()
+
+        assert dispatcher.stats()['failed'] == 1
+
+    def test_failed_update_is_reported(self):
+        def handler(updates):
+            if updates[0].update_id == 2:
+                raise RuntimeError('boom')
+
+        failed = []
+        dispatcher = ChatDispatcher(2, handler)
+        for update_id in range(1, 4):
+            dispatcher.submit(make_update(update_id, chat_id=update_id), on_error=failed.append)
+        dispatcher.join()
+
+        assert [update.update_id for update in failed] == [2]
@@ -0,0 +1,244 @@
+from types import SimpleNamespace
+from unittest.mock import MagicMock
+
+import pytest
+from django.core.cache import cache
+from django.core.management import call_command
+from django.core.files.uploadedfile import SimpleUploadedFile
+
+from bot.bot import bot
+from bot.catalog import get_catalog
+from bot.media import acquire_file_ids, plan_uploads
+from bot.tasks import upload_image_file_id
+from goods.models import Good, GoodImage
+
+
+@pytest.fixture
+def storage_chat(settings, tmp_path, monkeypatch):
+    settings.BOT_MEDIA_STORAGE_CHAT_ID = -100
+    settings.MEDIA_ROOT = tmp_path
+
+    send_photo = MagicMock(return_value=SimpleNamespace(photo=[SimpleNamespace(file_id='uploaded-id')]))
+    monkeypatch.setattr(bot, 'send_photo', send_photo)
+    return send_photo
+
+
+@pytest.fixture
+def good(db):
+    return Good.objects.create(title='Кепка', label='cap', price=1000, description='Кепка', quantity=1)
+
+
+def make_image(good, content=b'cap'):
+    return GoodImage(good=good, image=SimpleUploadedFile('cap.jpg', content))
+
+
+@pytest.mark.django_db
+class TestImagePreupload:
+
+    def test_saved_image_gets_file_id(self, good, storage_chat, django_capture_on_commit_callbacks, monkeypatch):
+        from config.tasks import build_image_variants
+
+        monkeypatch.setattr(upload_image_file_id, 'delay', upload_image_file_id)
+        monkeypatch.setattr(build_image_variants, 'delay', build_image_variants)
+
+        with django_capture_on_commit_callbacks(execute=True):
+            image = GoodImage(good=good, image=jpeg_with_exif((100, 100)))
+            image.save()
+
+        image.refresh_from_db()
+        assert image.telegram_file_id == 'uploaded-id'
+        assert storage_chat.call_args.args[0] == -100
+        assert get_catalog().get(good.id).images[0].telegram_file_id == 'uploaded-id'
+
+    def test_original_uploaded_when_variants_fail(self, good, storage_chat, django_capture_on_commit_callbacks,
+                                                  monkeypatch):
+        from config.tasks import build_image_variants
+
+        monkeypatch.setattr(upload_image_file_id, 'delay', upload_image_file_id)
+        monkeypatch.setattr(build_image_variants, 'delay', build_image_variants)
+
+        with django_capture_on_commit_callbacks(execute=True):
+            image = GoodImage(good=good, image=SimpleUploadedFile('broken.jpg', b'not an image'))
+            image.save()
+
+        image.refresh_from_db()
+        assert not image.telegram_image
+        assert image.telegram_file_id == 'uploaded-id'
+        assert storage_chat.call_args.args[1].name == image.image.path
+
+
+@pytest.mark.django_db(transaction=True, serialized_rollback=True)
+class TestPreuploadCommand:
+
+    def test_backfill_command_uploads_each_file_once(self, good, storage_chat, monkeypatch):
+        monkeypatch.setattr('bot.signals.upload_enabled', lambda: False)
+        make_image(good).save()
+        make_image(good).save()  # тот же файл — тот же hash
+        make_image(good, b'other').save()
+
+        call_command('preupload_images', workers=2)
+
+        assert storage_chat.call_count == 2
+        assert not GoodImage.objects.filter(telegram_file_id__isnull=True).exists()
+
+
+def telegram_error():
+    from telebot import apihelper
+
+    return apihelper.ApiTelegramException(
+        'sendMediaGroup', None, {'error_code': 400, 'description': 'Bad Request: wrong file identifier'}
+    )
+
+
+@pytest.mark.django_db
+class TestSingleFlightUpload:
+
+    def test_waiter_takes_file_id_from_uploader(self, good, settings, tmp_path):
+        settings.MEDIA_ROOT = tmp_path
+        image = make_image(good)
+        image.save()
+        cache.add(f'bot:upload:{image.hash}', 1)  # загрузку уже ведёт другой процесс
+        GoodImage.objects.filter(pk=image.pk).update(telegram_file_id='from-uploader')
+
+        file_ids, claimed = acquire_file_ids([image])
+
+        assert file_ids == ['from-uploader']
+        assert claimed == []
+
+    def test_waiter_uploads_itself_after_timeout(self, good, settings, tmp_path):
+        settings.MEDIA_ROOT = tmp_path
+        settings.BOT_UPLOAD_WAIT = 0
+        image = make_image(good)
+        image.save()
+        cache.add(f'bot:upload:{image.hash}', 1)
+
+        assert acquire_file_ids([image]) == ([None], [])
+
+    def test_locks_taken_in_key_order(self, good, settings, tmp_path):
+        settings.MEDIA_ROOT = tmp_path
+        first, second = make_image(good, b'first'), make_image(good, b'second')
+        first.save()
+        second.save()
+
+        _, forward = plan_uploads([first, second])
+        _, backward = plan_uploads([second, first])
+
+        keys = sorted(f'bot:upload:{image.hash}' for image in (first, second))
+        assert [key for _, key in forward] == [key for _, key in backward] == keys
+
+    def test_same_file_twice_in_group(self, good, settings, tmp_path):
+        settings.MEDIA_ROOT = tmp_path
+        image = make_image(good)
+        image.save()
+
+        file_ids, claimed = acquire_file_ids([image, image])
+
+        assert file_ids == [None, None]
+        assert claimed == [f'bot:upload:{image.hash}']
+
+    def test_stale_file_id_reuploaded_once(self, good, settings, tmp_path, monkeypatch):
+        settings.MEDIA_ROOT = tmp_path
+        image = make_image(good)
+        image.save()
+        GoodImage.objects.filter(pk=image.pk).update(telegram_file_id='stale')
+        image.refresh_from_db()
+
+        sent = [SimpleNamespace(photo=[SimpleNamespace(file_id='fresh')])]
+        send_media_group = MagicMock(side_effect=[telegram_error(), sent])
+        monkeypatch.setattr(bot, 'send_media_group', send_media_group)
+
+        assert bot.send_cached_media_group([image], chat_id=1) == sent
+
+        retried_media = send_media_group.call_args.args[1][0].media
+        assert hasattr(retried_media, 'read')
+        assert GoodImage.objects.get(pk=image.pk).telegram_file_id == 'fresh'
+        assert cache.get('bot:reupload:stale') is None
+
+
+def jpeg_with_exif(size=(3000, 2000)):
+    import io
+
+    from PIL import Image
+
+    exif = Image.Exif()
+    exif[0x0112] = 6  # Orientation: повернуть на 90°
+    exif[0x010F] = 'Camera'
+    buffer = io.BytesIO()
+    Image.new('RGB', size, color='red').save(buffer, 'JPEG', exif=exif.tobytes())
+    return SimpleUploadedFile('photo.jpg', buffer.getvalue(), content_type='image/jpeg')
+
+
+@pytest.mark.django_db
+class TestImageVariants:
+
+    def test_variants_built_after_upload(self, good, settings, tmp_path, monkeypatch, django_capture_on_commit_callbacks):
+        from PIL import Image
+
+        from config.tasks import build_image_variants
+
+        settings.MEDIA_ROOT = tmp_path
+        monkeypatch.setattr(build_image_variants, 'delay', build_image_variants)
+
+        with django_capture_on_commit_callbacks(execute=True):
+            image = GoodImage(good=good, image=jpeg_with_exif())
+            image.save()
+
+        image.refresh_from_db()
+        telegram = Image.open(image.telegram_image.path)
+        thumbnail = Image.open(image.thumbnail.path)
+
+        assert telegram.format == 'JPEG' and max(telegram.size) == settings.IMAGE_TELEGRAM_MAX_SIDE
+        assert telegram.size[0] < telegram.size[1]  # ориентация применена к пикселям
+        assert not telegram.getexif()
+        assert thumbnail.format == 'WEBP' and max(thumbnail.size) == settings.IMAGE_THUMBNAIL_MAX_SIDE
+        assert image.telegram_source == image.telegram_image
+
+    def test_serializer_exposes_variant_urls(self, good, settings, tmp_path):
+        from goods.serializers import GoodImageSerializer
+
+        settings.MEDIA_ROOT = tmp_path
+        image = GoodImage(good=good, image=jpeg_with_exif((100, 100)))
+        image.save()
+        image.save(update_fields=image.build_variants())
+
+        data = GoodImageSerializer(image).data
+        assert data['thumbnail'].endswith('.thumbnail.webp')
+        assert data['telegram_image'].endswith('.telegram.jpg')
+
+    def test_shared_variant_kept_for_other_model(self, good, settings, tmp_path):
+        from newsletters.models import Newsletter, NewsletterImage
+
+        settings.MEDIA_ROOT = tmp_path
+        content = jpeg_with_exif((100, 100))
+        image = GoodImage(good=good, image=content)
+        image.save()
+        image.save(update_fields=image.build_variants())
+
+        content.seek(0)
+        newsletter = Newsletter.objects.create(title='Новости', message='Текст')
+        copy = NewsletterImage(newsletter=newsletter, image=content)
+        copy.save()
+        copy.save(update_fields=copy.build_variants())
+        assert copy.telegram_image.name == image.telegram_image.name
+
+        copy.delete()
+
+        image.refresh_from_db()
+        assert image.telegram_image.storage.exists(image.telegram_image.name)
+        assert image.thumbnail.storage.exists(image.thumbnail.name)
+
+    def test_invoice_variants_deleted_on_change(self, settings, tmp_path):
+        from bot.models import Configuration
+
+        settings.MEDIA_ROOT = tmp_path
+        config = Configuration.objects.get_config()
+        config.invoice_image = jpeg_with_exif((100, 100))
+        config.save()
+        config.save(update_fields=config.build_variants())
+        old = [config.invoice_image_telegram.name, config.invoice_image_thumbnail.name]
+
+        config.invoice_image = SimpleUploadedFile('new.jpg', b'new')
+        config.save()
+
+        assert not any(config.invoice_image_telegram.storage.exists(name) for name in old)
+        assert not config.invoice_image_telegram and not config.invoice_image_thumbnail
@@ -0,0 +1,34 @@
+import pytest
+from django.core.cache import cache
+
+from bot.models import Configuration
+
+
+@pytest.mark.django_db
+class TestConfigurationCache:
+
+    def test_get_config_is_cached(self, django_assert_num_queries):
+        Configuration.objects.get_config()
+
+        with django_assert_num_queries(0):
+            config = Configuration.objects.get_config()
+
+        assert config.pk == Configuration.objects.first().pk
+
+    def test_save_invalidates_cache(self, django_capture_on_commit_callbacks):
+        Configuration.objects.get_config()
+
+        with django_capture_on_commit_callbacks(execute=True):
+            config = Configuration.objects.first()
+            config.start_message = 'Updated'
+            config.save()
+
+        assert Configuration.objects.get_config().start_message == 'Updated'
+
+    def test_foreign_version_bump_reloads(self, django_assert_num_queries):
+        '''Другой процесс поднял версию — снимок перечитывается'''
+        Configuration.objects.get_config()
+        cache.set(Configuration.objects._cache.version_key, 42, timeout=None)
+
+        with django_assert_num_queries(1):
+            Configuration.objects.get_config()
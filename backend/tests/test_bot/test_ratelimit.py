@@ -0,0 +1,133 @@
+from unittest.mock import MagicMock
+
+import pytest
+
+from bot import ratelimit, transport
+from bot.ratelimit import LocalRateLimiter, get_retry_after
+
+
+@pytest.fixture
+def limits(settings):
+    settings.BOT_RATE_LIMIT_GLOBAL = 30
+    settings.BOT_RATE_LIMIT_GLOBAL_BURST = 10
+    settings.BOT_RATE_LIMIT_CHAT = 1
+    settings.BOT_RATE_LIMIT_CHAT_BURST = 3
+    return settings
+
+
+class TestLocalRateLimiter:
+
+    def test_chat_burst(self, limits):
+        limiter = LocalRateLimiter()
+
+        assert [limiter.try_acquire(1, 1, 0) for _ in range(3)] == [0, 0, 0]
+        assert limiter.try_acquire(1, 1, 0) > 0
+        assert limiter.try_acquire(2, 1, 0) == 0
+
+    def test_good_card_reply_fits_chat_burst(self, limits):
+        limiter = LocalRateLimiter()
+
+        # Альбом из трёх фото, текст и счёт уходят без ожидания
+        assert [limiter.try_acquire(1, cost, 0) for cost in (3, 1, 1)] == [0, 0, 0]
+        assert limiter.try_acquire(1, 1, 0) > 0
+
+    def test_bulk_leaves_reserve_for_interactive(self, limits):
+        limiter = LocalRateLimiter()
+        for chat_id in range(5):
+            assert limiter.try_acquire(chat_id, 1, 0) == 0
+
+        # 5 токенов осталось: рассылка с резервом 5 ждёт, интерактив проходит
+        assert limiter.try_acquire(100, 1, 5) > 0
+        assert limiter.try_acquire(101, 1, 0) == 0
+
+    def test_pause(self, limits):
+        limiter = LocalRateLimiter()
+        limiter.pause(10)
+
+        assert limiter.try_acquire(1, 1, 0) > 9
+
+    def test_shorter_pause_keeps_longer(self, limits):
+        limiter = LocalRateLimiter()
+        limiter.pause(10)
+        limiter.pause(1)
+
+        assert limiter.try_acquire(1, 1, 0) > 9
+
+
+class TestSendRequest:
+
+    def test_429_pauses_and_retries(self, limits, monkeypatch):
+        flood = MagicMock(status_code=429)
+        flood.json.return_value = {'ok': False, 'error_code': 429, 'parameters': {'retry_after': 2}}
+        ok = MagicMock(status_code=200)
+
+        session = MagicMock()
+        session.request.side_effect = [flood, ok]
+        monkeypatch.setattr(transport, 'get_session', lambda: session)
+
+        acquired, paused, sleeps = [], [], []
+        monkeypatch.setattr(ratelimit, 'acquire', lambda chat_id, cost: acquired.append(chat_id))
+        monkeypatch.setattr(ratelimit, 'pause', paused.append)
+        monkeypatch.setattr(transport.time, 'sleep', sleeps.append)
+
+        response = transport.send_request('post', 'https://api.telegram.org/botX/sendMessage', params={'chat_id': 1})
+
+        assert response is ok
+        assert acquired == [1, 1]
+        assert paused == sleeps == [2]
+
+    def test_async_429_pauses_and_retries(self, limits, monkeypatch):
+        import asyncio
+        from unittest.mock import AsyncMock
+
+        from telebot import asyncio_helper
+
+        from bot import async_bot  # noqa: F401 (подключает install_async)
+
+        assert asyncio_helper._process_request is transport.send_request_async
+
+        flood = asyncio_helper.ApiTelegramException('sendMediaGroup', None, {
+            'error_code': 429, 'description': 'Too Many Requests', 'parameters': {'retry_after': 2},
+        })
+        process = AsyncMock(side_effect=[flood, ['sent']])
+        monkeypatch.setattr(transport, '_async_process_request', process)
+
+        acquired, paused = [], []
+        monkeypatch.setattr(ratelimit, 'acquire_async', AsyncMock(side_effect=lambda *args: acquired.append(args)))
+        monkeypatch.setattr(ratelimit, 'pause', paused.append)
+        monkeypatch.setattr(transport.asyncio, 'sleep', AsyncMock())
+
+        params = {'chat_id': 1, 'media': '[{}, {}, {}]', 'timeout': 5}
+        result = asyncio.run(transport.send_request_async('X', 'sendMediaGroup', params=params))
+
+        assert result == ['sent']
+        assert acquired == [(1, 3), (1, 3)]
+        assert paused == [2]
+        # Повтор получает тот же timeout: _process_request забирает его из params
+        assert [c.kwargs['params']['timeout'] for c in process.await_args_list] == [5, 5]
+
+    def test_acquire_async_waits_in_event_loop(self, limits, monkeypatch):
+        import asyncio
+
+        limiter = LocalRateLimiter()
+        limiter.pause(0.05)
+        monkeypatch.setattr(ratelimit, 'get_limiter', lambda: limiter)
+
+        async def scenario():
+            waiter = asyncio.ensure_future(ratelimit.acquire_async(1))
+            await asyncio.sleep(0)
+            assert not waiter.done()  # ожидание не блокирует event loop
+            await waiter
+
+        asyncio.run(scenario())
+
+    def test_get_retry_after(self):
+        from telebot.apihelper import ApiTelegramException
+
+        result = MagicMock(status_code=429)
+        exc = ApiTelegramException('sendMessage', result, {
+            'error_code': 429, 'description': 'Too Many Requests', 'parameters': {'retry_after': 7},
+        })
+
+        assert get_retry_after(exc) == 7
+        assert get_retry_after(ValueError()) is None
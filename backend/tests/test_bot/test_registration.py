@@ -0,0 +1,71 @@
+from types import SimpleNamespace
+
+import pytest
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from bot.handlers.registration import process_registration_answer
+from bot.models import RegistrationStep
+from bot.registration_flow import get_flow
+from users.models import User
+
+
+@pytest.fixture
+def steps(db, django_capture_on_commit_callbacks):
+    with django_capture_on_commit_callbacks(execute=True):
+        email = RegistrationStep.objects.create(order=2, field_type='email', message_text='Email?')
+        fullname = RegistrationStep.objects.create(
+            order=1, field_type='fullname', message_text='ФИО?', next_step=email
+        )
+        phone = RegistrationStep.objects.create(order=3, field_type='phone', message_text='Телефон?')
+        email.next_step = phone
+        email.save()
+    return fullname, email, phone
+
+
+def make_message(chat_id, text):
+    return SimpleNamespace(
+        text=text,
+        content_type='text',
+        chat=SimpleNamespace(id=chat_id),
+        from_user=SimpleNamespace(id=chat_id),
+    )
+
+
+class TestRegistrationFlow:
+
+    def test_flow_graph(self, steps):
+        fullname, email, phone = steps
+        flow = get_flow()
+
+        assert flow.first().id == fullname.id
+        assert flow.get(fullname.id).next_id == email.id
+        assert flow.get(phone.id).markup is not None
+
+    def test_answer_does_not_query_steps(self, steps):
+        fullname, email, _ = steps
+        User.objects.create(username='guest', telegram_chat_id=1, registration_step=fullname)
+        get_flow()
+
+        with CaptureQueriesContext(connection) as queries:
+            replies = process_registration_answer(make_message(1, 'Иван Иванов'))
+
+        assert replies[0].text == 'Email?'
+        assert not any('bot_registrationstep' in q['sql'] for q in queries.captured_queries)
+        assert User.objects.get(telegram_chat_id=1).registration_step_id == email.id
+
+    def test_reorder_rebuilds_flow(self, steps, authenticated_client, django_capture_on_commit_callbacks):
+        fullname, email, phone = steps
+        get_flow()
+
+        with django_capture_on_commit_callbacks(execute=True):
+            response = authenticated_client.post(
+                reverse('bot-registration-reorder'),
+                [{'id': phone.id, 'order': 1}, {'id': fullname.id, 'order': 2}, {'id': email.id, 'order': 3}],
+                format='json',
+            )
+
+        assert response.status_code == 200
+        assert get_flow().first().id == phone.id
+        assert get_flow().get(phone.id).next_id == fullname.id
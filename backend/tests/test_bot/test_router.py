@@ -0,0 +1,80 @@
+import asyncio
+from types import SimpleNamespace
+from unittest.mock import AsyncMock, Mock
+
+import pytest
+
+from bot.router import CMD, GOOD, CallbackRouter, pack, unpack
+
+
+def _callback(data):
+    return SimpleNamespace(data=data, message=SimpleNamespace(chat=SimpleNamespace(id=1)))
+
+
+class TestCallbackData:
+
+    def test_pack_unpack(self):
+        assert pack(GOOD, 12) == 'g:12'
+        assert unpack('g:12') == (GOOD, '12')
+        assert unpack('cmd:format') == (CMD, 'format')
+
+    def test_legacy_buttons(self):
+        assert unpack('12') == (GOOD, '12')
+        assert unpack('register') == (CMD, 'register')
+        assert unpack(None) == (CMD, '')
+
+
+class TestCallbackRouter:
+
+    def test_exact_route_wins_over_prefix(self):
+        router = CallbackRouter()
+        exact, prefix = Mock(), Mock()
+        router.route(CMD, 'ceo', 'format')(exact)
+        router.route(CMD)(prefix)
+
+        router.dispatch(_callback('cmd:format'))
+        router.dispatch(_callback('cmd:other'))
+
+        assert exact.call_args.args[1] == 'format'
+        assert prefix.call_args.args[1] == 'other'
+
+    def test_unknown_callback_does_not_match(self):
+        router = CallbackRouter()
+        router.route(GOOD)(Mock())
+
+        assert router.matches(_callback('g:5'))
+        assert router.matches(_callback('5'))
+        assert not router.matches(_callback('cmd:ceo'))
+
+    def test_async_handler(self):
+        router = CallbackRouter()
+        handler = AsyncMock()
+        router.route(GOOD)(handler)
+
+        asyncio.run(router.dispatch(_callback('g:7')))
+        handler.assert_awaited_once()
+        assert handler.await_args.args[1] == '7'
+
+
+@pytest.mark.django_db
+class TestBotRoutes:
+
+    def test_start_keyboard_buttons_are_routed(self):
+        from bot.bot import router
+        from bot import handlers  # noqa: F401
+        from bot.handlers.start import build_start_keyboard
+
+        rows = build_start_keyboard().keyboard
+        for button in (b for row in rows for b in row):
+            assert router.matches(_callback(button.callback_data)), button.callback_data
+
+    def test_command_callback(self, monkeypatch):
+        from bot.bot import bot, router
+        from bot import handlers  # noqa: F401
+        from bot.models import Configuration
+
+        send_message = Mock()
+        monkeypatch.setattr(bot, 'send_message', send_message)
+
+        router.dispatch(_callback('cmd:ceo'))
+        assert send_message.call_args.kwargs['text'] == Configuration.objects.get_config().ceo_message
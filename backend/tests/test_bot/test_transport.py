@@ -0,0 +1,40 @@
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from bot import transport
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def do_POST(self):
+        body = b'{"ok": true, "result": true}'
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def api_server():
+    server = ThreadingHTTPServer(('127.0.0.1', 0), _Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield f'http://127.0.0.1:{server.server_port}'
+    server.shutdown()
+
+
+def test_connections_are_reused(api_server, monkeypatch):
+    monkeypatch.setattr(transport, '_session', None)
+
+    for _ in range(3):
+        response = transport.send_request('post', f'{api_server}/botX/getMe', timeout=(1, 1))
+        assert response.status_code == 200
+
+    stats = transport.session_stats()
+    assert stats == {'connections': 1, 'requests': 3, 'reused': 2}
@@ -0,0 +1,68 @@
+from types import SimpleNamespace
+
+import pytest
+from django.urls import reverse
+
+from bot.handlers.registration import is_in_registration, process_registration_answer
+from bot.models import RegistrationStep
+from bot.registration_flow import get_flow
+from bot.user_state import _local, get_user_state
+from users.models import User
+
+
+def make_message(chat_id, text):
+    return SimpleNamespace(
+        text=text,
+        content_type='text',
+        chat=SimpleNamespace(id=chat_id),
+        from_user=SimpleNamespace(id=chat_id),
+    )
+
+
+@pytest.fixture
+def registering_user(db, django_capture_on_commit_callbacks):
+    with django_capture_on_commit_callbacks(execute=True):
+        email = RegistrationStep.objects.create(order=2, field_type='email', message_text='Email?')
+        step = RegistrationStep.objects.create(
+            order=1, field_type='fullname', message_text='ФИО?', next_step=email
+        )
+        user = User.objects.create(username='guest', telegram_chat_id=10, registration_step=step)
+    return user
+
+
+@pytest.mark.django_db
+class TestUserState:
+
+    def test_ordinary_message_without_queries(self, registering_user, django_assert_num_queries):
+        get_user_state(10)
+        get_user_state(20)
+
+        with django_assert_num_queries(0):
+            assert is_in_registration(make_message(10, 'привет'))
+            assert not is_in_registration(make_message(20, 'привет'))
+
+    def test_redis_hit_after_lru_expiry(self, registering_user, django_assert_num_queries):
+        get_user_state(10)
+        _local.clear()
+
+        with django_assert_num_queries(0):
+            assert get_user_state(10).user_id == registering_user.id
+
+    def test_write_through_on_save(self, registering_user, django_capture_on_commit_callbacks):
+        get_flow()
+
+        with django_capture_on_commit_callbacks(execute=True):
+            process_registration_answer(make_message(10, 'Иван Иванов'))
+
+        state = get_user_state(10)
+        assert state.registration_step_id == RegistrationStep.objects.get(order=2).id
+        assert User.objects.get(pk=state.user_id).first_name == 'Иван'
+
+    def test_bulk_clean_invalidates(self, bot_user_paid, authenticated_client, django_capture_on_commit_callbacks):
+        assert get_user_state(bot_user_paid.telegram_chat_id).paid
+
+        with django_capture_on_commit_callbacks(execute=True):
+            response = authenticated_client.post(reverse('users-clean-payments'))
+
+        assert response.status_code == 204
+        assert not get_user_state(bot_user_paid.telegram_chat_id).paid
@@ -0,0 +1,123 @@
+import json
+import threading
+from unittest.mock import MagicMock
+
+import pytest
+from django.urls import reverse
+
+from bot import views
+from bot.bot import bot
+from bot.update_queue import LocalQueue, PartitionedQueue, consume_forever
+
+
+@pytest.fixture
+def update_queue(monkeypatch, settings):
+    settings.BOT_WEBHOOK_MODE = 'queue'
+    settings.BOT_WEBHOOK_SECRET = 'secret'
+
+    local_queue = LocalQueue()
+    monkeypatch.setattr(views, 'get_update_queue', lambda: local_queue)
+    return local_queue
+
+
+class TestWebhookQueue:
+
+    def test_update_is_enqueued(self, client, update_queue):
+        body = json.dumps({'update_id': 1, 'message': {}})
+        response = client.post(
+            reverse('webhook'), body,
+            content_type='application/json',
+            HTTP_X_TELEGRAM_BOT_API_SECRET_TOKEN='secret',
+        )
+
+        assert response.status_code == 200
+        assert update_queue.consume('test', 10, block_ms=0) == [(None, body.encode())]
+
+    def test_wrong_secret(self, client, update_queue):
+        response = client.post(reverse('webhook'), '{"update_id": 1}', content_type='application/json')
+
+        assert response.status_code == 403
+        assert update_queue.consume('test', 10, block_ms=0) == []
+
+    def test_not_an_update(self, client, update_queue):
+        response = client.post(
+            reverse('webhook'), '[1, 2]',
+            content_type='application/json',
+            HTTP_X_TELEGRAM_BOT_API_SECRET_TOKEN='secret',
+        )
+
+        assert response.status_code == 400
+
+
+class TestPartitions:
+
+    def test_chat_stays_in_one_partition(self):
+        added = []
+        client = MagicMock(xadd=lambda stream, fields, **kwargs: added.append((stream, fields['u'])))
+        update_queue = PartitionedQueue(client, 'bot:updates', 1000, partitions=3)
+
+        for update_id, chat_id in enumerate([10, 11, 10, 12, 10]):
+            update_queue.push(str(update_id).encode(), chat_id)
+
+        assert [body for stream, body in added if stream == 'bot:updates:1'] == [b'0', b'2', b'4']
+        assert {stream for stream, _ in added} == {'bot:updates:0', 'bot:updates:1', 'bot:updates:2'}
+        assert update_queue.partition(1).stream == 'bot:updates:1'
+
+
+class FakeStream:
+    '''Очередь с подтверждениями: отдаёт заготовленные пачки, потом останавливает цикл'''
+
+    def __init__(self, batches, stop, reclaimed=()):
+        self.batches = list(batches)
+        self.reclaimed = list(reclaimed)
+        self.stop = stop
+        self.acked = []
+        self.reclaims = 0
+        self.now = 0
+
+    def consume(self, consumer, count, block_ms):
+        self.now += 6  # ожидание XREADGROUP
+        if not self.batches:
+            self.stop.set()
+            return []
+        return self.batches.pop(0)
+
+    def reclaim(self, consumer, min_idle_ms, count):
+        self.reclaims += 1
+        return self.reclaimed.pop(0) if self.reclaimed else []
+
+    def ack(self, ids):
+        self.acked.extend(ids)
+
+
+def entry(update_id):
+    return update_id, json.dumps({'update_id': update_id}).encode()
+
+
+@pytest.mark.django_db
+class TestConsumer:
+
+    def test_failed_updates_are_not_acked(self, monkeypatch):
+        def process(updates, on_error=None):
+            for update in updates:
+                if update.update_id == 2:
+                    on_error(update)
+
+        monkeypatch.setattr(bot, 'process_new_updates', process)
+        stop = threading.Event()
+        stream = FakeStream([[entry(1), entry(2), entry(3), (4, b'not json')]], stop)
+
+        consume_forever(stream, 'test', stop)
+
+        assert stream.acked == [1, 3, 4]
+
+    def test_reclaims_on_timer(self, monkeypatch, settings):
+        settings.BOT_UPDATES_RECLAIM_MS = 10_000
+        monkeypatch.setattr(bot, 'process_new_updates', lambda updates, on_error=None: None)
+        stop = threading.Event()
+        stream = FakeStream([[entry(1)], [entry(2)], [entry(3)]], stop, reclaimed=[[], [entry(9)]])
+
+        consume_forever(stream, 'test', stop, clock=lambda: stream.now)
+
+        assert stream.reclaims == 2
+        assert stream.acked == [1, 2, 9, 3]
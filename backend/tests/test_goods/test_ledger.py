@@ -0,0 +1,100 @@
+import threading
+import time
+from types import SimpleNamespace
+
+import pytest
+from django.urls import reverse
+
+from bot.handlers.invoices import process_payment
+from goods.ledger import GroupCommitWriter
+from goods.models import Good, Order
+from users.models import User
+
+
+def make_payment_message(chat_id, payload, charge_id, amount=100000):
+    return SimpleNamespace(
+        chat=SimpleNamespace(id=chat_id),
+        successful_payment=SimpleNamespace(
+            invoice_payload=payload,
+            telegram_payment_charge_id=charge_id,
+            provider_payment_charge_id='provider-1',
+            total_amount=amount,
+            currency='RUB',
+        ),
+    )
+
+
+@pytest.mark.django_db
+class TestPaymentLedger:
+
+    def test_redelivered_payment_is_noop(self):
+        user = User.objects.create(username='buyer', telegram_chat_id=1, is_registered=True)
+        message = make_payment_message(1, 'registration', 'charge-1')
+
+        assert process_payment(message)
+        assert process_payment(message) == []
+
+        order = Order.objects.get()
+        assert order.kind == Order.REGISTRATION
+        assert order.user_id == user.id
+        assert str(order.amount) == '1000.00'
+
+    def test_good_payment_recorded(self):
+        User.objects.create(username='buyer', telegram_chat_id=1)
+        good = Good.objects.create(title='Кепка', label='cap', price=1000, description='Кепка', quantity=2)
+
+        process_payment(make_payment_message(1, f'good_{good.id}', 'charge-2'))
+
+        order = Order.objects.get()
+        assert (order.kind, order.good_id) == (Order.GOOD, good.id)
+
+    def test_sold_good_can_be_deleted(self, authenticated_client):
+        User.objects.create(username='buyer', telegram_chat_id=1)
+        good = Good.objects.create(title='Кепка', label='cap', price=1000, description='Кепка', quantity=2)
+        process_payment(make_payment_message(1, f'good_{good.id}', 'charge-3'))
+
+        response = authenticated_client.delete(reverse('goods-detail', args=[good.id]))
+
+        assert response.status_code == 204
+        order = Order.objects.get()
+        assert (order.good_id, order.chat_id, str(order.amount)) == (None, 1, '1000.00')
+
+    def test_sales_report(self, authenticated_client):
+        good = Good.objects.create(title='Кепка', label='cap', price=1000, description='Кепка', quantity=5)
+        User.objects.create(username='buyer', telegram_chat_id=1)
+        for charge_id in ('a', 'b'):
+            process_payment(make_payment_message(1, f'good_{good.id}', charge_id))
+
+        response = authenticated_client.get(reverse('goods-sales'))
+
+        assert response.status_code == 200
+        row = response.json()[0]
+        assert (row['good_id'], row['orders']) == (good.id, 2)
+
+
+class TestGroupCommitWriter:
+
+    def test_concurrent_writes_are_batched(self):
+        written = []
+
+        def write_batch(items):
+            time.sleep(0.05)
+            written.append(list(items))
+
+        writer = GroupCommitWriter(write_batch, max_batch=100)
+        threads = [threading.Thread(target=writer.write, args=(i,)) for i in range(20)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        assert sorted(i for batch in written for i in batch) == list(range(20))
+        assert len(written) < 20
+
+    def test_error_reaches_every_writer(self):
+        def write_batch(items):
+            raise RuntimeError('db down')
+
+        writer = GroupCommitWriter(write_batch, max_batch=10)
+        with pytest.raises(RuntimeError):
+            writer.write(1)
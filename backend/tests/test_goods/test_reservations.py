@@ -0,0 +1,121 @@
+from datetime import timedelta
+from types import SimpleNamespace
+
+import pytest
+from django.utils import timezone
+
+from bot.handlers.invoices import check_pre_checkout, process_payment
+from goods.models import Good, Reservation
+from goods.reservations import confirm, release_expired, reserve
+from users.models import User
+
+
+@pytest.fixture
+def good(db):
+    return Good.objects.create(title='Кепка', label='cap', price=1000, description='Кепка', quantity=1)
+
+
+def make_query(good, chat_id):
+    return SimpleNamespace(
+        invoice_payload=f'good_{good.id}',
+        from_user=SimpleNamespace(id=chat_id),
+        total_amount=100000,
+    )
+
+
+def make_payment(good, chat_id, charge_id):
+    return SimpleNamespace(
+        chat=SimpleNamespace(id=chat_id),
+        successful_payment=SimpleNamespace(
+            invoice_payload=f'good_{good.id}',
+            telegram_payment_charge_id=charge_id,
+            provider_payment_charge_id='',
+            total_amount=100000,
+            currency='RUB',
+        ),
+    )
+
+
+@pytest.mark.django_db
+class TestReservations:
+
+    def test_last_item_reserved_once(self, good):
+        assert reserve(good.id, 1)
+        assert not reserve(good.id, 2)
+
+        good.refresh_from_db()
+        assert good.quantity == 0
+
+    def test_repeated_checkout_extends_hold(self, good):
+        assert reserve(good.id, 1)
+        assert reserve(good.id, 1)
+        assert Reservation.objects.filter(status=Reservation.HELD).count() == 1
+
+    def test_expired_hold_is_released(self, good):
+        reserve(good.id, 1)
+        Reservation.objects.update(expires_at=timezone.now() - timedelta(seconds=1))
+
+        assert release_expired() == 1
+        good.refresh_from_db()
+        assert good.quantity == 1
+        assert reserve(good.id, 2)
+
+    def test_confirm_after_release_takes_stock(self, good):
+        reserve(good.id, 1)
+        Reservation.objects.update(expires_at=timezone.now() - timedelta(seconds=1))
+        release_expired()
+
+        assert confirm(good.id, 1)
+        good.refresh_from_db()
+        assert good.quantity == 0
+
+    def test_payment_after_expired_hold_without_stock(self, good):
+        User.objects.create(username='buyer', telegram_chat_id=1)
+        reserve(good.id, 1)
+        Reservation.objects.update(expires_at=timezone.now() - timedelta(seconds=1))
+        release_expired()
+        # Пока первый покупатель платил, последнюю единицу купил другой
+        assert reserve(good.id, 2) and confirm(good.id, 2)
+
+        replies = process_payment(make_payment(good, 1, 'charge-late'))
+
+        assert 'уже закончился' in replies[0].text
+        assert 'поддержку' in replies[0].text
+        assert Reservation.objects.get(chat_id=1, status=Reservation.OVERSOLD).good_id == good.id
+        good.refresh_from_db()
+        assert good.quantity == 0
+
+    def test_failed_ledger_write_rolls_back_confirm(self, good, monkeypatch):
+        from goods import ledger
+
+        User.objects.create(username='buyer', telegram_chat_id=1)
+        good.quantity = 2
+        good.save()
+        assert reserve(good.id, 1)
+        monkeypatch.setattr(ledger, '_bulk_insert', lambda orders: 1 / 0)
+
+        with pytest.raises(ZeroDivisionError):
+            process_payment(make_payment(good, 1, 'charge-1'))
+        assert Reservation.objects.get(chat_id=1).status == Reservation.HELD
+
+        # Повторная доставка подтверждает тот же резерв, второй единицы не берёт
+        monkeypatch.undo()
+        assert process_payment(make_payment(good, 1, 'charge-1'))
+        assert process_payment(make_payment(good, 1, 'charge-1')) == []
+
+        assert list(Reservation.objects.values_list('status', flat=True)) == [Reservation.CONFIRMED]
+        good.refresh_from_db()
+        assert good.quantity == 1
+
+    def test_pre_checkout_and_payment(self, good):
+        User.objects.create(username='buyer', telegram_chat_id=1)
+
+        assert check_pre_checkout(make_query(good, 1)) is None
+        assert check_pre_checkout(make_query(good, 2)) == 'Извините, этот товар только что закончился.'
+
+        replies = process_payment(make_payment(good, 1, 'charge-1'))
+
+        assert 'Кепка' in replies[0].text
+        assert Reservation.objects.get(chat_id=1).status == Reservation.CONFIRMED
+        good.refresh_from_db()
+        assert good.quantity == 0
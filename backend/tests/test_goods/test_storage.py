@@ -0,0 +1,95 @@
+import hashlib
+import os
+
+import pytest
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import IntegrityError
+
+from config.models import MediaBlob
+from goods.models import Good, GoodImage
+
+
+@pytest.fixture
+def good(db, settings, tmp_path):
+    settings.MEDIA_ROOT = tmp_path
+    return Good.objects.create(title='Кепка', label='cap', price=1000, description='Кепка', quantity=1)
+
+
+def upload(good, content=b'same bytes', name='photo.JPG'):
+    image = GoodImage(good=good, image=SimpleUploadedFile(name, content))
+    image.save()
+    return image
+
+
+@pytest.mark.django_db
+class TestContentAddressedStorage:
+
+    def test_layout_by_digest(self, good):
+        image = upload(good)
+        digest = hashlib.sha256(b'same bytes').hexdigest()
+
+        assert image.image.name == f'cas/{digest[:2]}/{digest[2:4]}/{digest}.jpg'
+        assert image.hash == digest
+        assert os.path.exists(image.image.path)
+
+    def test_same_content_shares_file(self, good):
+        first = upload(good)
+        GoodImage.objects.filter(pk=first.pk).update(telegram_file_id='shared-id')
+        second = upload(good, name='copy.jpg')
+
+        assert second.image.name == first.image.name
+        assert second.telegram_file_id == 'shared-id'
+        assert MediaBlob.objects.get(name=first.image.name).refcount == 2
+
+    def test_file_removed_with_last_reference(self, good):
+        first, second = upload(good), upload(good)
+        path = first.image.path
+
+        first.delete()
+        assert os.path.exists(path)
+        assert MediaBlob.objects.get(name=second.image.name).refcount == 1
+
+        second.delete()
+        assert not os.path.exists(path)
+        assert not MediaBlob.objects.exists()
+
+    def test_legacy_file_deleted_when_unused(self, good, tmp_path):
+        os.makedirs(tmp_path / 'goods')
+        (tmp_path / 'goods' / 'old.jpg').write_bytes(b'old')
+        image = GoodImage.objects.create(good=good, image='goods/old.jpg', hash='legacy')
+
+        image.delete()
+        assert not (tmp_path / 'goods' / 'old.jpg').exists()
+
+    def test_reupload_same_content_keeps_one_reference(self, good):
+        image = upload(good)
+        path = image.image.path
+
+        image.image = SimpleUploadedFile('again.jpg', b'same bytes')
+        image.save()
+        assert MediaBlob.objects.get(name=image.image.name).refcount == 1
+
+        image.delete()
+        assert not os.path.exists(path)
+        assert not MediaBlob.objects.exists()
+
+    def test_failed_save_leaves_no_reference(self, good, monkeypatch, tmp_path):
+        def fail(*args, **kwargs):
+            raise IntegrityError('insert failed')
+
+        monkeypatch.setattr(GoodImage, '_save_row', fail)
+        with pytest.raises(IntegrityError):
+            upload(good)
+
+        assert not MediaBlob.objects.exists()
+        assert not any(path.is_file() for path in (tmp_path / 'cas').rglob('*'))
+
+        # Чужую ссылку на тот же файл откат не трогает
+        monkeypatch.undo()
+        kept = upload(good)
+        monkeypatch.setattr(GoodImage, '_save_row', fail)
+        with pytest.raises(IntegrityError):
+            upload(good)
+
+        assert MediaBlob.objects.get(name=kept.image.name).refcount == 1
+        assert os.path.exists(kept.image.path)
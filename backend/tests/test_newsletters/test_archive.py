@@ -0,0 +1,92 @@
+import gzip
+import json
+
+import pytest
+from django.utils import timezone
+
+from newsletters.archive import archive_path
+from newsletters.models import Newsletter, NewsletterTask
+from newsletters.tasks import cleanup_old_newsletters
+from users.models import User
+
+
+@pytest.fixture
+def archive_dir(settings, tmp_path):
+    settings.NEWSLETTER_ARCHIVE_DIR = tmp_path
+    settings.NEWSLETTER_ARCHIVE_AFTER_DAYS = 30
+    settings.NEWSLETTER_ARCHIVE_CHUNK = 2
+    return tmp_path
+
+
+def finished_newsletter(days_ago, users):
+    newsletter = Newsletter.objects.create(
+        title='Новости', message='Текст', status='partial', total=len(users),
+        sent_at=timezone.now() - timezone.timedelta(days=days_ago),
+    )
+    for index, user in enumerate(users):
+        NewsletterTask.objects.create(
+            newsletter=newsletter, user=user,
+            status='failed' if index == 0 else 'sent',
+            error_message='blocked' if index == 0 else None,
+        )
+    return newsletter
+
+
+@pytest.mark.django_db
+class TestArchive:
+
+    def test_old_tasks_moved_to_archive(self, archive_dir):
+        users = [User.objects.create(username=f'user{i}') for i in range(5)]
+        old = finished_newsletter(60, users)
+        recent = finished_newsletter(1, users)
+
+        cleanup_old_newsletters()
+
+        old.refresh_from_db()
+        assert old.archived_at is not None
+        assert (old.total, old.sent_count, old.failed_count) == (5, 4, 1)
+        assert not NewsletterTask.objects.filter(newsletter=old).exists()
+        assert NewsletterTask.objects.filter(newsletter=recent).count() == 5
+
+        with gzip.open(archive_path(old.pk), 'rt', encoding='utf-8') as archive:
+            rows = [json.loads(line) for line in archive]
+        assert sorted(row['user_id'] for row in rows) == sorted(user.pk for user in users)
+        assert [row['error_message'] for row in rows if row['status'] == 'failed'] == ['blocked']
+        assert not archive_path(recent.pk).exists()
+
+    def test_sending_newsletter_is_kept(self, archive_dir):
+        user = User.objects.create(username='user')
+        newsletter = finished_newsletter(60, [user])
+        Newsletter.objects.filter(pk=newsletter.pk).update(status='sending')
+
+        cleanup_old_newsletters()
+
+        assert NewsletterTask.objects.filter(newsletter=newsletter).exists()
+
+    def test_resumed_archive_keeps_totals(self, archive_dir, monkeypatch):
+        import newsletters.archive as archive
+
+        users = [User.objects.create(username=f'user{i}') for i in range(5)]
+        newsletter = finished_newsletter(60, users)
+        gzip_open = gzip.open
+        calls = []
+
+        def crash_on_second_chunk(*args, **kwargs):
+            calls.append(args)
+            if len(calls) == 2:
+                raise OSError('disk full')
+            return gzip_open(*args, **kwargs)
+
+        monkeypatch.setattr(archive.gzip, 'open', crash_on_second_chunk)
+        with pytest.raises(OSError):
+            cleanup_old_newsletters()
+        assert NewsletterTask.objects.filter(newsletter=newsletter).count() == 3
+
+        monkeypatch.setattr(archive.gzip, 'open', gzip_open)
+        cleanup_old_newsletters()
+
+        newsletter.refresh_from_db()
+        assert newsletter.archived_at is not None
+        assert (newsletter.total, newsletter.sent_count, newsletter.failed_count) == (5, 4, 1)
+        with gzip.open(archive_path(newsletter.pk), 'rt', encoding='utf-8') as archive_file:
+            assert len(archive_file.readlines()) == 5
@@ -0,0 +1,112 @@
+import socketserver
+import threading
+
+import pytest
+
+from newsletters.mailer import NewsletterMailer, build_email
+from newsletters.models import Newsletter, NewsletterTask
+from newsletters.tasks import send_newsletter_batch
+from users.models import User
+
+
+class _SMTPHandler(socketserver.StreamRequestHandler):
+    '''Минимальный SMTP: принимает письма и складывает их в server.messages'''
+
+    def reply(self, line: bytes) -> None:
+        self.wfile.write(line + b'\r\n')
+
+    def handle(self):
+        server = self.server
+        server.connections += 1
+        self.reply(b'220 sink')
+
+        while True:
+            line = self.rfile.readline()
+            if not line:
+                return
+            command = line[:4].upper()
+
+            if command in (b'EHLO', b'HELO'):
+                self.reply(b'250 sink')
+            elif command == b'MAIL' and server.drop_after and len(server.messages) == server.drop_after:
+                # Обрыв соединения посреди пачки
+                server.drop_after = None
+                return
+            elif command == b'DATA':
+                self.reply(b'354 end with .')
+                data = []
+                for data_line in iter(self.rfile.readline, b'.\r\n'):
+                    data.append(data_line)
+                server.messages.append(b''.join(data))
+                self.reply(b'250 queued')
+            elif command == b'QUIT':
+                self.reply(b'221 bye')
+                return
+            else:
+                self.reply(b'250 ok')
+
+
+@pytest.fixture
+def smtp_sink(settings):
+    server = socketserver.ThreadingTCPServer(('127.0.0.1', 0), _SMTPHandler)
+    server.daemon_threads = True
+    server.messages, server.connections, server.drop_after = [], 0, None
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+
+    settings.EMAIL_BACKEND = 'django.core.mail.backends.smtp.EmailBackend'
+    settings.EMAIL_HOST, settings.EMAIL_PORT = server.server_address
+    settings.EMAIL_USE_TLS = settings.EMAIL_USE_SSL = False
+    settings.EMAIL_HOST_USER = settings.EMAIL_HOST_PASSWORD = ''
+    settings.DEFAULT_FROM_EMAIL = 'news@example.com'
+
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def _email(index):
+    return build_email('Тема', 'Текст', '<p>Текст</p>', f'user{index}@example.com')
+
+
+class TestNewsletterMailer:
+
+    def test_one_connection_for_many_messages(self, smtp_sink):
+        with NewsletterMailer() as mailer:
+            for index in range(5):
+                mailer.send(_email(index))
+
+        assert mailer.sent == 5
+        assert len(smtp_sink.messages) == 5
+        assert smtp_sink.connections == 1
+
+    def test_reconnects_after_disconnect(self, smtp_sink):
+        smtp_sink.drop_after = 2
+
+        with NewsletterMailer() as mailer:
+            for index in range(4):
+                mailer.send(_email(index))
+
+        assert len(smtp_sink.messages) == 4
+        assert smtp_sink.connections == 2
+        assert mailer.reconnects == 1
+
+    def test_no_connection_without_messages(self, smtp_sink):
+        with NewsletterMailer():
+            pass
+
+        assert smtp_sink.connections == 0
+
+
+@pytest.mark.django_db
+class TestEmailNewsletter:
+
+    def test_batch_reuses_connection(self, smtp_sink, newsletter_batch):
+        users = [User.objects.create(username=f'user{i}', email=f'user{i}@example.com') for i in range(3)]
+        newsletter = Newsletter.objects.create(title='Новости', message='Текст', channel='email')
+
+        send_newsletter_batch(newsletter_batch(newsletter, users).pk)
+
+        assert len(smtp_sink.messages) == 3
+        assert smtp_sink.connections == 1
+        assert b'text/html' in smtp_sink.messages[0]
+        assert NewsletterTask.objects.filter(newsletter=newsletter, status='sent', channel_sent='email').count() == 3
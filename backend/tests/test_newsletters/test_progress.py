@@ -0,0 +1,133 @@
+import json
+from itertools import count
+from unittest.mock import MagicMock
+
+import pytest
+from asgiref.sync import async_to_sync, sync_to_async
+from django.test import AsyncClient, Client
+from django.urls import reverse
+
+from bot.bot import bot
+from newsletters.models import Newsletter, NewsletterTask
+from newsletters.progress import progress_events
+from newsletters.tasks import send_newsletter_batch
+from users.models import User
+
+
+def parse(chunk):
+    lines = dict(line.split(': ', 1) for line in chunk.strip().split('\n'))
+    return lines['event'], json.loads(lines['data'])
+
+
+@pytest.fixture
+def newsletter(db):
+    return Newsletter.objects.create(title='Новости', message='Текст', channel='telegram', total=3)
+
+
+@pytest.mark.django_db
+class TestDeliveryCounters:
+
+    def test_batch_updates_counters(self, newsletter, monkeypatch, newsletter_batch):
+        monkeypatch.setattr(bot, 'send_message', MagicMock(side_effect=[None, Exception('blocked'), None]))
+        users = [User.objects.create(username=f'user{i}', telegram_chat_id=100 + i) for i in range(3)]
+
+        send_newsletter_batch(newsletter_batch(newsletter, users).pk)
+
+        newsletter.refresh_from_db()
+        assert (newsletter.sent_count, newsletter.failed_count, newsletter.pending_count) == (2, 1, 0)
+        assert newsletter.status == 'partial'
+
+    def test_resend_moves_failed_to_sent(self, newsletter, monkeypatch, newsletter_batch):
+        monkeypatch.setattr(bot, 'send_message', MagicMock())
+        user = User.objects.create(username='user', telegram_chat_id=100)
+        NewsletterTask.objects.create(newsletter=newsletter, user=user, status='failed', error_message='blocked')
+        Newsletter.objects.filter(pk=newsletter.pk).update(failed_count=1)
+
+        send_newsletter_batch(newsletter_batch(newsletter, [user]).pk)
+
+        newsletter.refresh_from_db()
+        assert (newsletter.sent_count, newsletter.failed_count) == (1, 0)
+
+    def test_progress_without_task_counts(self, newsletter, authenticated_client, django_assert_max_num_queries):
+        Newsletter.objects.filter(pk=newsletter.pk).update(sent_count=1)
+
+        with django_assert_max_num_queries(3):
+            response = authenticated_client.get(reverse('newsletters-progress'))
+
+        assert response.json() == [{'id': newsletter.pk, 'progress': pytest.approx(100 / 3)}]
+
+
+async def no_sleep(seconds):
+    pass
+
+
+@pytest.mark.django_db
+class TestProgressStream:
+
+    def test_pushes_only_changes(self, newsletter, settings):
+        settings.NEWSLETTER_PROGRESS_STREAM_TTL = 10
+        settings.NEWSLETTER_PROGRESS_HEARTBEAT = 2
+        other = Newsletter.objects.create(title='Другая', message='Текст', total=1)
+        other_id = other.pk
+        clock = count()
+
+        # Генератор живёт в одном цикле событий: между событиями меняем базу
+        async def stream():
+            events = progress_events(sleep=no_sleep, clock=lambda: next(clock))
+            received = [await events.__anext__(), await events.__anext__()]
+            await sync_to_async(Newsletter.objects.filter(pk=newsletter.pk).update)(sent_count=2, failed_count=1)
+            received += [await events.__anext__(), await events.__anext__()]
+            await sync_to_async(other.delete)()
+            received.append(await events.__anext__())
+            await events.aclose()
+            return received
+
+        retry, snapshot, progress, ping, removed = async_to_sync(stream)()
+
+        assert retry.startswith('retry:')
+        name, data = parse(snapshot)
+        assert name == 'snapshot'
+        assert {row['id'] for row in data} == {newsletter.pk, other_id}
+
+        name, data = parse(progress)
+        assert name == 'progress'
+        assert data == [{
+            'id': newsletter.pk, 'status': 'sending', 'total': 3,
+            'sent': 2, 'failed': 1, 'pending': 0, 'progress': pytest.approx(200 / 3),
+        }]
+        assert ping == ': ping\n\n'
+        assert parse(removed) == ('removed', [other_id])
+
+    def test_endpoint(self, newsletter, authenticated_client):
+        token = authenticated_client.get(reverse('newsletters-progress-token')).json()['token']
+
+        async def read():
+            response = await AsyncClient().get(reverse('newsletters-progress-stream'), {'token': token})
+            chunks = response.streaming_content
+            first, second = await chunks.__anext__(), await chunks.__anext__()
+            await chunks.aclose()
+            return response, second
+
+        response, chunk = async_to_sync(read)()
+
+        assert response.status_code == 200
+        assert response['Content-Type'] == 'text/event-stream'
+        assert response['X-Accel-Buffering'] == 'no'
+        name, data = parse(chunk.decode())
+        assert name == 'snapshot' and data[0]['id'] == newsletter.pk
+
+    def test_endpoint_rejects_bad_token(self, db):
+        client = AsyncClient()
+
+        async def get():
+            return await client.get(reverse('newsletters-progress-stream'), {'token': 'forged'})
+
+        response = async_to_sync(get)()
+        assert response.status_code == 403
+
+    def test_endpoint_not_served_by_wsgi(self, newsletter, authenticated_client):
+        token = authenticated_client.get(reverse('newsletters-progress-token')).json()['token']
+
+        response = Client().get(reverse('newsletters-progress-stream'), {'token': token})
+
+        assert response.status_code == 503
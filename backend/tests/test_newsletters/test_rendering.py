@@ -0,0 +1,47 @@
+from unittest.mock import patch
+
+import pytest
+from django.template.backends.django import Template
+from django.template.loader import render_to_string
+
+from newsletters.models import Newsletter
+from newsletters.rendering import EMAIL_TEMPLATE, get_compiled_email
+from users.models import User
+
+
+@pytest.fixture
+def newsletter(db):
+    return Newsletter.objects.create(title='Новости', message='Первая строка\nвторая', channel='email')
+
+
+def full_render(newsletter, user):
+    from django.conf import settings
+    return render_to_string(EMAIL_TEMPLATE, {'newsletter': newsletter, 'user': user, 'base_url': settings.BASE_URL})
+
+
+@pytest.mark.django_db
+class TestCompiledEmail:
+
+    @pytest.mark.parametrize('first_name', ['Анна', '', '<b>Tom & Jerry</b>'])
+    def test_matches_full_render(self, newsletter, first_name):
+        user = User(username='anna', first_name=first_name)
+        assert get_compiled_email(newsletter).render(user) == full_render(newsletter, user)
+
+    def test_template_rendered_once_per_variant(self, newsletter):
+        users = [User(username=f'user{i}', first_name=f'Имя{i}' if i % 2 else '') for i in range(10)]
+
+        with patch.object(Template, 'render', autospec=True, side_effect=Template.render) as render:
+            email = get_compiled_email(newsletter)
+            html = [email.render(user) for user in users]
+
+        assert render.call_count == 2
+        assert 'Привет, Имя1!' in html[1]
+        assert 'Привет, гость!' in html[0]
+
+    def test_edit_recompiles(self, newsletter):
+        user = User(username='anna', first_name='Анна')
+        first = get_compiled_email(newsletter)
+        assert get_compiled_email(newsletter) is first
+
+        newsletter.message = 'Новый текст'
+        assert 'Новый текст' in get_compiled_email(newsletter).render(user)
@@ -0,0 +1,315 @@
+from unittest.mock import MagicMock
+
+import pytest
+from celery.exceptions import Retry
+from django.utils import timezone
+from telebot.apihelper import ApiTelegramException
+
+from bot.bot import bot
+from newsletters.models import Newsletter, NewsletterBatch, NewsletterTask
+from newsletters.tasks import (
+    Lease,
+    claim_due_newsletters,
+    resume_newsletter,
+    send_newsletter_batch,
+    send_newsletter_task,
+    send_scheduled_newsletters,
+)
+from users.models import User
+
+
+@pytest.fixture
+def recipients(db):
+    return [
+        User.objects.create(username=f'user{i}', telegram_chat_id=1000 + i)
+        for i in range(5)
+    ]
+
+
+@pytest.fixture
+def newsletter(db):
+    return Newsletter.objects.create(title='Новости', message='Текст', channel='telegram')
+
+
+@pytest.fixture
+def telegram(monkeypatch):
+    for method in ('send_message', 'send_cached_media_group'):
+        monkeypatch.setattr(bot, method, MagicMock())
+    return bot
+
+
+def flood_error():
+    return ApiTelegramException('sendMessage', MagicMock(status_code=429), {
+        'error_code': 429, 'description': 'Too Many Requests', 'parameters': {'retry_after': 7},
+    })
+
+
+@pytest.mark.django_db
+class TestNewsletterBatches:
+
+    def test_fan_out_in_batches(self, recipients, newsletter, telegram, settings, monkeypatch):
+        settings.NEWSLETTER_BATCH_SIZE = 2
+        queued = []
+        monkeypatch.setattr(send_newsletter_batch, 'delay', lambda *args: queued.append(args))
+
+        send_newsletter_task(newsletter.pk)
+
+        newsletter.refresh_from_db()
+        batches = NewsletterBatch.objects.filter(newsletter=newsletter).order_by('pk')
+        assert queued == [(batch.pk,) for batch in batches]
+        assert [(b.first_user_id, b.last_user_id) for b in batches] == [
+            (recipients[0].pk, recipients[1].pk), (recipients[2].pk, recipients[3].pk), (recipients[4].pk,) * 2,
+        ]
+        assert newsletter.total == 5
+        assert newsletter.remaining_batches == 3
+        assert newsletter.dispatched_at is not None
+
+        for args in queued:
+            send_newsletter_batch(*args)
+
+        newsletter.refresh_from_db()
+        assert newsletter.remaining_batches == 0
+        assert newsletter.status == 'sent'
+        assert telegram.send_message.call_count == 5
+        assert NewsletterTask.objects.filter(newsletter=newsletter, status='sent').count() == 5
+
+    def test_batches_send_only_their_range(self, recipients, newsletter, telegram, settings, monkeypatch):
+        settings.NEWSLETTER_BATCH_SIZE = 2
+        queued = []
+        monkeypatch.setattr(send_newsletter_batch, 'delay', lambda *args: queued.append(args))
+        send_newsletter_task(newsletter.pk)
+
+        # Пачки идут параллельно: последняя может прийти первой
+        send_newsletter_batch(*queued[-1])
+        assert [c.args[0] for c in telegram.send_message.call_args_list] == [recipients[4].telegram_chat_id]
+
+        for args in reversed(queued[:-1]):
+            send_newsletter_batch(*args)
+
+        chats = sorted(c.args[0] for c in telegram.send_message.call_args_list)
+        assert chats == [user.telegram_chat_id for user in recipients]
+        newsletter.refresh_from_db()
+        assert (newsletter.status, newsletter.sent_count) == ('sent', 5)
+
+    def test_recipients_read_in_pages(self, recipients, newsletter, settings, monkeypatch):
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+
+        settings.NEWSLETTER_BATCH_SIZE = 2
+        monkeypatch.setattr(send_newsletter_batch, 'delay', lambda *args: None)
+
+        with CaptureQueriesContext(connection) as queries:
+            send_newsletter_task(newsletter.pk)
+
+        pages = [q['sql'] for q in queries if q['sql'].startswith('SELECT "users_user"."id" FROM')]
+        # Три страницы по ключу и одна пустая в конце, каждая с LIMIT
+        assert len(pages) == 4
+        assert all('LIMIT 2' in sql for sql in pages)
+        assert NewsletterBatch.objects.filter(newsletter=newsletter).count() == 3
+
+    def test_flood_control_retries_from_cursor(self, recipients, newsletter, telegram, monkeypatch,
+                                               newsletter_batch):
+        telegram.send_message.side_effect = [None, flood_error()]
+        retry = MagicMock(side_effect=Retry())
+        monkeypatch.setattr(send_newsletter_batch, 'retry', retry)
+        batch = newsletter_batch(newsletter, recipients)
+
+        with pytest.raises(Retry):
+            send_newsletter_batch(batch.pk)
+
+        assert retry.call_args.kwargs['countdown'] == 7
+        assert NewsletterTask.objects.get(newsletter=newsletter, user=recipients[0]).status == 'sent'
+        batch.refresh_from_db()
+        assert batch.cursor == recipients[0].pk and batch.finished_at is None
+        newsletter.refresh_from_db()
+        assert newsletter.remaining_batches == 1
+
+        # Повтор продолжает со второго пользователя
+        telegram.send_message.side_effect = None
+        send_newsletter_batch(batch.pk)
+        assert [c.args[0] for c in telegram.send_message.call_args_list[2:]] == [
+            user.telegram_chat_id for user in recipients[1:]
+        ]
+        newsletter.refresh_from_db()
+        assert (newsletter.status, newsletter.sent_count) == ('sent', 5)
+
+    def test_sent_users_are_skipped(self, recipients, newsletter, telegram, newsletter_batch):
+        NewsletterTask.objects.create(newsletter=newsletter, user=recipients[0], status='sent')
+        batch = newsletter_batch(newsletter, recipients)
+
+        send_newsletter_batch(batch.pk)
+
+        assert telegram.send_message.call_count == 4
+        newsletter.refresh_from_db()
+        assert newsletter.status == 'sent'
+
+    def test_results_written_in_bulk(self, recipients, newsletter, telegram, settings, monkeypatch,
+                                     django_assert_max_num_queries):
+        settings.NEWSLETTER_BATCH_SIZE = 5
+        queued = []
+        monkeypatch.setattr(send_newsletter_batch, 'delay', lambda *args: queued.append(args))
+        recipients[0].telegram_chat_id = None
+        recipients[0].save()
+
+        send_newsletter_task(newsletter.pk)
+        assert NewsletterTask.objects.filter(newsletter=newsletter, status='pending').count() == 5
+
+        # Пачка, рассылка, картинки, задачи с пользователями, запись результатов
+        # с курсором, закрытие пачки и итог — не зависит от числа получателей
+        with django_assert_max_num_queries(17):
+            send_newsletter_batch(*queued[0])
+
+        failed = NewsletterTask.objects.get(newsletter=newsletter, user=recipients[0])
+        assert failed.status == 'failed'
+        assert failed.error_message == 'No valid contact info'
+        assert failed.sent_at is None and failed.channel_sent is None
+
+        sent = NewsletterTask.objects.get(newsletter=newsletter, user=recipients[1])
+        assert sent.channel_sent == 'telegram'
+        assert sent.sent_at is not None and sent.error_message is None
+
+        newsletter.refresh_from_db()
+        assert newsletter.status == 'partial'
+
+
+@pytest.mark.django_db
+class TestResume:
+
+    def test_resume_only_unfinished_batches(self, recipients, newsletter, telegram, settings, monkeypatch):
+        settings.NEWSLETTER_BATCH_SIZE = 2
+        queued = []
+        monkeypatch.setattr(send_newsletter_batch, 'delay', lambda *args: queued.append(args))
+        send_newsletter_task(newsletter.pk)
+
+        # Воркер успел первую пачку и половину второй
+        first, second, third = NewsletterBatch.objects.filter(newsletter=newsletter).order_by('pk')
+        send_newsletter_batch(first.pk)
+        NewsletterTask.objects.filter(newsletter=newsletter, user=recipients[2]).update(status='sent')
+        NewsletterBatch.objects.filter(pk=second.pk).update(cursor=recipients[2].pk)
+        telegram.send_message.reset_mock()
+
+        queued.clear()
+        assert resume_newsletter(newsletter.pk) == 2
+        assert queued == [(second.pk,), (third.pk,)]
+
+        for args in queued:
+            send_newsletter_batch(*args)
+
+        assert telegram.send_message.call_count == 2
+        newsletter.refresh_from_db()
+        assert (newsletter.status, newsletter.remaining_batches) == ('sent', 0)
+
+    def test_dispatch_continues_after_last_batch(self, recipients, newsletter, telegram, settings, monkeypatch,
+                                                 newsletter_batch):
+        settings.NEWSLETTER_BATCH_SIZE = 2
+        queued = []
+        monkeypatch.setattr(send_newsletter_batch, 'delay', lambda *args: queued.append(args))
+        newsletter_batch(newsletter, recipients[:2])
+        Newsletter.objects.filter(pk=newsletter.pk).update(dispatched_at=None)
+
+        send_newsletter_task(newsletter.pk)
+
+        batches = NewsletterBatch.objects.filter(newsletter=newsletter).order_by('pk')
+        assert [b.first_user_id for b in batches] == [recipients[0].pk, recipients[2].pk, recipients[4].pk]
+        assert len(queued) == 2
+        newsletter.refresh_from_db()
+        assert (newsletter.total, newsletter.remaining_batches) == (5, 3)
+
+    def test_resume_skips_leased_work(self, recipients, newsletter, telegram, settings, monkeypatch):
+        settings.NEWSLETTER_BATCH_SIZE = 2
+        queued = []
+        monkeypatch.setattr(send_newsletter_batch, 'delay', lambda *args: queued.append(args))
+        send_newsletter_task(newsletter.pk)
+        first, second, third = NewsletterBatch.objects.filter(newsletter=newsletter).order_by('pk')
+
+        # Первую пачку ещё шлёт живой воркер, а раскладка не дошла до конца
+        assert Lease.for_batch(first.pk).acquire()
+        assert Lease.for_dispatch(newsletter.pk).acquire()
+        Newsletter.objects.filter(pk=newsletter.pk).update(dispatched_at=None)
+        dispatched = MagicMock()
+        monkeypatch.setattr(send_newsletter_task, 'delay', dispatched)
+
+        queued.clear()
+        assert resume_newsletter(newsletter.pk) == 2
+        assert queued == [(second.pk,), (third.pk,)]
+        dispatched.assert_not_called()
+
+        # Копия пачки, поставленная раньше, не шлёт параллельно с воркером
+        send_newsletter_batch(first.pk)
+        telegram.send_message.assert_not_called()
+        assert send_newsletter_task(newsletter.pk) == f'Newsletter {newsletter.pk} is already being dispatched'
+        assert NewsletterBatch.objects.filter(newsletter=newsletter).count() == 3
+
+    def test_lease_released_after_batch(self, recipients, newsletter, telegram, newsletter_batch):
+        batch = newsletter_batch(newsletter, recipients)
+
+        send_newsletter_batch(batch.pk)
+
+        assert telegram.send_message.call_count == 5
+        assert not Lease.for_batch(batch.pk).is_held()
+
+    def test_resume_endpoint(self, newsletter, authenticated_client, monkeypatch):
+        from django.urls import reverse
+        monkeypatch.setattr(send_newsletter_task, 'delay', MagicMock())
+
+        response = authenticated_client.post(reverse('newsletters-resume', args=[newsletter.pk]))
+        assert response.status_code == 200
+        assert response.json() == {'queued': 1}
+
+        Newsletter.objects.filter(pk=newsletter.pk).update(status='sent')
+        response = authenticated_client.post(reverse('newsletters-resume', args=[newsletter.pk]))
+        assert response.status_code == 400
+
+
+@pytest.mark.django_db
+class TestScheduler:
+
+    def scheduled(self, minutes):
+        return Newsletter.objects.create(
+            title='Новости', message='Текст', status='scheduled',
+            scheduled_at=timezone.now() + timezone.timedelta(minutes=minutes),
+        )
+
+    def test_starts_only_due_newsletters(self, monkeypatch, django_capture_on_commit_callbacks):
+        due, future = self.scheduled(-1), self.scheduled(60)
+        started = []
+        monkeypatch.setattr(send_newsletter_task, 'delay', started.append)
+
+        with django_capture_on_commit_callbacks(execute=True):
+            send_scheduled_newsletters()
+
+        assert started == [due.pk]
+        due.refresh_from_db()
+        future.refresh_from_db()
+        assert (due.status, future.status) == ('sending', 'scheduled')
+
+    def test_claimed_once(self, monkeypatch, django_capture_on_commit_callbacks):
+        due = self.scheduled(-1)
+        monkeypatch.setattr(send_newsletter_task, 'delay', lambda pk: None)
+
+        with django_capture_on_commit_callbacks(execute=True):
+            assert claim_due_newsletters() == [due.pk]
+            assert claim_due_newsletters() == []
+
+    def test_broker_failure_returns_to_schedule(self, monkeypatch, django_capture_on_commit_callbacks):
+        due = self.scheduled(-1)
+        monkeypatch.setattr(send_newsletter_task, 'delay', MagicMock(side_effect=OSError('no broker')))
+
+        with django_capture_on_commit_callbacks(execute=True):
+            claim_due_newsletters()
+
+        due.refresh_from_db()
+        assert due.status == 'scheduled'
+
+    def test_tick_stops_when_broker_is_down(self, monkeypatch):
+        due = self.scheduled(-1)
+        delay = MagicMock(side_effect=OSError('no broker'))
+        monkeypatch.setattr(send_newsletter_task, 'delay', delay)
+        # Без атомарной обёртки теста on_commit сработал бы сразу после claim
+        monkeypatch.setattr('newsletters.tasks.transaction.on_commit', lambda func: func())
+
+        send_scheduled_newsletters()
+
+        assert delay.call_count == 1
+        due.refresh_from_db()
+        assert due.status == 'scheduled'
@@ -8,6 +8,7 @@ from rest_framework.response import Response
 from django.http import HttpResponse
 
 from bot.models import RegistrationStep
+from bot.user_state import invalidate_all as invalidate_user_states
 from users.models import User
 from users.serializers import UserSerializer
 
@@ -36,6 +37,7 @@ class UserViewSet(viewsets.ModelViewSet):
             paid=False,
             paid_at=None
         )
+        invalidate_user_states()
 
         logger.warning(
             "Registrations cleaned by admin",
@@ -60,6 +62,7 @@ class UserViewSet(viewsets.ModelViewSet):
         count = queryset.update(
             paid=False,
             paid_at=None)
+        invalidate_user_states()
 
         logger.warning(
             "Payments cleaned by admin",
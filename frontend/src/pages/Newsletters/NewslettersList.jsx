@@ -29,7 +29,10 @@ export default function NewslettersList() {
   const [loading, setLoading] = useState(true);
   const [error, setError] = useState(null);
   
-  const pollingInterval = useRef(null);
+  // Прогресс приходит по SSE вместо опроса /newsletters/progress/
+  const streamRef = useRef(null);
+  const connectingRef = useRef(false);
+  const reconnectTimer = useRef(null);
 
   const loadNewsletters = useCallback(async () => {
     try {
@@ -44,44 +47,65 @@ export default function NewslettersList() {
     }
   }, []);
 
-  const updateProgress = useCallback(async () => {
-    try {
-      const updates = await newslettersApi.getProgress();
-      
-      setItems(prevItems => prevItems.map(item => {
-        const update = updates.find(u => u.id === item.id);
-        if (update && (update.progress !== item.progress || update.status !== item.status)) {
-          return { ...item, ...update };
-        }
-        return item;
-      }));
-
-      const stillActive = updates.some(u => u.status === 'sending' || u.status === 'scheduled');
-      if (!stillActive && pollingInterval.current) {
-        clearInterval(pollingInterval.current);
-        pollingInterval.current = null;
+  const applyUpdates = useCallback((updates) => {
+    setItems(prevItems => prevItems.map(item => {
+      const update = updates.find(u => u.id === item.id);
+      if (update && (update.progress !== item.progress || update.status !== item.status)) {
+        return { ...item, progress: update.progress, status: update.status };
       }
-    } catch (e) {
-      console.error("Ошибка обновления прогресса:", e);
+      return item;
+    }));
+  }, []);
+
+  const closeStream = useCallback(() => {
+    clearTimeout(reconnectTimer.current);
+    reconnectTimer.current = null;
+    if (streamRef.current) {
+      streamRef.current.close();
+      streamRef.current = null;
     }
   }, []);
 
+  const openStream = useCallback(async () => {
+    if (streamRef.current || connectingRef.current) return;
+    connectingRef.current = true;
+    try {
+      const url = await newslettersApi.getProgressStreamUrl();
+      const source = new EventSource(url);
+      const onEvent = (event) => applyUpdates(JSON.parse(event.data));
+      source.addEventListener('snapshot', onEvent);
+      source.addEventListener('progress', onEvent);
+      // Сервер закрывает поток по таймеру, а токен в URL к тому времени истёк:
+      // переподключаемся сами, с новым токеном
+      source.onerror = () => {
+        if (streamRef.current !== source) return;
+        source.close();
+        streamRef.current = null;
+        reconnectTimer.current = setTimeout(openStream, 2000);
+      };
+      streamRef.current = source;
+    } catch (e) {
+      console.error("Ошибка подключения к прогрессу:", e);
+      reconnectTimer.current = setTimeout(openStream, 5000);
+    } finally {
+      connectingRef.current = false;
+    }
+  }, [applyUpdates]);
+
   useEffect(() => {
     loadNewsletters();
   }, [loadNewsletters]);
 
   useEffect(() => {
     const hasActive = items.some(nl => nl.status === 'sending' || nl.status === 'scheduled');
-    if (hasActive && !pollingInterval.current) {
-      pollingInterval.current = setInterval(updateProgress, 4000);
+    if (hasActive) {
+      openStream();
+    } else {
+      closeStream();
     }
-    return () => {
-      if (pollingInterval.current) {
-        clearInterval(pollingInterval.current);
-        pollingInterval.current = null;
-      }
-    };
-  }, [items, updateProgress]);
+  }, [items, openStream, closeStream]);
+
+  useEffect(() => closeStream, [closeStream]);
 
   if (error) return <ErrorPage code="500" />;
   if (loading) return <div style={styles.center}><Spinner size={40} /></div>;
@@ -283,6 +283,11 @@ export const newslettersApi = {
     api.post(`newsletters/${newsletterId}/upload-image/`, formData, withConfig(config)).then(getData),
 
   getProgress: () => api.get('/newsletters/progress/').then(res => res.data),
+  // EventSource не отправляет Authorization: берём короткоживущий токен для query string
+  getProgressStreamUrl: async () => {
+    const { token } = await api.get('newsletters/progress/token/').then(getData);
+    return `${API_BASE_URL}/newsletters/progress/stream/?token=${encodeURIComponent(token)}`;
+  },
   getFileUrl: (path) => {
   if (!path) return null;
   if (path.startsWith('http')) return path;